@@ -5,28 +5,30 @@ A complete heart sound classification system with mobile QR recording capability
 
 import streamlit as st
 import numpy as np
-import pandas as pd
-import librosa
-import librosa.display
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend for Streamlit
-import matplotlib.pyplot as plt
-import seaborn as sns
 from pathlib import Path
-import tempfile
 import os
 import json
-import qrcode
-from PIL import Image
 import io
-import base64
 from datetime import datetime
 import warnings
 warnings.filterwarnings('ignore')
 
+# librosa, matplotlib, qrcode and TensorFlow are imported inside the functions
+# that use them, so sessions that only view the landing page never load them.
+os.environ['MPLBACKEND'] = 'Agg'  # Use non-interactive backend for Streamlit
+
 # Import our custom modules
 from config import *
 from utils import *
+from audio_io import decode_stats
+from rendering import render_cache_stats, spectrogram_png, waveform_png
+from demo_bundle import load_demo_bundle
+from inference import start_warmup
+from offload import OffloadedModel, OffloadPool, prepare_upload
+from result_cache import ResultCache, content_key, model_version, preprocessing_version
+from profiles import profile_for_served_model
+from similarity_index import EmbeddingModel, SimilarityIndex, model_file_hash, similarity_index_path
+import metrics
 
 # Set page configuration
 st.set_page_config(
@@ -78,8 +80,6 @@ st.markdown("""
 def load_model():
     """Load the trained CNN model using TensorFlow Lite (Python 3.13 compatible)."""
     try:
-        import tensorflow as tf
-        
         # Try loading TensorFlow Lite models first (Python 3.13 compatible)
         tflite_models = [
             "heart_sound_mobile_quantized.tflite",
@@ -90,15 +90,17 @@ def load_model():
             model_path = MODELS_DIR / model_name
             if model_path.exists():
                 try:
-                    interpreter = tf.lite.Interpreter(model_path=str(model_path))
-                    interpreter.allocate_tensors()
+                    # Served from the worker processes; this process keeps no interpreters
+                    model = OffloadedModel(get_offload_pool(str(model_path)), model_path)
                     st.success(f"✅ TFLite Model loaded: {model_name}")
-                    return interpreter
+                    return model
                 except Exception as e:
                     st.warning(f"Could not load TFLite {model_name}: {e}")
                     continue
         
         # Fallback: Try loading Keras models
+        import tensorflow as tf
+
         model_names = [
             "gpu_optimized_cnn_final.keras",
             "gpu_optimized_cnn.keras", 
@@ -128,6 +130,81 @@ def load_model():
         st.error(f"❌ Critical error loading model: {e}")
         return None
 
+@st.cache_resource
+def get_model_warmup(_model):
+    """Start warming the shared model in the background (once per server)."""
+    return start_warmup(_model)
+
+@st.cache_resource
+def start_metrics_reporter():
+    """Append stage timings to the health report periodically (once per server)."""
+    return metrics.start_reporter()
+
+def ensure_model_ready(warmup):
+    """Wait for model warm-up before running a user prediction."""
+    if not warmup.ready and not warmup.failed:
+        with st.spinner("🔥 Warming up the model..."):
+            warmup.wait_until_ready(WARMUP_TIMEOUT)
+    if not warmup.ready:
+        st.error(f"❌ Model is not ready: {warmup.error or 'warm-up timed out'}")
+        return False
+    return True
+
+@st.cache_resource
+def get_preprocessing_profile(_model):
+    """Preprocessing profile the served model was trained with (from its metadata)."""
+    try:
+        return profile_for_served_model(_model)
+    except KeyError as e:
+        # The metadata names a profile this version of the app does not know
+        st.error(f"❌ {e}")
+        return None
+
+@st.cache_resource
+def get_offload_pool(model_path):
+    """Worker processes for decoding, featurizing and inference (of model_path), shared by all sessions on this server."""
+    return OffloadPool(preload_models=[model_path] if model_path else ())
+
+@st.cache_resource
+def get_result_cache():
+    """Result cache shared by all sessions on this server."""
+    return ResultCache()
+
+@st.cache_resource
+def get_demo_bundle(pipeline_version):
+    """Precomputed demo recordings (None if not built or built for another pipeline)."""
+    bundle = load_demo_bundle()
+    if bundle is not None and bundle.preprocessing_version != pipeline_version:
+        return None
+    return bundle
+
+@st.cache_resource
+def get_similarity_search(_model):
+    """
+    (EmbeddingModel, SimilarityIndex) for the served model, or None without a matching index.
+
+    The Keras fallback is loaded without its file path, so similar-case search
+    is only available with a TFLite model (the index builder accepts both).
+    """
+    model_path = getattr(_model, 'model_path', None)
+    if model_path is None:
+        print("Similar-case search off: the served model has no model file (Keras fallback)")
+        return None
+    index_path = similarity_index_path(model_path)
+    if not index_path.exists():
+        print(f"Similar-case search off: no {index_path.name} (build it with scripts/build_similarity_index.py)")
+        return None
+    try:
+        index = SimilarityIndex.load(index_path)
+        if index.metadata.get('model_sha1') != model_file_hash(model_path):
+            st.info(f"Similar-case search off: {index_path.name} was built for a different "
+                    f"{Path(model_path).name}; rebuild it with scripts/build_similarity_index.py")
+            return None
+        return EmbeddingModel(model_path, index.metadata.get('layer_name')), index
+    except Exception as e:
+        st.warning(f"Similar-case search unavailable: {e}")
+        return None
+
 @st.cache_data
 def load_model_metadata():
     """Load model metadata."""
@@ -139,61 +216,24 @@ def load_model_metadata():
         st.warning(f"Could not load model metadata: {e}")
         return {}
 
-def preprocess_uploaded_audio(audio_file):
-    """Preprocess uploaded audio file for prediction."""
+def preprocess_uploaded_audio(audio_file, profile, offload):
+    """Preprocess uploaded audio file for prediction with the model's preprocessing profile."""
     try:
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp_file:
-            tmp_file.write(audio_file.getvalue())
-            tmp_path = tmp_file.name
-
-        # Load and preprocess audio
-        audio, sr = load_audio(tmp_path, SAMPLE_RATE)
-        if len(audio) == 0:
-            raise ValueError("Could not load audio file")
-
-        # Preprocess audio
-        processed_audio = preprocess_audio(audio, sr, AUDIO_DURATION)
-
-        # Convert to mel-spectrogram
-        mel_spec = audio_to_melspectrogram(
-            processed_audio, SAMPLE_RATE,
-            N_MELS, N_FFT, HOP_LENGTH
-        )
-
-        # Add channel dimension and batch dimension
-        mel_spec = np.expand_dims(mel_spec, axis=[0, -1])
-
-        # Clean up temp file
-        os.unlink(tmp_path)
-
+        # Decode and featurize in a worker process, so other sessions keep the GIL
+        mel_spec, processed_audio, sr = offload.run(prepare_upload, audio_file.getvalue(), profile)
         return mel_spec, processed_audio, sr
 
     except Exception as e:
         st.error(f"Error preprocessing audio: {e}")
         return None, None, None
 
+@metrics.timed("predict")
 def make_prediction(model, preprocessed_audio):
     """Make prediction using the loaded model (supports both TFLite and Keras)."""
     try:
-        import tensorflow as tf
-        
-        # Check if it's a TensorFlow Lite interpreter
-        if isinstance(model, tf.lite.Interpreter):
-            # TensorFlow Lite inference
-            input_details = model.get_input_details()
-            output_details = model.get_output_details()
-            
-            # Prepare input
-            input_data = preprocessed_audio.astype(np.float32)
-            model.set_tensor(input_details[0]['index'], input_data)
-            
-            # Run inference
-            model.invoke()
-            
-            # Get output
-            output_data = model.get_tensor(output_details[0]['index'])
-            confidence = float(output_data[0][0])
+        if isinstance(model, OffloadedModel):
+            # TFLite inference in a worker process
+            confidence = float(model.predict_batch(preprocessed_audio)[0])
         else:
             # Keras model inference
             prediction = model.predict(preprocessed_audio, verbose=0)
@@ -205,27 +245,48 @@ def make_prediction(model, preprocessed_audio):
         st.error(f"Error making prediction: {e}")
         return None, None
 
-def plot_spectrogram(audio, sr, title="Mel-Spectrogram"):
-    """Create and return a matplotlib figure of the spectrogram."""
-    fig, ax = plt.subplots(figsize=(10, 4))
-
-    # Create mel-spectrogram
-    mel_spec = audio_to_melspectrogram(audio, sr, N_MELS, N_FFT, HOP_LENGTH)
-
-    # Plot
-    img = librosa.display.specshow(
-        mel_spec, sr=sr, x_axis='time', y_axis='mel',
-        fmax=4000, ax=ax, cmap='viridis'
-    )
-
-    ax.set_title(title, fontsize=14, fontweight='bold')
-    plt.colorbar(img, ax=ax, format='%+2.0f dB')
-    plt.tight_layout()
+@metrics.timed("similar_cases")
+def show_similar_cases(similarity, model_input):
+    """List the labelled PhysioNet recordings nearest to the analysed input in embedding space."""
+    embedder, index = similarity
+    try:
+        matches = index.search(embedder.embed_batch(model_input)[0], SIMILARITY_TOP_K)
+    except Exception as e:
+        st.warning(f"Could not search similar cases: {e}")
+        return
 
-    return fig
+    st.subheader("🔎 Similar Labelled Recordings")
+    st.caption(f"Nearest of {len(index)} PhysioNet 2016 training recordings by CNN embedding")
+    for match in matches:
+        st.write(f"**{match['file_id']}** - {match['label'].title()} (similarity {match['similarity']:.2f})")
+        audio_path = PHYSIONET_DIR / match['source']
+        if match['source'] and audio_path.exists():
+            st.audio(str(audio_path))
+
+def plot_spectrogram(audio, sr, profile):
+    """Render the mel-spectrogram of the audio as PNG bytes (viridis, low frequencies at the bottom)."""
+    mel_spec = audio_to_melspectrogram(audio, sr, profile.n_mels, profile.n_fft, profile.hop_length)
+    return spectrogram_png(mel_spec)
+
+def figure_to_png(fig):
+    """Render a matplotlib figure to PNG bytes and release it."""
+    import matplotlib.pyplot as plt
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', bbox_inches='tight')
+    plt.close(fig)
+    return buf.getvalue()
+
+def render_plot_png(plots, name, render_fn):
+    """Return the PNG for a plot from `plots`, calling `render_fn` for the PNG bytes on first use."""
+    if name not in plots:
+        plots[name] = render_fn()
+    return plots[name]
 
 def generate_qr_code(data):
     """Generate QR code for the given data."""
+    import qrcode
+
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_L,
@@ -249,6 +310,8 @@ def get_confidence_color(confidence):
 
 def create_confidence_gauge(confidence, predicted_class):
     """Create a confidence gauge visualization."""
+    import matplotlib.pyplot as plt
+
     fig, ax = plt.subplots(figsize=(8, 2))
 
     # Create gauge background
@@ -314,20 +377,9 @@ def get_medical_insights(predicted_class, confidence):
 
     return base_insights
 
-def plot_waveform(audio, sr, title="Audio Waveform"):
-    """Create waveform visualization."""
-    fig, ax = plt.subplots(figsize=(10, 3))
-
-    time = np.linspace(0, len(audio)/sr, len(audio))
-    ax.plot(time, audio, color='#1f77b4', linewidth=1)
-
-    ax.set_xlabel('Time (seconds)')
-    ax.set_ylabel('Amplitude')
-    ax.set_title(title, fontsize=14, fontweight='bold')
-    ax.grid(True, alpha=0.3)
-
-    plt.tight_layout()
-    return fig
+def plot_waveform(audio, sr):
+    """Render the waveform as PNG bytes, decimated to screen resolution."""
+    return waveform_png(audio)
 
 def load_demo_spectrogram(label_type="normal"):
     """Load a demo spectrogram from processed data."""
@@ -370,6 +422,7 @@ def create_sample_audio(duration=5.0, sr=8000, label="normal"):
                     0.1 * np.random.normal(0, 0.15, len(t)))
 
         # Normalize
+        import librosa
         audio = librosa.util.normalize(audio)
 
         return audio, sr
@@ -398,8 +451,8 @@ def demo_prediction_analysis():
     }
     return analysis_text
 
-def safe_model_prediction(model, preprocessed_audio):
-    """Safe model prediction with comprehensive error handling."""
+def safe_model_prediction(model, preprocessed_audio, offload):
+    """Safe model prediction (in a worker process for TFLite models) with comprehensive error handling."""
     try:
         if model is None:
             raise ValueError("Model not loaded")
@@ -414,12 +467,12 @@ def safe_model_prediction(model, preprocessed_audio):
         if len(actual_shape) != len(expected_shape):
             raise ValueError(f"Input shape mismatch: expected {expected_shape}, got {actual_shape}")
 
-        prediction = model.predict(preprocessed_audio, verbose=0)
+        prediction = offload.predict(model, preprocessed_audio)
 
         if prediction is None or len(prediction) == 0:
             raise ValueError("Model returned empty prediction")
 
-        confidence = float(prediction[0][0])
+        confidence = float(prediction[0])
 
         # Validate confidence range
         if not (0 <= confidence <= 1):
@@ -496,10 +549,25 @@ def main():
     # Load model and metadata
     model = load_model()
     metadata = load_model_metadata()
+    result_cache = get_result_cache()
 
     if model is None:
         st.error("❌ Could not load the trained model. Please check the models directory.")
         return
+    # Cached results and demo inputs are only valid for the served model's preprocessing profile
+    profile = get_preprocessing_profile(model)
+    if profile is None:
+        return
+    pipeline_version = preprocessing_version("librosa", profile)
+    demo_bundle = get_demo_bundle(pipeline_version)
+    # TFLite models come with their worker pool; the Keras fallback gets one for decoding only
+    offload = model.pool if isinstance(model, OffloadedModel) else get_offload_pool(None)
+    similarity = get_similarity_search(model)
+
+    # Warm-up runs in the background (TFLite: through the worker pool); predictions wait for it
+    # (see ensure_model_ready)
+    warmup = get_model_warmup(model)
+    start_metrics_reporter()
 
     # Sidebar with information
     with st.sidebar:
@@ -511,11 +579,31 @@ def main():
             st.write(f"**Model Type:** CNN")
             st.write(f"**Input Shape:** {metadata.get('input_shape', 'N/A')}")
 
+        with st.expander("🧵 Worker Pool"):
+            st.json(offload.stats())
+
+        with st.expander("🔥 Model Warm-up"):
+            st.json(warmup.status())
+
+        with st.expander("🎧 Audio Decoding"):
+            st.json(decode_stats.summary())
+
+        with st.expander("🗃️ Result Cache"):
+            st.json(result_cache.stats())
+
+        with st.expander("🖼️ Plot Cache"):
+            st.json(render_cache_stats())
+
+        if metrics.enabled():
+            with st.expander("⏱️ Stage Timings"):
+                st.json(metrics.registry.snapshot())
+
         st.markdown("---")
         st.header("🔧 Configuration")
-        st.write(f"Sample Rate: {SAMPLE_RATE} Hz")
-        st.write(f"Duration: {AUDIO_DURATION}s")
-        st.write(f"Mel Bins: {N_MELS}")
+        st.write(f"Profile: {profile.key}")
+        st.write(f"Sample Rate: {profile.sample_rate} Hz")
+        st.write(f"Duration: {profile.duration}s")
+        st.write(f"Mel Bins: {profile.n_mels}")
 
         st.markdown("---")
         st.header("📱 Mobile Recording")
@@ -690,6 +778,8 @@ def main():
         st.info("🔍 Button clicked! Starting analysis...")
         audio_data = None
         audio_sr = None
+        cache_key = None
+        cached_result = None
 
         # Handle uploaded file
         if uploaded_file is not None:
@@ -699,67 +789,93 @@ def main():
                 st.error(f"❌ {validation_msg}")
                 return
 
-            with st.spinner("Processing uploaded audio..."):
-                try:
-                    preprocessed, audio_data, audio_sr = preprocess_uploaded_audio(uploaded_file)
-                    if preprocessed is None or audio_data is None:
-                        handle_processing_error("Failed to process audio file", "Audio preprocessing failed")
+            # Identical uploads (from any session) reuse the cached analysis
+            cache_key = content_key(uploaded_file.getvalue(), model_version(model), pipeline_version)
+            cached_result = result_cache.get(cache_key)
+
+            if cached_result is not None:
+                st.success("⚡ Reusing cached analysis for this recording")
+                preprocessed = cached_result['model_input']
+                audio_data, audio_sr = cached_result['audio'], cached_result['sr']
+            else:
+                with st.spinner("Processing uploaded audio..."):
+                    try:
+                        preprocessed, audio_data, audio_sr = preprocess_uploaded_audio(uploaded_file, profile, offload)
+                        if preprocessed is None or audio_data is None:
+                            handle_processing_error("Failed to process audio file", "Audio preprocessing failed")
+                            return
+                    except Exception as e:
+                        handle_processing_error(str(e), "Audio preprocessing error")
                         return
-                except Exception as e:
-                    handle_processing_error(str(e), "Audio preprocessing error")
-                    return
 
         # Handle demo selection
         elif demo_option != "None":
-            with st.spinner("Loading demo audio..."):
-                if "Synthetic" in demo_option:
-                    st.write("🎵 Generating synthetic audio...")
-                    # Generate synthetic audio
-                    label = "normal" if "Normal" in demo_option else "abnormal"
-                    audio_data, audio_sr = create_sample_audio(label=label)
-                    demo_type = "synthetic"
-                    if audio_data is not None:
-                        st.success(f"✅ Demo loaded: {demo_option} ({len(audio_data)} samples)")
-                    else:
-                        st.error("Could not generate demo audio.")
+            label = "normal" if "Normal" in demo_option else "abnormal"
+            kind = "real" if "Real Dataset" in demo_option else "synthetic"
+            demo_sample = demo_bundle.choose(label, kind) if demo_bundle is not None else None
+
+            if demo_sample is not None:
+                # Precomputed bundle entry: no synthesis, inversion, featurization or plotting
+                cached_result = demo_bundle.analysis(demo_sample)
+                preprocessed = cached_result['model_input']
+                audio_data, audio_sr = cached_result['audio'], cached_result['sr']
+                demo_type = "synthetic" if kind == "synthetic" else f"real dataset ({demo_sample['source']})"
+
+                if demo_bundle.model_version != model_version(model):
+                    # The bundle was built with another model file; only the prediction is redone
+                    if not ensure_model_ready(warmup):
+                        return
+                    predicted_class, confidence = safe_model_prediction(model, preprocessed, offload)
+                    if predicted_class is None:
                         return
-                elif "Real Dataset" in demo_option:
-                    # Load real dataset sample
-                    label = "normal" if "Normal" in demo_option else "abnormal"
-                    spectrogram, filename = load_demo_spectrogram(label)
-                    if spectrogram is not None:
-                        # Convert spectrogram back to approximate audio for demo
-                        try:
-                            audio_data = librosa.feature.inverse.mel_to_audio(
-                                spectrogram, sr=SAMPLE_RATE, n_fft=N_FFT, hop_length=HOP_LENGTH
-                            )
-                            audio_sr = SAMPLE_RATE
-                            demo_type = f"real dataset ({filename})"
-                            st.success(f"✅ Demo loaded: {demo_option}")
-                        except Exception as e:
-                            st.error(f"Could not reconstruct audio from spectrogram: {e}")
+                    cached_result.update(predicted_class=predicted_class, confidence=confidence)
+                st.success(f"✅ Demo loaded: {demo_option}")
+            else:
+                with st.spinner("Loading demo audio..."):
+                    if "Synthetic" in demo_option:
+                        st.write("🎵 Generating synthetic audio...")
+                        # Generate synthetic audio
+                        label = "normal" if "Normal" in demo_option else "abnormal"
+                        audio_data, audio_sr = create_sample_audio(label=label)
+                        demo_type = "synthetic"
+                        if audio_data is not None:
+                            st.success(f"✅ Demo loaded: {demo_option} ({len(audio_data)} samples)")
+                        else:
+                            st.error("Could not generate demo audio.")
+                            return
+                    elif "Real Dataset" in demo_option:
+                        # Load real dataset sample
+                        label = "normal" if "Normal" in demo_option else "abnormal"
+                        spectrogram, filename = load_demo_spectrogram(label)
+                        if spectrogram is not None:
+                            # Convert spectrogram back to approximate audio for demo
+                            try:
+                                import librosa
+                                audio_data = librosa.feature.inverse.mel_to_audio(
+                                    spectrogram, sr=SAMPLE_RATE, n_fft=N_FFT, hop_length=HOP_LENGTH
+                                )
+                                audio_sr = SAMPLE_RATE
+                                demo_type = f"real dataset ({filename})"
+                                st.success(f"✅ Demo loaded: {demo_option}")
+                            except Exception as e:
+                                st.error(f"Could not reconstruct audio from spectrogram: {e}")
+                                return
+                        else:
+                            st.error("Could not load demo data. Please upload your own audio file.")
                             return
                     else:
-                        st.error("Could not load demo data. Please upload your own audio file.")
+                        # Legacy demo options
+                        label = "normal" if "Normal" in demo_option else "abnormal"
+                        audio_data, audio_sr = create_sample_audio(label=label)
+                        demo_type = "legacy demo"
+                        st.success(f"Loaded demo: {demo_option}")
+
+                    # Preprocess demo audio for model
+                    if audio_data is not None:
+                        preprocessed, processed_audio = profile.prepare_model_input(audio_data, audio_sr)
+                    else:
+                        st.error("Could not prepare demo audio for analysis.")
                         return
-                else:
-                    # Legacy demo options
-                    label = "normal" if "Normal" in demo_option else "abnormal"
-                    audio_data, audio_sr = create_sample_audio(label=label)
-                    demo_type = "legacy demo"
-                    st.success(f"Loaded demo: {demo_option}")
-
-                # Preprocess demo audio for model
-                if audio_data is not None:
-                    processed_audio = preprocess_audio(audio_data, audio_sr, AUDIO_DURATION)
-                    mel_spec = audio_to_melspectrogram(
-                        processed_audio, SAMPLE_RATE,
-                        N_MELS, N_FFT, HOP_LENGTH
-                    )
-                    preprocessed = np.expand_dims(mel_spec, axis=[0, -1])
-                else:
-                    st.error("Could not prepare demo audio for analysis.")
-                    return
 
         else:
             st.error("🚨 **No audio to analyze!**")
@@ -771,15 +887,24 @@ def main():
 
         if audio_data is not None and audio_sr is not None:
             st.info("✅ Audio data ready, starting prediction...")
-            # Make prediction with error handling
-            with st.spinner("Analyzing heart sound..."):
-                st.write("🧠 Loading model and making prediction...")
-                predicted_class, confidence = safe_model_prediction(model, preprocessed)
-                st.write(f"🎯 Prediction complete: {predicted_class} ({confidence:.1%})")
+            if cached_result is not None:
+                predicted_class, confidence = cached_result['predicted_class'], cached_result['confidence']
+            else:
+                if not ensure_model_ready(warmup):
+                    return
+
+                # Make prediction with error handling
+                with st.spinner("Analyzing heart sound..."):
+                    st.write("🧠 Loading model and making prediction...")
+                    predicted_class, confidence = safe_model_prediction(model, preprocessed, offload)
+                    st.write(f"🎯 Prediction complete: {predicted_class} ({confidence:.1%})")
 
             if predicted_class is None:
                 st.error("❌ Could not complete analysis. Please try again.")
                 return
+
+            # Rendered plots are cached with the result as PNG bytes
+            plots = dict(cached_result['plots']) if cached_result is not None else {}
             
             # Display results
             st.markdown("---")
@@ -828,24 +953,28 @@ def main():
                 with col_viz1:
                     try:
                         st.write("**Confidence Gauge:**")
-                        gauge_fig = create_confidence_gauge(confidence, predicted_class)
-                        st.pyplot(gauge_fig)
+                        st.image(render_plot_png(
+                            plots, 'gauge', lambda: figure_to_png(create_confidence_gauge(confidence, predicted_class))
+                        ), use_column_width=True)
                     except Exception as e:
                         st.warning(f"Could not create confidence gauge: {e}")
 
                 with col_viz2:
                     try:
                         st.write("**Audio Waveform:**")
-                        waveform_fig = plot_waveform(audio_data, audio_sr, "Heart Sound Waveform")
-                        st.pyplot(waveform_fig)
+                        st.image(render_plot_png(
+                            plots, 'waveform', lambda: plot_waveform(audio_data, audio_sr)
+                        ), caption=f"Heart Sound Waveform ({len(audio_data)/audio_sr:.1f}s)",
+                            use_column_width=True)
                     except Exception as e:
                         st.warning(f"Could not create waveform plot: {e}")
 
                 # Spectrogram
                 try:
                     st.write("**Mel-Spectrogram:**")
-                    spec_fig = plot_spectrogram(audio_data, audio_sr, "Heart Sound Analysis")
-                    st.pyplot(spec_fig)
+                    st.image(render_plot_png(
+                        plots, 'spectrogram', lambda: plot_spectrogram(audio_data, audio_sr, profile)
+                    ), caption="Mel bins (low to high, bottom to top) over time", use_column_width=True)
                 except Exception as e:
                     st.warning(f"Could not create spectrogram: {e}")
                     st.info("This may be due to audio processing issues, but the prediction is still valid.")
@@ -875,6 +1004,10 @@ def main():
                 # Next steps
                 st.write(f"**Next Steps:** {insights['next_steps']}")
 
+                # Similar labelled cases for reviewing abnormal results
+                if predicted_class == "Abnormal" and similarity is not None:
+                    show_similar_cases(similarity, preprocessed)
+
                 # Technical details in expander
                 with st.expander("🔧 Technical Details"):
                     col_tech1, col_tech2 = st.columns(2)
@@ -883,8 +1016,8 @@ def main():
                         st.write("**Audio Properties:**")
                         st.write(f"- Sample Rate: {audio_sr} Hz")
                         st.write(f"- Duration: {len(audio_data)/audio_sr:.1f} seconds")
-                        st.write(f"- Processed Length: {AUDIO_DURATION} seconds")
-                        st.write(f"- Mel Bins: {N_MELS}")
+                        st.write(f"- Processed Length: {profile.duration} seconds")
+                        st.write(f"- Mel Bins: {profile.n_mels}")
 
                     with col_tech2:
                         st.write("**Model Performance:**")
@@ -896,13 +1029,16 @@ def main():
 
                 # Waveform visualization
                 st.subheader("🌊 Audio Waveform Visualization")
-                fig_waveform = plot_waveform(audio_data, audio_sr, "Heart Sound Waveform")
-                st.pyplot(fig_waveform)
+                st.image(render_plot_png(
+                    plots, 'waveform', lambda: plot_waveform(audio_data, audio_sr)
+                ), caption=f"Heart Sound Waveform ({len(audio_data)/audio_sr:.1f}s)",
+                    use_column_width=True)
 
                 # Confidence gauge
                 st.subheader("Gauge")
-                fig_gauge = create_confidence_gauge(confidence, predicted_class)
-                st.pyplot(fig_gauge)
+                st.image(render_plot_png(
+                    plots, 'gauge', lambda: figure_to_png(create_confidence_gauge(confidence, predicted_class))
+                ), use_column_width=True)
 
                 # Medical insights
                 st.subheader("🩺 Medical Insights")
@@ -948,6 +1084,17 @@ def main():
                             - Represents actual clinical recordings
                             """)
 
+                # Store the full analysis for identical uploads
+                if cache_key is not None and cached_result is None:
+                    result_cache.put(cache_key, {
+                        'model_input': preprocessed,
+                        'audio': audio_data,
+                        'sr': audio_sr,
+                        'predicted_class': predicted_class,
+                        'confidence': confidence,
+                        'plots': plots
+                    })
+
                 # Medical disclaimer
                 st.markdown("---")
                 st.warning("""
@@ -0,0 +1,429 @@
+"""
+In-memory audio decoding for the Heart Sound Analyzer.
+Decodes uploads straight from their bytes, so no request touches the disk.
+"""
+
+import io
+import time
+import shutil
+import struct
+import threading
+import subprocess
+import numpy as np
+from collections import defaultdict, deque
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple, Union
+
+from config import SAMPLE_RATE, FFMPEG_TIMEOUT, REQUEST_MEMORY_BUDGET_MB, OVERSIZE_POLICY
+from benchmarking import summarize_timings
+from metrics import increment, timed
+
+AudioBytes = Union[bytes, bytearray, memoryview]
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+def upload_bytes(source) -> memoryview:
+    """Return the raw bytes of an upload (Streamlit UploadedFile, BytesIO or bytes) without copying."""
+    if isinstance(source, memoryview):
+        return source
+    if isinstance(source, (bytes, bytearray)):
+        return memoryview(source)
+    if isinstance(source, io.BytesIO):
+        return source.getbuffer()
+    return memoryview(source.getvalue())
+
+def is_wav(data: AudioBytes) -> bool:
+    header = bytes(data[:12])
+    return len(header) == 12 and header[:4] == b'RIFF' and header[8:] == b'WAVE'
+
+def parse_wav_chunks(data: AudioBytes) -> Tuple[dict, memoryview]:
+    """
+    Walk the RIFF chunks of a WAV file.
+
+    Returns:
+        Tuple of (fmt fields, memoryview over the sample data)
+
+    Raises:
+        ValueError: If the data is not a well-formed WAV file
+    """
+    data = memoryview(data).cast('B')
+    if not is_wav(data):
+        raise ValueError("Not a RIFF/WAVE file")
+
+    fmt, samples = None, None
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id = bytes(data[offset:offset + 4])
+        chunk_size = struct.unpack_from('<I', data, offset + 4)[0]
+        body = data[offset + 8:offset + 8 + chunk_size]
+
+        if chunk_id == b'fmt ':
+            if len(body) < 16:
+                raise ValueError("Truncated fmt chunk")
+            format_tag, channels, sample_rate, _, block_align, bits = struct.unpack_from('<HHIIHH', body)
+            fmt = {'format_tag': format_tag, 'channels': channels, 'sample_rate': sample_rate,
+                   'block_align': block_align, 'bits_per_sample': bits}
+            if format_tag == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                # The sub-format GUID starts with the plain format tag
+                fmt['sub_format'] = struct.unpack_from('<H', body, 24)[0]
+        elif chunk_id == b'data':
+            # Streaming writers may leave the size at 0; the slice also clips oversized values
+            samples = body if chunk_size else data[offset + 8:]
+            break
+
+        offset += 8 + chunk_size + (chunk_size & 1)  # Chunks are word aligned
+
+    if fmt is None or samples is None:
+        raise ValueError("WAV file has no fmt or data chunk")
+    return fmt, samples
+
+def _sample_format(fmt: dict) -> int:
+    """Effective format tag, resolving WAVE_FORMAT_EXTENSIBLE to its sub-format."""
+    if fmt['format_tag'] == WAVE_FORMAT_EXTENSIBLE:
+        return fmt.get('sub_format', 0)
+    return fmt['format_tag']
+
+def _frames_view(samples: memoryview, fmt: dict) -> Tuple[np.ndarray, float]:
+    """
+    View the sample data as an (n_frames, channels) array plus its full-scale value.
+
+    8/16/32-bit PCM and float data are zero-copy views of the upload buffer;
+    24-bit PCM is assembled into int32 from strided byte columns.
+    """
+    channels = fmt['channels']
+    width = fmt['block_align'] // channels  # Container size; valid bits are left-justified
+    sample_format = _sample_format(fmt)
+    n_frames = len(samples) // (width * channels)
+    samples = samples[:n_frames * width * channels]
+
+    if sample_format == WAVE_FORMAT_IEEE_FLOAT and width in (4, 8):
+        frames = np.frombuffer(samples, dtype=f'<f{width}')
+        scale = 1.0
+    elif sample_format == WAVE_FORMAT_PCM and width == 1:
+        frames = np.frombuffer(samples, dtype=np.uint8)
+        scale = 128.0
+    elif sample_format == WAVE_FORMAT_PCM and width in (2, 4):
+        frames = np.frombuffer(samples, dtype=f'<i{width}')
+        scale = float(2 ** (8 * width - 1))
+    elif sample_format == WAVE_FORMAT_PCM and width == 3:
+        # Assemble int32 from strided byte columns; the signed top byte sign-extends
+        raw = np.frombuffer(samples, dtype=np.uint8).reshape(-1, 3)
+        frames = raw[:, 2].view(np.int8).astype(np.int32) << 16
+        frames |= raw[:, 1].astype(np.int32) << 8
+        frames |= raw[:, 0]
+        scale = float(2 ** 23)
+    else:
+        raise ValueError(f"Unsupported WAV format: {fmt}")
+
+    return frames.reshape(-1, channels), scale
+
+def read_wav(data: AudioBytes, max_seconds: Optional[float] = None) -> Tuple[np.ndarray, int]:
+    """
+    Decode WAV bytes to mono float32 in [-1, 1].
+
+    Supports 8/16/24/32-bit PCM and 32/64-bit IEEE float, plain or
+    WAVE_FORMAT_EXTENSIBLE, with any number of channels. Samples are viewed
+    in place with np.frombuffer and downmixed from a strided
+    (frames, channels) view, so the float output is the only full-size copy.
+
+    Args:
+        data: WAV file bytes
+        max_seconds: Decode only this much audio from the start (None for all of it)
+
+    Returns:
+        Tuple of (audio_data, sample_rate)
+
+    Raises:
+        ValueError: If the data is not a supported WAV file
+    """
+    fmt, samples = parse_wav_chunks(data)
+    if fmt['channels'] < 1 or fmt['block_align'] < fmt['channels']:
+        raise ValueError(f"Invalid WAV format: {fmt}")
+
+    if max_seconds is not None:
+        samples = samples[:int(max_seconds * fmt['sample_rate']) * fmt['block_align']]
+
+    frames, scale = _frames_view(samples, fmt)
+    channels = frames.shape[1]
+
+    # Downmix by accumulating strided per-channel column views
+    audio = frames[:, 0].astype(np.float32)
+    for channel in range(1, channels):
+        audio += frames[:, channel]
+
+    if frames.dtype == np.uint8:
+        audio -= np.float32(128.0 * channels)
+    if scale * channels != 1.0:
+        audio *= np.float32(1.0 / (scale * channels))
+    return audio, fmt['sample_rate']
+
+def resample_linear(audio: np.ndarray, orig_sr: int, target_sr: int) -> np.ndarray:
+    """
+    Fast linear-interpolation resampling (no anti-aliasing filter).
+
+    Works by gathering the two neighbours of each output sample, so memory
+    scales with the output length rather than the (usually longer) input.
+    """
+    if orig_sr == target_sr or len(audio) == 0:
+        return audio
+    new_length = int(len(audio) * target_sr / orig_sr)
+    if len(audio) < 2:
+        return np.full(new_length, audio[0], dtype=np.float32)
+
+    positions = np.linspace(0, len(audio) - 1, new_length)
+    left = np.minimum(positions.astype(np.intp), len(audio) - 2)
+    fraction = (positions - left).astype(np.float32)
+    resampled = audio[left].astype(np.float32)
+    resampled += fraction * (audio[left + 1] - resampled)
+    return resampled
+
+def sniff_format(data: AudioBytes) -> str:
+    """Identify an audio container from its magic bytes (the upload's file name is not trusted)."""
+    header = bytes(data[:12])
+    if is_wav(header):
+        return 'wav'
+    if header[:4] == b'fLaC':
+        return 'flac'
+    if header[:4] == b'OggS':
+        return 'ogg'
+    if header[:4] == b'\x1a\x45\xdf\xa3':
+        return 'webm'
+    if header[4:8] == b'ftyp':
+        return 'mp4'
+    if header[:3] == b'ID3' or (len(header) >= 2 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0):
+        return 'mp3'
+    return 'unknown'
+
+class DecoderUnavailable(Exception):
+    """The decoder's library or binary is not installed on this host."""
+
+class UploadTooLarge(ValueError):
+    """Decoding the upload would exceed the per-request memory budget."""
+
+# Lowest plausible bitrate per compressed format; bounds the decoded length from the upload size
+COMPRESSED_MIN_BYTES_PER_SECOND = {
+    'flac': 16000, 'ogg': 4000, 'mp3': 4000, 'webm': 4000, 'mp4': 4000, 'unknown': 4000
+}
+COMPRESSED_ASSUMED_FORMAT = {'sample_rate': 48000, 'channels': 2}
+
+def projected_decode_cost(data: AudioBytes, target_sr: int = SAMPLE_RATE) -> Tuple[float, float]:
+    """
+    Estimate how much audio an upload holds and what decoding it costs in memory.
+
+    Per source frame this counts the decoder's output (up to 4 bytes per
+    channel) and the float32 mono downmix; per resampled frame, the resampler
+    output and working arrays plus librosa's framed RMS during silence
+    trimming (~40 bytes, measured with metrics.profile_memory). WAV lengths
+    come from the header; compressed lengths are upper bounds from
+    COMPRESSED_MIN_BYTES_PER_SECOND.
+
+    Returns:
+        Tuple of (seconds of audio, projected bytes per second of audio)
+    """
+    audio_format = sniff_format(data)
+    fmt = None
+    if audio_format == 'wav':
+        try:
+            fmt, samples = parse_wav_chunks(data)
+            seconds = len(samples) / max(1, fmt['block_align']) / max(1, fmt['sample_rate'])
+        except ValueError:
+            fmt = None
+    if fmt is None:
+        fmt = COMPRESSED_ASSUMED_FORMAT
+        seconds = len(data) / COMPRESSED_MIN_BYTES_PER_SECOND.get(audio_format, 4000)
+
+    source_rate = max(1, fmt['sample_rate'])
+    bytes_per_frame = 4 * max(1, fmt['channels']) + 4 + 40 * target_sr / source_rate
+    return seconds, bytes_per_frame * source_rate
+
+def check_memory_budget(data: AudioBytes, target_sr: int = SAMPLE_RATE,
+                        budget_mb: float = REQUEST_MEMORY_BUDGET_MB,
+                        policy: str = OVERSIZE_POLICY) -> Optional[float]:
+    """
+    Admission control before decoding.
+
+    Args:
+        data: Raw upload bytes
+        target_sr: Target sample rate in Hz
+        budget_mb: Memory allowed for decoding and preprocessing one upload
+        policy: 'truncate' to decode only what fits, 'reject' to refuse the upload
+
+    Returns:
+        None if the upload fits, otherwise the number of seconds to decode
+
+    Raises:
+        UploadTooLarge: If the upload does not fit and the policy is 'reject'
+    """
+    if policy not in ('truncate', 'reject'):
+        raise ValueError(f"Unknown oversize policy: {policy!r}")
+    seconds, bytes_per_second = projected_decode_cost(data, target_sr)
+    budget = budget_mb * 1024 * 1024
+    if seconds * bytes_per_second <= budget:
+        return None
+
+    if policy == 'reject':
+        increment("uploads_rejected_total")
+        raise UploadTooLarge(
+            f"Decoding this upload would need about {seconds * bytes_per_second / (1024 * 1024):.0f}MB "
+            f"({seconds:.0f}s of audio); the limit is {budget_mb:g}MB"
+        )
+    increment("uploads_truncated_total")
+    return budget / bytes_per_second
+
+def _decode_native_wav(data: AudioBytes, target_sr: int,
+                       max_seconds: Optional[float] = None) -> Tuple[np.ndarray, int]:
+    return read_wav(data, max_seconds)
+
+def _decode_soundfile(data: AudioBytes, target_sr: int,
+                      max_seconds: Optional[float] = None) -> Tuple[np.ndarray, int]:
+    try:
+        import soundfile as sf
+    except ImportError:
+        raise DecoderUnavailable("soundfile is not installed")
+    try:
+        with sf.SoundFile(io.BytesIO(data)) as f:
+            sr = f.samplerate
+            frames = -1 if max_seconds is None else int(max_seconds * sr)
+            audio = f.read(frames, dtype='float32', always_2d=True)
+    except Exception as e:
+        raise ValueError(str(e))
+    return audio.mean(axis=1, dtype=np.float32) if audio.shape[1] > 1 else audio[:, 0], sr
+
+@lru_cache(maxsize=1)
+def ffmpeg_path() -> Optional[str]:
+    return shutil.which('ffmpeg')
+
+def _decode_ffmpeg(data: AudioBytes, target_sr: int,
+                   max_seconds: Optional[float] = None) -> Tuple[np.ndarray, int]:
+    """Pipe the upload through ffmpeg, which also downmixes and resamples."""
+    if ffmpeg_path() is None:
+        raise DecoderUnavailable("ffmpeg is not installed")
+    limit = [] if max_seconds is None else ['-t', f"{max_seconds:.3f}"]
+    result = subprocess.run(
+        [ffmpeg_path(), '-hide_banner', '-loglevel', 'error', '-i', 'pipe:0', *limit,
+         '-f', 'f32le', '-ac', '1', '-ar', str(target_sr), 'pipe:1'],
+        input=data, capture_output=True, timeout=FFMPEG_TIMEOUT
+    )
+    if result.returncode != 0:
+        raise ValueError(result.stderr.decode(errors='replace').strip() or "ffmpeg failed")
+    return np.frombuffer(result.stdout, dtype='<f4'), target_sr
+
+def _decode_librosa(data: AudioBytes, target_sr: int,
+                    max_seconds: Optional[float] = None) -> Tuple[np.ndarray, int]:
+    try:
+        import librosa
+    except ImportError:
+        raise DecoderUnavailable("librosa is not installed")
+    try:
+        return librosa.load(io.BytesIO(data), sr=None, mono=True, duration=max_seconds)
+    except Exception as e:
+        raise ValueError(str(e))
+
+DECODERS = {
+    'native_wav': _decode_native_wav,
+    'soundfile': _decode_soundfile,
+    'ffmpeg': _decode_ffmpeg,
+    'librosa': _decode_librosa,
+}
+
+# Decoders tried for each sniffed format, fastest first
+FORMAT_DECODERS = {
+    'wav': ('native_wav', 'soundfile', 'ffmpeg'),
+    'flac': ('soundfile', 'ffmpeg'),
+    'ogg': ('soundfile', 'ffmpeg'),
+    'mp3': ('soundfile', 'ffmpeg', 'librosa'),
+    'webm': ('ffmpeg',),
+    'mp4': ('ffmpeg',),
+    'unknown': ('soundfile', 'ffmpeg', 'librosa'),
+}
+
+class DecodeStats:
+    """Thread-safe decode timings per (format, decoder)."""
+
+    def __init__(self, window: int = 512):
+        self._lock = threading.Lock()
+        self._timings = defaultdict(lambda: deque(maxlen=window))
+        self._failures = defaultdict(int)
+
+    def record(self, audio_format: str, decoder: str, elapsed_ms: float):
+        with self._lock:
+            self._timings[(audio_format, decoder)].append(elapsed_ms)
+
+    def record_failure(self, audio_format: str):
+        with self._lock:
+            self._failures[audio_format] += 1
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            timings = {key: list(values) for key, values in self._timings.items()}
+            failures = dict(self._failures)
+        summary = {
+            f"{audio_format}/{decoder}": summarize_timings(values)
+            for (audio_format, decoder), values in sorted(timings.items())
+        }
+        if failures:
+            summary['failures'] = failures
+        return summary
+
+decode_stats = DecodeStats()
+
+@timed("decode_audio")
+def decode_audio(data: AudioBytes, target_sr: int = SAMPLE_RATE,
+                 fast_resample: bool = False,
+                 memory_budget_mb: Optional[float] = REQUEST_MEMORY_BUDGET_MB,
+                 oversize_policy: str = OVERSIZE_POLICY) -> Tuple[np.ndarray, int]:
+    """
+    Decode uploaded audio bytes to mono float32 at the target sample rate.
+
+    The container is sniffed from its magic bytes and handed to the first
+    available decoder in FORMAT_DECODERS; no path writes a temporary file.
+    Uploads whose projected decode memory exceeds the budget are rejected or
+    decoded only up to the budget (see check_memory_budget). Decode times are
+    recorded per format in `decode_stats`.
+
+    Args:
+        data: Raw upload bytes
+        target_sr: Target sample rate in Hz
+        fast_resample: Use linear interpolation instead of librosa's resampler
+        memory_budget_mb: Per-request memory budget (None disables admission control)
+        oversize_policy: 'truncate' or 'reject' for uploads over the budget
+
+    Returns:
+        Tuple of (audio_data, sample_rate)
+
+    Raises:
+        UploadTooLarge: If the upload is over budget and the policy is 'reject'
+        ValueError: If no available decoder could decode the audio
+    """
+    data = memoryview(data)
+    max_seconds = None
+    if memory_budget_mb is not None:
+        max_seconds = check_memory_budget(data, target_sr, memory_budget_mb, oversize_policy)
+
+    audio_format = sniff_format(data)
+    errors = []
+    for name in FORMAT_DECODERS[audio_format]:
+        start = time.perf_counter()
+        try:
+            audio, sr = DECODERS[name](data, target_sr, max_seconds)
+        except (DecoderUnavailable, ValueError, subprocess.TimeoutExpired) as e:
+            errors.append(f"{name}: {e}")
+            continue
+        decode_stats.record(audio_format, name, (time.perf_counter() - start) * 1000)
+        break
+    else:
+        decode_stats.record_failure(audio_format)
+        raise ValueError(f"Could not decode {audio_format} audio ({'; '.join(errors)})")
+
+    if len(audio) == 0:
+        raise ValueError("Audio file contains no samples")
+
+    if sr != target_sr:
+        if fast_resample:
+            audio = resample_linear(audio, sr, target_sr)
+        else:
+            import librosa
+            audio = librosa.resample(audio, orig_sr=sr, target_sr=target_sr)
+    return audio, target_sr
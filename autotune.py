@@ -0,0 +1,183 @@
+"""
+Startup auto-tuning of TFLite interpreter threads and delegate selection.
+Benchmarks a few configurations on this host and caches the winner in a host profile.
+"""
+
+import os
+import json
+import time
+import hashlib
+import platform
+import threading
+import numpy as np
+from pathlib import Path
+from datetime import datetime
+from typing import Any, Dict, List
+
+from config import (
+    MODELS_DIR, HOST_PROFILE_PATH, INTERPRETER_POOL_SIZE, AUTOTUNE_INTERPRETERS
+)
+from inference import TFLiteModel, InterpreterPool, can_disable_xnnpack
+
+def host_fingerprint() -> str:
+    """Short identifier for this host's CPU/runtime combination."""
+    parts = [
+        platform.node(), platform.machine(), platform.processor(),
+        str(os.cpu_count()), platform.python_version()
+    ]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:12]
+
+def model_profile_key(model_path, pool_size: int) -> str:
+    """Profile key that changes whenever the model file or pool size changes."""
+    stat = Path(model_path).stat()
+    return f"{Path(model_path).name}:{stat.st_size}:{int(stat.st_mtime)}:pool{pool_size}"
+
+def candidate_configs(pool_size: int) -> List[Dict[str, Any]]:
+    """Thread counts and delegate options worth trying for a given pool size."""
+    cores = os.cpu_count() or 1
+    per_member = max(1, cores // max(1, pool_size))
+    thread_options = sorted({t for t in (1, 2, 4, per_member) if t <= max(cores, 1)})
+    # Without OpResolverType the interpreter ignores use_xnnpack=False, so that
+    # candidate would only re-measure the default and could be recorded as a win
+    xnnpack_options = (True, False) if can_disable_xnnpack() else (True,)
+    return [
+        {'num_threads': threads, 'use_xnnpack': use_xnnpack}
+        for threads in thread_options
+        for use_xnnpack in xnnpack_options
+    ]
+
+def benchmark_config(model_path, options: Dict[str, Any], pool_size: int,
+                     iterations: int = 20) -> float:
+    """
+    Measure aggregate throughput with `pool_size` interpreters invoked concurrently.
+
+    Returns:
+        Predictions per second on a synthetic input of the model's real shape
+    """
+    models = [TFLiteModel(model_path, batch_buckets=(1,), **options) for _ in range(pool_size)]
+    sample = np.random.randn(1, *models[0].input_shape[1:]).astype(np.float32)
+
+    # Warm-up so allocation and kernel selection are not measured
+    for model in models:
+        model.predict_batch(sample)
+
+    barrier = threading.Barrier(pool_size + 1)
+
+    def worker(model):
+        barrier.wait()
+        for _ in range(iterations):
+            model.predict_batch(sample)
+
+    threads = [threading.Thread(target=worker, args=(model,)) for model in models]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return pool_size * iterations / elapsed
+
+def calibrate(model_path, pool_size: int = INTERPRETER_POOL_SIZE,
+              iterations: int = 20) -> Dict[str, Any]:
+    """Benchmark all candidate configurations and return the fastest."""
+    candidates = []
+    for options in candidate_configs(pool_size):
+        try:
+            throughput = benchmark_config(model_path, options, pool_size, iterations)
+        except Exception as e:
+            print(f"   ⚠️ {options} failed: {e}")
+            continue
+        candidates.append({'options': options, 'throughput_per_s': throughput})
+
+    if not candidates:
+        raise RuntimeError(f"No interpreter configuration could run {model_path}")
+
+    best = max(candidates, key=lambda c: c['throughput_per_s'])
+    return {
+        'options': best['options'],
+        'throughput_per_s': best['throughput_per_s'],
+        'candidates': candidates,
+        'calibrated_at': datetime.now().isoformat(timespec='seconds')
+    }
+
+def load_host_profile(profile_path=HOST_PROFILE_PATH) -> Dict[str, Any]:
+    """Load the host profile file (empty dict if missing or unreadable)."""
+    try:
+        with open(profile_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_host_profile(profile: Dict[str, Any], profile_path=HOST_PROFILE_PATH):
+    """Atomically write the host profile file."""
+    profile_path = Path(profile_path)
+    tmp_path = profile_path.with_suffix('.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(profile, f, indent=2)
+    os.replace(tmp_path, profile_path)
+
+def get_tuned_options(model_path, pool_size: int = INTERPRETER_POOL_SIZE,
+                      profile_path=HOST_PROFILE_PATH,
+                      recalibrate: bool = False) -> Dict[str, Any]:
+    """
+    Interpreter options for this host, calibrating only if no profile entry exists.
+
+    Returns:
+        Keyword arguments for TFLiteModel/InterpreterPool (empty on failure,
+        which keeps the library defaults)
+    """
+    try:
+        profile = load_host_profile(profile_path)
+        host = host_fingerprint()
+        key = model_profile_key(model_path, pool_size)
+
+        entry = profile.get(host, {}).get(key)
+        if entry is None or recalibrate:
+            entry = calibrate(model_path, pool_size)
+            profile.setdefault(host, {})[key] = entry
+            save_host_profile(profile, profile_path)
+        return dict(entry['options'])
+    except Exception as e:
+        print(f"⚠️ Interpreter auto-tuning skipped: {e}")
+        return {}
+
+def create_tuned_pool(model_path, size: int = INTERPRETER_POOL_SIZE) -> InterpreterPool:
+    """Create an InterpreterPool using the host-tuned thread/delegate configuration."""
+    options = get_tuned_options(model_path, size) if AUTOTUNE_INTERPRETERS else {}
+    return InterpreterPool(model_path, size=size, **options)
+
+def tuned_worker_options(model_path, workers: int) -> Dict[str, Any]:
+    """
+    Interpreter options for a worker process that holds one interpreter, one of `workers`.
+
+    Calibrated as a pool of one, then the thread count is capped at
+    cores // workers so the workers together never oversubscribe the CPU.
+    """
+    options = get_tuned_options(model_path, 1) if AUTOTUNE_INTERPRETERS else {}
+    per_worker = max(1, (os.cpu_count() or 1) // max(1, workers))
+    options['num_threads'] = min(options.get('num_threads') or per_worker, per_worker)
+    return options
+
+def main():
+    """Recalibrate all TFLite models on this host and print the results."""
+    print("🔧 TFLite Interpreter Auto-Tuning")
+    print("=" * 50)
+    print(f"   Host: {host_fingerprint()} ({os.cpu_count()} cores)")
+    print(f"   Pool size: {INTERPRETER_POOL_SIZE}")
+
+    for model_path in sorted(MODELS_DIR.glob("*.tflite")):
+        print(f"\n🧠 {model_path.name}")
+        options = get_tuned_options(model_path, INTERPRETER_POOL_SIZE, recalibrate=True)
+        entry = load_host_profile().get(host_fingerprint(), {}).get(
+            model_profile_key(model_path, INTERPRETER_POOL_SIZE), {}
+        )
+        for candidate in entry.get('candidates', []):
+            print(f"   {candidate['options']}: {candidate['throughput_per_s']:.1f} predictions/s")
+        print(f"   ✅ Selected: {options}")
+
+    print(f"\n💾 Host profile saved to: {HOST_PROFILE_PATH}")
+
+if __name__ == "__main__":
+    main()
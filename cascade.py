@@ -0,0 +1,176 @@
+"""
+Cascaded inference for the Heart Sound Analyzer.
+A cheap first-stage classifier answers the confidently easy recordings; only
+those whose first-stage confidence falls in an uncertain band reach the CNN.
+"""
+
+import json
+import threading
+import numpy as np
+from functools import partial
+from pathlib import Path, PureWindowsPath
+from typing import Any, Callable, Dict
+
+from config import (
+    CASCADE_FIRST_STAGE_METADATA, CASCADE_LOWER_THRESHOLD, CASCADE_UPPER_THRESHOLD
+)
+import metrics
+from features import spectrogram_features
+from profiles import STANDARD_PROFILE, PreprocessingProfile, profile_for_served_model, profile_from_metadata
+
+def flattened_spectrogram(spectrograms: np.ndarray) -> np.ndarray:
+    """(N, n_mels, frames) -> (N, n_mels * frames), the mini RandomForest's input."""
+    return spectrograms.reshape(len(spectrograms), -1)
+
+def handcrafted_features(profile: PreprocessingProfile) -> Callable[[np.ndarray], np.ndarray]:
+    """features.spectrogram_features with `profile`'s sample rate and hop, so bins and frames map to the right Hz and seconds."""
+    return partial(spectrogram_features, sr=profile.sample_rate, hop_length=profile.hop_length)
+
+# First-stage feature sets by the name stored in the model metadata ('feature_set'),
+# each built for the preprocessing profile of the spectrograms it receives
+FIRST_STAGE_FEATURE_SETS: Dict[str, Callable[[PreprocessingProfile], Callable[[np.ndarray], np.ndarray]]] = {
+    'flattened_spectrogram': lambda profile: flattened_spectrogram,
+    'handcrafted': handcrafted_features
+}
+
+class FirstStageModel:
+    """scikit-learn classifier plus the feature set and preprocessing profile it was trained on."""
+
+    def __init__(self, model_path, feature_set: str = 'flattened_spectrogram',
+                 profile: PreprocessingProfile = STANDARD_PROFILE):
+        import joblib
+
+        if feature_set not in FIRST_STAGE_FEATURE_SETS:
+            raise ValueError(f"Unknown first-stage feature set {feature_set!r}")
+        self.model_path = Path(model_path)
+        self.feature_set = feature_set
+        self.profile = profile
+        self.featurize = FIRST_STAGE_FEATURE_SETS[feature_set](profile)
+        self.estimator = joblib.load(self.model_path)
+        if hasattr(self.estimator, 'n_jobs'):
+            # Fanning a request-sized batch out to threads costs more than it saves
+            self.estimator.n_jobs = 1
+        self._positive = list(self.estimator.classes_).index(1)
+
+    @classmethod
+    def from_metadata(cls, metadata_path=CASCADE_FIRST_STAGE_METADATA) -> 'FirstStageModel':
+        """Load the model described by a *_metadata.json file (model file next to it)."""
+        metadata_path = Path(metadata_path)
+        with open(metadata_path, 'r') as f:
+            metadata = json.load(f)
+        # Metadata may hold an absolute path from the training machine; keep only the file name
+        model_path = metadata_path.parent / PureWindowsPath(metadata['model_path']).name
+        # Metadata written before profiles existed describes standard-profile models
+        profile = profile_from_metadata(metadata) or STANDARD_PROFILE
+        return cls(model_path, metadata.get('feature_set', 'flattened_spectrogram'), profile)
+
+    @property
+    def name(self) -> str:
+        return self.model_path.name
+
+    def predict_proba(self, spectrograms: np.ndarray) -> np.ndarray:
+        """Abnormal-class probability for (N, n_mels, frames[, 1]) spectrograms."""
+        spectrograms = np.asarray(spectrograms, dtype=np.float32)
+        if spectrograms.ndim == 4:
+            spectrograms = spectrograms[..., 0]
+        features = self.featurize(spectrograms)
+        return self.estimator.predict_proba(features)[:, self._positive].astype(np.float32)
+
+class CascadeModel:
+    """
+    Two-stage model with the predict_batch/predict interface of TFLiteModel.
+
+    First-stage confidences below `lower` or above `upper` are returned as they
+    are; recordings in the uncertain band [lower, upper] are escalated to the
+    second stage (the CNN). lower=0, upper=1 escalates everything.
+    """
+
+    def __init__(self, first_stage: FirstStageModel, second_stage,
+                 lower: float = CASCADE_LOWER_THRESHOLD, upper: float = CASCADE_UPPER_THRESHOLD):
+        if not 0.0 <= lower <= upper <= 1.0:
+            raise ValueError(f"Cascade thresholds must satisfy 0 <= lower <= upper <= 1 (got {lower}, {upper})")
+        self.first_stage = first_stage
+        self.second_stage = second_stage
+        self.lower = float(lower)
+        self.upper = float(upper)
+        self.input_shape = second_stage.input_shape
+        # Lets MicroBatcher size its dispatch concurrency to the interpreter pool
+        self.size = getattr(second_stage, 'size', 1)
+
+        self._lock = threading.Lock()
+        self._predictions = 0
+        self._escalations = 0
+
+    @property
+    def name(self) -> str:
+        # Thresholds are part of the name, so cached results are keyed per band
+        second_name = getattr(self.second_stage, 'name', type(self.second_stage).__name__)
+        return f"cascade[{self.first_stage.name}>{second_name}@{self.lower:g}-{self.upper:g}]"
+
+    def escalation_mask(self, first_stage_confidences: np.ndarray) -> np.ndarray:
+        """True where a first-stage confidence falls in the uncertain band."""
+        return (first_stage_confidences >= self.lower) & (first_stage_confidences <= self.upper)
+
+    def predict_batch(self, batch: np.ndarray) -> np.ndarray:
+        """
+        Predict abnormal-class confidence, escalating uncertain samples to the CNN.
+
+        Args:
+            batch: Array of shape (N, n_mels, frames, 1) or (N, n_mels, frames)
+
+        Returns:
+            float32 array of shape (N,) with confidences in [0, 1]
+        """
+        batch = np.asarray(batch, dtype=np.float32)
+        with metrics.timed("cascade_first_stage"):
+            confidences = self.first_stage.predict_proba(batch)
+
+        escalate = self.escalation_mask(confidences)
+        escalated = int(escalate.sum())
+        if escalated:
+            confidences[escalate] = self.second_stage.predict_batch(batch[escalate])
+
+        with self._lock:
+            self._predictions += len(batch)
+            self._escalations += escalated
+        metrics.increment("cascade_predictions_total", len(batch))
+        metrics.increment("cascade_escalations_total", escalated)
+        return confidences
+
+    def predict(self, x: np.ndarray, verbose: int = 0) -> np.ndarray:
+        """Keras-compatible predict returning an (N, 1) array."""
+        return self.predict_batch(x)[:, np.newaxis]
+
+    def warm_up(self):
+        """Warm the CNN and run the first stage once."""
+        self.second_stage.warm_up()
+        self.first_stage.predict_proba(np.zeros((1,) + tuple(self.input_shape[1:]), dtype=np.float32))
+
+    def metrics(self) -> Dict[str, Any]:
+        """Second-stage (pool) metrics plus escalation counts."""
+        status = self.second_stage.metrics() if hasattr(self.second_stage, 'metrics') else {}
+        with self._lock:
+            status['cascade'] = {
+                'lower': self.lower,
+                'upper': self.upper,
+                'predictions': self._predictions,
+                'escalations': self._escalations,
+                'escalation_rate': self._escalations / self._predictions if self._predictions else 0.0
+            }
+        return status
+
+def create_cascade(second_stage, metadata_path=CASCADE_FIRST_STAGE_METADATA,
+                   lower: float = CASCADE_LOWER_THRESHOLD,
+                   upper: float = CASCADE_UPPER_THRESHOLD) -> CascadeModel:
+    """
+    Wrap a CNN (TFLiteModel / InterpreterPool) behind the first-stage model from its metadata.
+
+    Both stages receive the same spectrograms, so the first stage must have been
+    trained on the served CNN's preprocessing profile; raises ValueError otherwise.
+    """
+    first_stage = FirstStageModel.from_metadata(metadata_path)
+    served_profile = profile_for_served_model(second_stage)
+    if first_stage.profile.key != served_profile.key:
+        raise ValueError(f"First stage {first_stage.name} was trained on the {first_stage.profile.key} profile "
+                         f"but the served CNN uses {served_profile.key}; train a first stage for that profile")
+    return CascadeModel(first_stage, second_stage, lower, upper)
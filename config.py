@@ -10,13 +10,25 @@ SPECTROGRAMS_DIR = DATA_DIR / "spectrograms"
 MODELS_DIR = PROJECT_ROOT / "models"
 ASSETS_DIR = PROJECT_ROOT / "assets"
 
-# Audio processing settings
+# Audio processing settings (the 'standard' preprocessing profile, profiles.py)
 SAMPLE_RATE = 8000  # Target sample rate (Hz)
 AUDIO_DURATION = 5.0  # Fixed duration in seconds for training
 N_MELS = 128  # Number of mel frequency bins
 N_FFT = 1024  # FFT window size
 HOP_LENGTH = 256  # Hop length for STFT
 
+# Fast screening profile: heart sounds carry almost all their energy below ~800 Hz,
+# so 2 kHz audio with proportionally smaller FFTs keeps them at a quarter of the samples
+FAST_SAMPLE_RATE = 2000
+FAST_N_MELS = 64  # 129 FFT bins at n_fft=256 leave no empty mel filters at 64 bands
+FAST_N_FFT = 256  # Same 128 ms window as N_FFT at SAMPLE_RATE
+FAST_HOP_LENGTH = 64  # Same 32 ms hop, so the frame count matches (157 for 5 s)
+BANDPASS_LOW_HZ = 25.0  # Removes baseline wander and DC
+BANDPASS_HIGH_HZ = 800.0
+
+# Profile for models whose metadata names none (models bind their own profile, profiles.py)
+DEFAULT_PROFILE = os.getenv("PREPROCESSING_PROFILE", "standard")
+
 # Model settings
 BATCH_SIZE = 32  # Training batch size
 LEARNING_RATE = 1e-3  # Initial learning rate
@@ -28,12 +40,66 @@ VALIDATION_SPLIT = 0.2  # Validation split ratio
 CLASSIFICATION_THRESHOLD = 0.5  # Binary classification threshold
 CLASS_NAMES = ["Normal", "Abnormal"]
 
+# Inference settings
+INFERENCE_BATCH_BUCKETS = (1, 4, 16, 32)  # TFLite input batch sizes kept allocated
+INTERPRETER_POOL_SIZE = int(os.getenv("INTERPRETER_POOL_SIZE", min(4, os.cpu_count() or 1)))
+POOL_CHECKOUT_TIMEOUT = 30.0  # Seconds to wait for a free interpreter
+AUTOTUNE_INTERPRETERS = os.getenv("AUTOTUNE_INTERPRETERS", "1") == "1"  # Calibrate threads/delegate at startup
+HOST_PROFILE_PATH = MODELS_DIR / "host_profile.json"  # Cached per-host calibration results
+DEMO_BUNDLE_PATH = MODELS_DIR / "demo_bundle.npz"  # Precomputed demo recordings (scripts/build_demo_bundle.py)
+WARMUP_ITERATIONS = 5  # Timed synthetic predictions after the first (cold) one
+WARMUP_TIMEOUT = 120.0  # Seconds to wait for warm-up before giving up on a request
+
 # Streamlit app settings
 APP_PORT = 8501
 QR_UPDATE_INTERVAL = 30  # Seconds to refresh QR code
 
+# Offload pool settings (offload.py): decode, featurize and inference run in worker processes
+# shared by all Streamlit sessions, so a long upload does not hold the GIL other sessions need
+OFFLOAD_WORKERS = int(os.getenv("OFFLOAD_WORKERS", min(4, os.cpu_count() or 1)))  # 0 runs tasks in the calling thread
+OFFLOAD_MAX_PENDING = int(os.getenv("OFFLOAD_MAX_PENDING", 16))  # Queued + running tasks before submissions wait
+OFFLOAD_ADMISSION_TIMEOUT = 5.0  # Seconds a submission waits for a free slot before the server reports busy
+OFFLOAD_TASK_TIMEOUT = float(os.getenv("OFFLOAD_TASK_TIMEOUT", 60))  # Seconds a caller waits for one task
+
+# Result cache settings (shared across reruns and sessions)
+RESULT_CACHE_MAX_ENTRIES = 256
+RESULT_CACHE_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", 256))
+RESULT_CACHE_TTL_SECONDS = 3600
+RENDER_CACHE_MAX_ENTRIES = 512  # Rendered plot PNGs, keyed by content hash
+RENDER_CACHE_MAX_MB = 64
+
+# Inference service settings
+SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", 8600))
+MICROBATCH_MAX_SIZE = 32  # Largest batch collected from concurrent requests
+MICROBATCH_MAX_WAIT_MS = float(os.getenv("MICROBATCH_MAX_WAIT_MS", 10))  # Latency budget for filling a batch
+MAX_REQUEST_BYTES = 50 * 1024 * 1024  # Same 50MB limit as the upload validator
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "standard")  # 'standard' (micro-batched) or 'preallocated' (in-place, batch 1)
+
+# Cascade settings (cascade.py): the first stage answers confident cases, the CNN the rest
+CASCADE_ENABLED = os.getenv("CASCADE_ENABLED", "0") == "1"
+CASCADE_FIRST_STAGE_METADATA = Path(os.getenv("CASCADE_FIRST_STAGE_METADATA", MODELS_DIR / "mini_model_metadata.json"))
+CASCADE_LOWER_THRESHOLD = float(os.getenv("CASCADE_LOWER_THRESHOLD", 0.2))  # Below this: Normal without the CNN
+CASCADE_UPPER_THRESHOLD = float(os.getenv("CASCADE_UPPER_THRESHOLD", 0.8))  # Above this: Abnormal without the CNN
+
+# Similar-case retrieval settings (similarity_index.py)
+SIMILARITY_INDEX_SUFFIX = "_similarity.npz"  # Index saved next to its model as <model stem>_similarity.npz
+SIMILARITY_TOP_K = 5  # Similar labelled recordings shown per result
+SIMILARITY_N_PROBE = 8  # Inverted lists scanned per query (more = better recall, slower)
+
+# Instrumentation settings (metrics.py)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_REPORT_PATH = PROJECT_ROOT / "system_health_report.json"
+METRICS_SNAPSHOT_DIR = PROJECT_ROOT / "runtime_metrics"  # One snapshot file per running process (gitignored)
+METRICS_REPORT_INTERVAL = 300  # Seconds between snapshots written by each process
+METRICS_REPORT_MAX_SNAPSHOTS = 48  # Oldest snapshots are dropped beyond this (per process and in the report)
+MEMORY_PROFILE_SAMPLE_RATE = float(os.getenv("MEMORY_PROFILE_SAMPLE_RATE", 0.0))  # Fraction of requests traced with tracemalloc
+
 # File patterns
 AUDIO_EXTENSIONS = ['.wav', '.flac', '.mp3', '.webm', '.ogg', '.m4a']
+FFMPEG_TIMEOUT = 30.0  # Seconds allowed for an ffmpeg decode subprocess
+REQUEST_MEMORY_BUDGET_MB = int(os.getenv("REQUEST_MEMORY_BUDGET_MB", 512))  # Projected decode memory per upload
+OVERSIZE_POLICY = os.getenv("OVERSIZE_POLICY", "truncate")  # Over-budget uploads: 'truncate' or 'reject'
 MODEL_FILENAME = "heart_classifier.keras"
 PREPROCESSING_CONFIG_FILENAME = "preprocess_config.json"
 
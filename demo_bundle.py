@@ -0,0 +1,104 @@
+"""
+Precomputed demo recordings for the Heart Sound Analyzer.
+Built by scripts/build_demo_bundle.py and loaded once per app process, so
+demos skip synthesis, Griffin-Lim inversion, featurization and plotting.
+"""
+
+import json
+import numpy as np
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from config import DEMO_BUNDLE_PATH
+
+BUNDLE_FORMAT_VERSION = 1
+
+def save_demo_bundle(samples: List[Dict[str, Any]], path=DEMO_BUNDLE_PATH,
+                     model_version: str = "", preprocessing_version: str = ""):
+    """
+    Write demo samples to a single .npz file.
+
+    Args:
+        samples: Dicts with id, label, kind ('real' or 'synthetic'), source, audio, sr,
+                 model_input, predicted_class, confidence and plots {name: PNG bytes}
+        path: Output path
+        model_version: Version string of the model that made the predictions
+        preprocessing_version: Version string of the pipeline that made the model inputs
+    """
+    arrays = {}
+    manifest = {
+        'format_version': BUNDLE_FORMAT_VERSION,
+        'model_version': model_version,
+        'preprocessing_version': preprocessing_version,
+        'samples': []
+    }
+    for sample in samples:
+        sample_id = sample['id']
+        arrays[f"{sample_id}/audio"] = np.asarray(sample['audio'], dtype=np.float32)
+        arrays[f"{sample_id}/model_input"] = np.asarray(sample['model_input'], dtype=np.float32)
+        for name, png in sample['plots'].items():
+            arrays[f"{sample_id}/plot/{name}"] = np.frombuffer(png, dtype=np.uint8)
+
+        manifest['samples'].append({
+            'id': sample_id,
+            'label': sample['label'],
+            'kind': sample['kind'],
+            'source': sample['source'],
+            'sr': int(sample['sr']),
+            'predicted_class': sample['predicted_class'],
+            'confidence': float(sample['confidence']),
+            'plots': sorted(sample['plots'])
+        })
+
+    arrays['manifest'] = np.frombuffer(json.dumps(manifest).encode(), dtype=np.uint8)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Uncompressed: audio barely compresses and PNGs already are, so loading stays fast
+    np.savez(path, **arrays)
+
+class DemoBundle:
+    """In-memory demo samples, looked up by label and kind."""
+
+    def __init__(self, manifest: Dict[str, Any], arrays: Dict[str, np.ndarray]):
+        self.model_version = manifest.get('model_version', '')
+        self.preprocessing_version = manifest.get('preprocessing_version', '')
+        self.samples = manifest['samples']
+        self._arrays = arrays
+
+    def choose(self, label: str, kind: str, rng=None) -> Optional[Dict[str, Any]]:
+        """Pick a random sample with the given label and kind (None if there is none)."""
+        matches = [s for s in self.samples if s['label'] == label and s['kind'] == kind]
+        if not matches:
+            return None
+        rng = rng or np.random.default_rng()
+        return matches[rng.integers(len(matches))]
+
+    def analysis(self, sample: Dict[str, Any]) -> Dict[str, Any]:
+        """Analysis dict for a sample, in the same shape the apps keep in their result cache."""
+        sample_id = sample['id']
+        return {
+            'model_input': self._arrays[f"{sample_id}/model_input"],
+            'audio': self._arrays[f"{sample_id}/audio"],
+            'sr': sample['sr'],
+            'predicted_class': sample['predicted_class'],
+            'confidence': sample['confidence'],
+            'plots': {name: self._arrays[f"{sample_id}/plot/{name}"].tobytes()
+                      for name in sample['plots']}
+        }
+
+def load_demo_bundle(path=DEMO_BUNDLE_PATH) -> Optional[DemoBundle]:
+    """Load the demo bundle, or return None if it is missing or from another bundle format."""
+    path = Path(path)
+    if not path.exists():
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+        manifest = json.loads(arrays.pop('manifest').tobytes())
+    except Exception as e:
+        print(f"Could not load demo bundle {path}: {e}")
+        return None
+
+    if manifest.get('format_version') != BUNDLE_FORMAT_VERSION:
+        return None
+    return DemoBundle(manifest, arrays)
@@ -0,0 +1,400 @@
+"""
+NumPy signal processing for the Heart Sound Analyzer.
+librosa-free preprocessing and spectrogram code shared by the mobile app and benchmarks.
+"""
+
+import inspect
+import threading
+import numpy as np
+from functools import lru_cache
+from typing import Optional, Tuple
+from numpy.lib.stride_tricks import sliding_window_view
+
+BANDPASS_TRANSITION_HZ = 20.0  # Default raised-cosine roll-off outside each band edge (bandpass)
+
+def preprocess_audio_simple(audio: np.ndarray, sr: int, duration: float = 5.0) -> np.ndarray:
+    """
+    Peak-normalize and pad or crop to the target duration (no silence trimming).
+
+    Args:
+        audio: Audio time series
+        sr: Sample rate
+        duration: Target duration in seconds
+
+    Returns:
+        Preprocessed audio array
+    """
+    peak = np.max(np.abs(audio)) if len(audio) else 0
+    if peak > 0:
+        audio = audio / peak
+
+    target_length = int(duration * sr)
+    if len(audio) < target_length:
+        audio = np.pad(audio, (0, target_length - len(audio)), mode='constant')
+    else:
+        audio = audio[:target_length]
+    return audio
+
+def simple_spectrogram(audio: np.ndarray, sr: int, n_mels: int = 128,
+                       n_fft: int = 1024, hop_length: int = 256) -> np.ndarray:
+    """
+    Log-magnitude STFT with linearly spaced bins picked down to n_mels rows.
+
+    This is the mobile app's original approximation (not a true mel scale),
+    computed over strided frame views instead of a Python loop.
+
+    Args:
+        audio: Audio time series
+        sr: Sample rate
+        n_mels: Number of frequency rows kept
+        n_fft: FFT window size
+        hop_length: Hop length for STFT
+
+    Returns:
+        Log spectrogram array (n_mels, time_frames)
+    """
+    audio = np.asarray(audio, dtype=np.float64)
+    n_frames = len(range(0, len(audio) - n_fft, hop_length))
+    frames = sliding_window_view(audio, n_fft)[::hop_length][:n_frames]
+
+    magnitudes = np.abs(np.fft.rfft(frames * np.hanning(n_fft), axis=1)).T
+    if magnitudes.shape[0] > n_mels:
+        indices = np.linspace(0, magnitudes.shape[0] - 1, n_mels).astype(int)
+        magnitudes = magnitudes[indices, :]
+    return np.log(magnitudes + 1e-9)
+
+def _hz_to_mel(frequencies: np.ndarray) -> np.ndarray:
+    """Slaney mel scale (librosa's default): linear below 1 kHz, logarithmic above."""
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+    mels = frequencies / (200.0 / 3)
+    min_log_hz, min_log_mel, logstep = 1000.0, 15.0, np.log(6.4) / 27.0
+    above = frequencies >= min_log_hz
+    mels[above] = min_log_mel + np.log(frequencies[above] / min_log_hz) / logstep
+    return mels
+
+def _mel_to_hz(mels: np.ndarray) -> np.ndarray:
+    mels = np.asarray(mels, dtype=np.float64)
+    frequencies = mels * (200.0 / 3)
+    min_log_hz, min_log_mel, logstep = 1000.0, 15.0, np.log(6.4) / 27.0
+    above = mels >= min_log_mel
+    frequencies[above] = min_log_hz * np.exp(logstep * (mels[above] - min_log_mel))
+    return frequencies
+
+def mel_band_centers(sr: int, n_mels: int, fmin: float = 0.0, fmax: Optional[float] = None) -> np.ndarray:
+    """Center frequency in Hz of each mel_filterbank band."""
+    fmax = sr / 2 if fmax is None else fmax
+    mel_points = np.linspace(_hz_to_mel(np.array([fmin]))[0], _hz_to_mel(np.array([fmax]))[0], n_mels + 2)
+    return _mel_to_hz(mel_points[1:-1])
+
+@lru_cache(maxsize=8)
+def mel_filterbank(sr: int, n_fft: int, n_mels: int,
+                   fmin: float = 0.0, fmax: Optional[float] = None) -> np.ndarray:
+    """
+    Slaney-normalized triangular mel filters, equal to librosa.filters.mel defaults.
+
+    Returns:
+        float32 array of shape (n_mels, 1 + n_fft // 2)
+    """
+    fmax = sr / 2 if fmax is None else fmax
+    fft_freqs = np.linspace(0, sr / 2, 1 + n_fft // 2)
+    mel_freqs = _mel_to_hz(np.linspace(_hz_to_mel(np.array([fmin]))[0],
+                                       _hz_to_mel(np.array([fmax]))[0], n_mels + 2))
+
+    fdiff = np.diff(mel_freqs)
+    ramps = np.subtract.outer(mel_freqs, fft_freqs)
+    lower = -ramps[:n_mels] / fdiff[:n_mels, np.newaxis]
+    upper = ramps[2:] / fdiff[1:, np.newaxis]
+    weights = np.maximum(0, np.minimum(lower, upper))
+
+    weights *= (2.0 / (mel_freqs[2:] - mel_freqs[:n_mels]))[:, np.newaxis]
+    weights = weights.astype(np.float32)
+    weights.setflags(write=False)
+    return weights
+
+def power_to_db(power: np.ndarray, amin: float = 1e-10, top_db: float = 80.0) -> np.ndarray:
+    """dB relative to the maximum, clipped to top_db below it (librosa's power_to_db with ref=np.max)."""
+    log_spec = 10.0 * np.log10(np.maximum(amin, power))
+    log_spec -= 10.0 * np.log10(max(amin, float(power.max())))
+    return np.maximum(log_spec, log_spec.max() - top_db)
+
+def mel_spectrogram(audio: np.ndarray, sr: int, n_mels: int = 128,
+                    n_fft: int = 1024, hop_length: int = 256) -> np.ndarray:
+    """
+    Log mel-spectrogram matching utils.audio_to_melspectrogram without librosa.
+
+    Centered frames with zero padding, a periodic Hann window, power STFT,
+    Slaney mel filters and power_to_db(ref=max, top_db=80), computed in
+    float32 over strided frame views.
+
+    Args:
+        audio: Audio time series
+        sr: Sample rate
+        n_mels: Number of mel frequency bins
+        n_fft: FFT window size
+        hop_length: Hop length for STFT
+
+    Returns:
+        Log mel-spectrogram array (n_mels, 1 + len(audio) // hop_length)
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    padded = np.pad(audio, n_fft // 2, mode='constant')
+    frames = sliding_window_view(padded, n_fft)[::hop_length]
+
+    window = _periodic_hann(n_fft)
+    spectrum = np.fft.rfft(frames * window, axis=1)
+    power = spectrum.real ** 2 + spectrum.imag ** 2
+
+    mel_power = mel_filterbank(sr, n_fft, n_mels) @ power.T.astype(np.float32)
+    return power_to_db(mel_power)
+
+@lru_cache(maxsize=32)
+def _fast_length(n: int) -> int:
+    """Smallest 2^a * 3^b * 5^c >= n (an FFT size pocketfft handles quickly)."""
+    best = 1 << max(0, n - 1).bit_length()
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            p = p35
+            while p < n:
+                p *= 2
+            best = min(best, p)
+            p35 *= 3
+        p5 *= 5
+    return best
+
+@lru_cache(maxsize=16)
+def _bandpass_gain(n_fft: int, sr: int, low_hz: float, high_hz: float, transition_hz: float) -> np.ndarray:
+    """rfft-bin gains: 1 inside [low_hz, high_hz], raised-cosine roll-off over transition_hz outside."""
+    freqs = np.fft.rfftfreq(n_fft, 1.0 / sr)
+    gain = np.ones(len(freqs))
+    if low_hz > 0:
+        ramp = np.clip((freqs - (low_hz - transition_hz)) / transition_hz, 0.0, 1.0)
+        gain *= 0.5 - 0.5 * np.cos(np.pi * ramp)
+        gain[0] = 0.0
+    if high_hz < sr / 2:
+        ramp = np.clip((high_hz + transition_hz - freqs) / transition_hz, 0.0, 1.0)
+        gain *= 0.5 - 0.5 * np.cos(np.pi * ramp)
+    gain = gain.astype(np.float32)
+    gain.setflags(write=False)
+    return gain
+
+def _bandpass_length(n: int, sr: int, transition_hz: float) -> int:
+    """FFT size for filtering n samples: zero padding of several impulse-response lengths so nothing wraps."""
+    return _fast_length(n + int(np.ceil(4 * sr / transition_hz)))
+
+def bandpass(audio: np.ndarray, sr: int, low_hz: float, high_hz: float,
+             transition_hz: float = BANDPASS_TRANSITION_HZ) -> np.ndarray:
+    """
+    Zero-phase FFT-domain band-pass filter along the last axis.
+
+    One rfft/irfft pair per call filters a single recording or a whole
+    (n_recordings, n_samples) batch. The signal is zero-padded by several
+    impulse-response lengths first, so the circular convolution does not wrap.
+
+    Args:
+        audio: Audio time series, or a batch of equal-length series
+        sr: Sample rate
+        low_hz: Lower band edge in Hz (0 keeps DC)
+        high_hz: Upper band edge in Hz (>= sr / 2 keeps everything up to Nyquist)
+        transition_hz: Width of the raised-cosine roll-off outside each edge
+
+    Returns:
+        float32 array of the same shape as `audio`
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    n = audio.shape[-1]
+    if n == 0:
+        return audio.copy()
+    n_fft = _bandpass_length(n, sr, transition_hz)
+    # norm="forward" on both transforms round-trips exactly and stays on float32 loops
+    spectrum = np.fft.rfft(audio, n=n_fft, axis=-1, norm="forward")
+    spectrum *= _bandpass_gain(n_fft, sr, float(low_hz), float(high_hz), float(transition_hz))
+    return np.fft.irfft(spectrum, n=n_fft, axis=-1, norm="forward")[..., :n]
+
+@lru_cache(maxsize=8)
+def _periodic_hann(n_fft: int) -> np.ndarray:
+    window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(n_fft) / n_fft)).astype(np.float32)
+    window.setflags(write=False)
+    return window
+
+# np.fft gained `out=` (and native float32 transforms) in NumPy 2.0
+_RFFT_HAS_OUT = 'out' in inspect.signature(np.fft.rfft).parameters
+
+class SpectrogramWorkspace:
+    """
+    Preallocated buffers for utils.prepare_model_input at one fixed input shape.
+
+    Silence trimming, peak normalization, padding/cropping and the log-mel
+    spectrogram are written in place into buffers allocated once, and the
+    spectrogram goes straight into a caller-provided array (typically the
+    interpreter's input tensor). Trimming works on 512-sample block energies,
+    so the only per-request scratch grows with len(audio) / 512 and is reused.
+
+    With `band` set, the fixed-length clip is band-passed (as dsp.bandpass)
+    after trimming and normalization, in preallocated FFT buffers.
+
+    Not thread-safe: use one workspace per worker (see thread_workspace).
+    """
+
+    # librosa.effects.trim defaults used by utils.preprocess_audio (top_db=20)
+    TRIM_TOP_DB = 20.0
+    TRIM_FRAME_LENGTH = 2048
+    TRIM_HOP_LENGTH = 512
+
+    def __init__(self, sr: int, duration: float = 5.0, n_mels: int = 128,
+                 n_fft: int = 1024, hop_length: int = 256, top_db: float = 80.0,
+                 band: Optional[Tuple[float, float]] = None):
+        self.sr = sr
+        self.band = tuple(band) if band is not None else None
+        self.target_length = int(duration * sr)
+        self.n_fft = n_fft
+        self.top_db = top_db
+        self.half = n_fft // 2
+
+        # Centered-frame padding around the audio stays zero between requests
+        self.padded = np.zeros(self.target_length + 2 * self.half, dtype=np.float32)
+        self.audio = self.padded[self.half:self.half + self.target_length]
+        self.frames_view = sliding_window_view(self.padded, n_fft)[::hop_length]
+        self.n_frames = len(self.frames_view)
+        self.shape = (n_mels, self.n_frames)
+
+        self.window = _periodic_hann(n_fft)
+        # norm="forward" keeps np.fft on its float32 loop (the default norm's integer
+        # scale factor promotes to float64 and copies); undo its 1/n_fft here
+        self.filterbank = mel_filterbank(sr, n_fft, n_mels) * np.float32(n_fft ** 2)
+        self.frames = np.empty((self.n_frames, n_fft), dtype=np.float32)
+        self.spectrum = np.empty((self.n_frames, n_fft // 2 + 1), dtype=np.complex64)
+        self.power = np.empty((self.n_frames, n_fft // 2 + 1), dtype=np.float32)
+        self.mel = np.empty(self.shape, dtype=np.float32)
+        self._block_energy = np.empty(0, dtype=np.float32)
+
+        if self.band is not None:
+            n_band = _bandpass_length(self.target_length, sr, BANDPASS_TRANSITION_HZ)
+            self._band_gain = _bandpass_gain(n_band, sr, float(self.band[0]), float(self.band[1]),
+                                             BANDPASS_TRANSITION_HZ)
+            self._band_signal = np.zeros(n_band, dtype=np.float32)
+            self._band_spectrum = np.empty(n_band // 2 + 1, dtype=np.complex64)
+
+    def _scratch(self, n_blocks: int) -> np.ndarray:
+        if len(self._block_energy) < n_blocks:
+            self._block_energy = np.empty(max(n_blocks, 2 * len(self._block_energy)), dtype=np.float32)
+        return self._block_energy[:n_blocks]
+
+    def _trim_bounds(self, audio: np.ndarray) -> Tuple[int, int]:
+        """[start, end) of the non-silent region, as librosa.effects.trim computes it."""
+        hop = self.TRIM_HOP_LENGTH
+        frame_blocks = self.TRIM_FRAME_LENGTH // hop  # 4
+        n = len(audio)
+        n_frames = 1 + n // hop
+        full_blocks, tail = divmod(n, hop)
+
+        # Energy per hop-sized block of the centered (frame_length // 2 zero-padded) signal
+        pad_blocks = frame_blocks // 2
+        n_blocks = n_frames + frame_blocks - 1
+        scratch = self._scratch(2 * n_blocks)
+        energy, pairs = scratch[:n_blocks], scratch[n_blocks:2 * n_blocks - 1]
+        energy[:] = 0
+        if full_blocks:
+            blocks = audio[:full_blocks * hop].reshape(full_blocks, hop)
+            np.einsum('ij,ij->i', blocks, blocks, out=energy[pad_blocks:pad_blocks + full_blocks])
+        if tail:
+            energy[pad_blocks + full_blocks] = np.dot(audio[-tail:], audio[-tail:])
+
+        # A frame spans four consecutive blocks: sum adjacent pairs, then pairs of pairs
+        np.add(energy[:-1], energy[1:], out=pairs)
+        frame_energy = energy[:n_frames]
+        np.add(pairs[:n_frames], pairs[2:n_frames + 2], out=frame_energy)
+        frame_energy *= np.float32(1.0 / self.TRIM_FRAME_LENGTH)
+
+        # Non-silent: within top_db of the loudest frame (amin 1e-10 as in amplitude_to_db)
+        np.maximum(frame_energy, 1e-10, out=frame_energy)
+        threshold = frame_energy.max() * 10.0 ** (-self.TRIM_TOP_DB / 10)
+        loud = frame_energy > threshold
+        if not loud.any():
+            return 0, 0
+        first = int(loud.argmax())
+        last = n_frames - 1 - int(loud[::-1].argmax())
+        return first * hop, min(n, (last + 1) * hop)
+
+    def prepare(self, audio: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Trim, normalize, fix the length of `audio` and write its log-mel spectrogram into `out`.
+
+        Args:
+            audio: Mono audio at the workspace's sample rate (float32 avoids a conversion copy)
+            out: float32 array of shape `self.shape` to write into (default: the workspace's own buffer)
+
+        Returns:
+            `out` (or the workspace buffer, which the next call overwrites)
+        """
+        audio = np.asarray(audio, dtype=np.float32)
+        start, end = self._trim_bounds(audio)
+        segment = audio[start:end]
+
+        if len(segment) > self.target_length:
+            offset = (len(segment) - self.target_length) // 2
+            source = segment[offset:offset + self.target_length]
+        else:
+            source = segment
+        # Peak of the whole trimmed segment, like librosa.util.normalize before the crop
+        peak = max(float(segment.max()), -float(segment.min())) if len(segment) else 0.0
+        if peak < np.finfo(np.float32).tiny:
+            peak = 1.0
+
+        np.divide(source, np.float32(peak), out=self.audio[:len(source)])
+        self.audio[len(source):] = 0
+        if self.band is not None:
+            self._bandpass_audio()
+        return self.spectrogram(out)
+
+    def _bandpass_audio(self):
+        """Band-pass `self.audio` in place (dsp.bandpass on the preallocated buffers)."""
+        n = self.target_length
+        signal = self._band_signal
+        signal[:n] = self.audio
+        signal[n:] = 0
+        if _RFFT_HAS_OUT:
+            np.fft.rfft(signal, norm="forward", out=self._band_spectrum)
+            self._band_spectrum *= self._band_gain
+            np.fft.irfft(self._band_spectrum, n=len(signal), norm="forward", out=signal)
+        else:
+            self._band_spectrum[...] = np.fft.rfft(signal, norm="forward")
+            self._band_spectrum *= self._band_gain
+            signal[...] = np.fft.irfft(self._band_spectrum, n=len(signal), norm="forward")
+        self.audio[...] = signal[:n]
+
+    def spectrogram(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Log-mel spectrogram of the current `self.audio`, computed in place (see mel_spectrogram)."""
+        out = self.mel if out is None else out
+        np.multiply(self.frames_view, self.window, out=self.frames)
+        if _RFFT_HAS_OUT:
+            np.fft.rfft(self.frames, axis=1, norm="forward", out=self.spectrum)
+        else:
+            self.spectrum[...] = np.fft.rfft(self.frames, axis=1, norm="forward")
+        np.abs(self.spectrum, out=self.power)
+        np.square(self.power, out=self.power)
+        np.matmul(self.filterbank, self.power.T, out=out)
+
+        # power_to_db(ref=max, top_db): the maximum maps to 0 dB
+        np.maximum(out, 1e-10, out=out)
+        np.log10(out, out=out)
+        out *= 10.0
+        out -= out.max()
+        np.maximum(out, -self.top_db, out=out)
+        return out
+
+_thread_workspaces = threading.local()
+
+def thread_workspace(sr: int, duration: float = 5.0, n_mels: int = 128,
+                     n_fft: int = 1024, hop_length: int = 256,
+                     band: Optional[Tuple[float, float]] = None) -> SpectrogramWorkspace:
+    """The calling thread's SpectrogramWorkspace for these settings (created on first use)."""
+    workspaces = getattr(_thread_workspaces, 'by_settings', None)
+    if workspaces is None:
+        workspaces = _thread_workspaces.by_settings = {}
+    key = (sr, duration, n_mels, n_fft, hop_length, tuple(band) if band is not None else None)
+    workspace = workspaces.get(key)
+    if workspace is None:
+        workspace = workspaces[key] = SpectrogramWorkspace(*key[:5], band=key[5])
+    return workspace
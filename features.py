@@ -0,0 +1,154 @@
+"""
+Compact handcrafted features for the Heart Sound Analyzer.
+A fixed-length vector per recording (band energies, envelope periodicity and
+heart rate, spectral statistics, MFCC summaries) computed in batch from log-mel
+spectrograms, as a small replacement for the 20,096 flattened spectrogram values.
+"""
+
+import numpy as np
+from functools import lru_cache
+from typing import List
+
+from config import SAMPLE_RATE, N_MELS, N_FFT, HOP_LENGTH, AUDIO_DURATION
+from dsp import mel_band_centers, thread_workspace
+
+# Band edges in Hz: heart sounds (S1/S2) sit below ~200 Hz, murmurs reach ~600 Hz and beyond
+BAND_EDGES_HZ = (0, 50, 100, 150, 200, 300, 400, 600, 800, 1200, 2000, 4000)
+HEART_RATE_RANGE_BPM = (40, 200)
+N_MFCC = 13
+SPECTRAL_STATS = ('centroid_hz', 'bandwidth_hz', 'flatness', 'rolloff_hz')
+
+def feature_names() -> List[str]:
+    """Names of the extract_features columns, in order."""
+    bands = [f"band_{lo}_{hi}hz" for lo, hi in zip(BAND_EDGES_HZ[:-1], BAND_EDGES_HZ[1:])]
+    envelope = ['periodicity', 'heart_rate_bpm', 'envelope_cv']
+    spectral = [f"{stat}_{agg}" for stat in SPECTRAL_STATS for agg in ('mean', 'std')]
+    mfcc = [f"mfcc{i}_{agg}" for agg in ('mean', 'std') for i in range(N_MFCC)]
+    return bands + envelope + spectral + mfcc
+
+@lru_cache(maxsize=8)
+def _band_matrix(sr: int, n_mels: int) -> np.ndarray:
+    """(n_bands, n_mels) 0/1 matrix assigning each mel band to a BAND_EDGES_HZ band."""
+    centers = mel_band_centers(sr, n_mels)
+    edges = np.asarray(BAND_EDGES_HZ, dtype=np.float64)
+    matrix = ((centers >= edges[:-1, np.newaxis]) & (centers < edges[1:, np.newaxis])).astype(np.float32)
+    matrix.setflags(write=False)
+    return matrix
+
+@lru_cache(maxsize=8)
+def _dct_matrix(n_mfcc: int, n_mels: int) -> np.ndarray:
+    """Orthonormal DCT-II basis, (n_mfcc, n_mels) - MFCCs as librosa.feature.mfcc computes them."""
+    k = np.arange(n_mfcc)[:, np.newaxis]
+    n = np.arange(n_mels)[np.newaxis, :]
+    basis = np.cos(np.pi * k * (2 * n + 1) / (2 * n_mels)) * np.sqrt(2.0 / n_mels)
+    basis[0] /= np.sqrt(2.0)
+    basis = basis.astype(np.float32)
+    basis.setflags(write=False)
+    return basis
+
+def _envelope_features(power: np.ndarray, frame_rate: float) -> np.ndarray:
+    """Periodicity, heart rate and variability of the per-frame energy envelope, (N, 3)."""
+    envelope = power.sum(axis=1)
+    envelope = envelope / np.maximum(envelope.mean(axis=1, keepdims=True), 1e-12)
+    cv = envelope.std(axis=1)
+    centered = envelope - envelope.mean(axis=1, keepdims=True)
+
+    # Autocorrelation of every envelope at once (zero-padded FFT, so no wrap-around)
+    n_frames = centered.shape[1]
+    spectrum = np.fft.rfft(centered, n=2 * n_frames, axis=1)
+    autocorr = np.fft.irfft(spectrum.real ** 2 + spectrum.imag ** 2, axis=1)[:, :n_frames]
+    autocorr /= np.maximum(autocorr[:, :1], 1e-12)
+
+    # One beat per lag: search lags between the fastest and slowest plausible heart rate
+    min_lag = max(1, int(frame_rate * 60 / HEART_RATE_RANGE_BPM[1]))
+    max_lag = min(n_frames - 1, int(np.ceil(frame_rate * 60 / HEART_RATE_RANGE_BPM[0])))
+    best = autocorr[:, min_lag:max_lag + 1].argmax(axis=1) + min_lag
+    rows = np.arange(len(autocorr))
+
+    # Prefer the fundamental over a multiple of it: take the half lag when its peak is nearly as strong
+    half = np.clip(np.round(best / 2).astype(int), min_lag, n_frames - 2)
+    around_half = np.stack([autocorr[rows, half - 1], autocorr[rows, half], autocorr[rows, half + 1]], axis=1)
+    half_best = half - 1 + around_half.argmax(axis=1)
+    use_half = (best / 2 >= min_lag) & (autocorr[rows, half_best] >= 0.8 * autocorr[rows, best])
+    best = np.where(use_half, half_best, best)
+    periodicity = autocorr[rows, best]
+
+    # Parabolic interpolation around the peak for sub-frame lag resolution
+    left, right = autocorr[rows, best - 1], autocorr[rows, np.minimum(best + 1, n_frames - 1)]
+    curvature = left - 2 * periodicity + right
+    offset = np.where(curvature < 0, 0.5 * (left - right) / np.where(curvature < 0, curvature, -1), 0.0)
+    heart_rate = 60 * frame_rate / (best + np.clip(offset, -0.5, 0.5))
+    # A flat (silent) envelope has no peak to find; keep its estimate inside the searched range
+    heart_rate = np.clip(heart_rate, *HEART_RATE_RANGE_BPM)
+    return np.stack([periodicity, heart_rate, cv], axis=1)
+
+def _spectral_features(power: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """Mean and std over time of centroid, bandwidth, flatness and 85% rolloff, (N, 8)."""
+    total = np.maximum(power.sum(axis=1), 1e-12)  # (N, frames)
+    centroid = (centers @ power) / total
+    # Variance about the centroid as E[f^2] - E[f]^2, without an (N, n_mels, frames) deviation array
+    spread = np.maximum((centers ** 2 @ power) / total - centroid ** 2, 0.0)
+    bandwidth = np.sqrt(spread)
+    flatness = np.exp(np.log(np.maximum(power, 1e-12)).mean(axis=1)) / (total / power.shape[1])
+    rolloff_index = (np.cumsum(power, axis=1) >= 0.85 * total[:, np.newaxis, :]).argmax(axis=1)
+    rolloff = centers[rolloff_index]
+
+    stats = [centroid, bandwidth, flatness, rolloff]
+    return np.stack([agg(s, axis=1) for s in stats for agg in (np.mean, np.std)], axis=1)
+
+def spectrogram_features(spectrograms: np.ndarray, sr: int = SAMPLE_RATE,
+                         hop_length: int = HOP_LENGTH) -> np.ndarray:
+    """
+    Handcrafted features from log-mel spectrograms.
+
+    Args:
+        spectrograms: (N, n_mels, frames[, 1]) log-mel spectrograms in dB (0 dB max),
+            as produced by utils.audio_to_melspectrogram / dsp.SpectrogramWorkspace
+        sr: Sample rate the spectrograms were computed at
+        hop_length: Hop length the spectrograms were computed with
+
+    Returns:
+        float32 array of shape (N, len(feature_names()))
+    """
+    spectrograms = np.asarray(spectrograms, dtype=np.float32)
+    if spectrograms.ndim == 4:
+        spectrograms = spectrograms[..., 0]
+    if spectrograms.ndim == 2:
+        spectrograms = spectrograms[np.newaxis]
+    n_mels = spectrograms.shape[1]
+
+    power = np.power(10.0, spectrograms / 10.0, dtype=np.float32)
+    centers = mel_band_centers(sr, n_mels).astype(np.float32)
+
+    # Share of the total energy in each frequency band (log10)
+    band_power = np.einsum('bm,nmt->nb', _band_matrix(sr, n_mels), power)
+    band_share = np.log10(np.maximum(band_power / np.maximum(band_power.sum(axis=1, keepdims=True), 1e-12), 1e-8))
+
+    envelope = _envelope_features(power, sr / hop_length)
+    spectral = _spectral_features(power, centers)
+
+    mfcc = np.einsum('km,nmt->nkt', _dct_matrix(N_MFCC, n_mels), spectrograms)
+    mfcc_stats = np.concatenate([mfcc.mean(axis=2), mfcc.std(axis=2)], axis=1)
+
+    return np.concatenate([band_share, envelope, spectral, mfcc_stats], axis=1).astype(np.float32)
+
+def extract_features(spectrograms: np.ndarray, batch_size: int = 256, **kwargs) -> np.ndarray:
+    """spectrogram_features over a large array in chunks, bounding the intermediate arrays."""
+    n = len(spectrograms)
+    features = np.empty((n, len(feature_names())), dtype=np.float32)
+    for start in range(0, n, batch_size):
+        features[start:start + batch_size] = spectrogram_features(spectrograms[start:start + batch_size], **kwargs)
+    return features
+
+def audio_features(recordings, sr: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Handcrafted features straight from PCM (cached clips or full recordings).
+
+    Each recording goes through the model-input pipeline (trim, normalize,
+    fix length, log-mel) in a preallocated workspace first.
+    """
+    workspace = thread_workspace(sr, AUDIO_DURATION, N_MELS, N_FFT, HOP_LENGTH)
+    spectrograms = np.empty((len(recordings),) + workspace.shape, dtype=np.float32)
+    for i, audio in enumerate(recordings):
+        workspace.prepare(audio, spectrograms[i])
+    return extract_features(spectrograms, sr=sr, hop_length=HOP_LENGTH)
@@ -0,0 +1,425 @@
+"""
+TensorFlow Lite inference layer for the Heart Sound Analyzer.
+Shared by the desktop and mobile apps; works with tflite_runtime or full TensorFlow.
+"""
+
+import numpy as np
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+from config import (
+    INFERENCE_BATCH_BUCKETS, INTERPRETER_POOL_SIZE, POOL_CHECKOUT_TIMEOUT, WARMUP_ITERATIONS
+)
+from benchmarking import summarize_timings, time_callable
+
+@lru_cache(maxsize=1)
+def _get_tflite_api():
+    """Return (Interpreter, OpResolverType), preferring the lightweight tflite_runtime."""
+    try:
+        import tflite_runtime.interpreter as tflite
+        return tflite.Interpreter, getattr(tflite, 'OpResolverType', None)
+    except ImportError:
+        import tensorflow as tf
+        return tf.lite.Interpreter, getattr(tf.lite.experimental, 'OpResolverType', None)
+
+def get_interpreter_class():
+    """Return the TFLite Interpreter class, preferring the lightweight tflite_runtime."""
+    return _get_tflite_api()[0]
+
+def can_disable_xnnpack() -> bool:
+    """True if this runtime exposes OpResolverType, so use_xnnpack=False takes effect."""
+    return _get_tflite_api()[1] is not None
+
+def create_interpreter(model_path, num_threads: Optional[int] = None,
+                       use_xnnpack: bool = True, preserve_all_tensors: bool = False):
+    """
+    Create an unallocated TFLite interpreter.
+
+    Args:
+        model_path: Path to the .tflite file
+        num_threads: Interpreter threads (None keeps the library default)
+        use_xnnpack: False disables the default XNNPACK delegate
+        preserve_all_tensors: Keep intermediate tensors readable after invoke
+            (needed to read embeddings; disables buffer reuse)
+
+    Returns:
+        TFLite Interpreter instance
+    """
+    interpreter_class, op_resolver_type = _get_tflite_api()
+    kwargs = {'model_path': str(model_path)}
+    if num_threads is not None:
+        kwargs['num_threads'] = int(num_threads)
+    if not use_xnnpack and op_resolver_type is not None:
+        kwargs['experimental_op_resolver_type'] = op_resolver_type.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+    if preserve_all_tensors:
+        kwargs['experimental_preserve_all_tensors'] = True
+    return interpreter_class(**kwargs)
+
+def _quantize_input(data: np.ndarray, detail: Dict) -> np.ndarray:
+    """Convert float input to the tensor's dtype, applying quantization if needed."""
+    dtype = detail['dtype']
+    if dtype == np.float32:
+        return data
+
+    scale, zero_point = detail['quantization']
+    if scale:
+        data = np.round(data / scale + zero_point)
+    info = np.iinfo(dtype)
+    return np.clip(data, info.min, info.max).astype(dtype)
+
+def _quantize_into(data: np.ndarray, out: np.ndarray, detail: Dict):
+    """Quantize float32 `data` into the tensor view `out`, using `data` as scratch."""
+    scale, zero_point = detail['quantization']
+    if scale:
+        np.divide(data, scale, out=data)
+        data += zero_point
+        np.rint(data, out=data)
+    info = np.iinfo(detail['dtype'])
+    np.clip(data, info.min, info.max, out=data)
+    out[...] = data
+
+def _dequantize_output(data: np.ndarray, detail: Dict) -> np.ndarray:
+    """Convert a (possibly quantized) output tensor back to float32."""
+    if detail['dtype'] == np.float32:
+        return data
+
+    scale, zero_point = detail['quantization']
+    data = data.astype(np.float32)
+    if scale:
+        data = (data - zero_point) * scale
+    return data
+
+class TFLiteModel:
+    """
+    TFLite model that keeps one allocated interpreter per batch-size bucket.
+
+    The input tensor of each interpreter is resized to its bucket size, so a batch
+    of N spectrograms runs in ceil(N / largest_bucket) invokes instead of N.
+    Also exposes a Keras-style `predict` and `input_shape`, so callers can treat
+    TFLite and Keras models the same way.
+    """
+
+    def __init__(self, model_path, batch_buckets: Sequence[int] = INFERENCE_BATCH_BUCKETS,
+                 num_threads: Optional[int] = None, use_xnnpack: bool = True):
+        self.model_path = Path(model_path)
+        self.num_threads = num_threads
+        self.use_xnnpack = use_xnnpack
+        self.batch_buckets = tuple(sorted({int(b) for b in batch_buckets} | {1}))
+        self._interpreters = {}
+        self._fill_buffer = None
+
+        # Allocate the batch-1 interpreter up front to validate the model
+        _, input_detail, _ = self._interpreter_for(1)
+        self.input_shape = (None,) + tuple(int(d) for d in input_detail['shape'][1:])
+
+    @property
+    def name(self) -> str:
+        return self.model_path.name
+
+    def _create_interpreter(self):
+        """Create a fresh, unallocated interpreter for this model."""
+        return create_interpreter(self.model_path, self.num_threads, self.use_xnnpack)
+
+    def _interpreter_for(self, bucket: int) -> Tuple[object, Dict, Dict]:
+        """Return (interpreter, input_detail, output_detail) allocated for a bucket size."""
+        entry = self._interpreters.get(bucket)
+        if entry is None:
+            interpreter = self._create_interpreter()
+            input_detail = interpreter.get_input_details()[0]
+            if int(input_detail['shape'][0]) != bucket:
+                shape = list(input_detail['shape'])
+                shape[0] = bucket
+                interpreter.resize_tensor_input(input_detail['index'], shape)
+            interpreter.allocate_tensors()
+
+            entry = (
+                interpreter,
+                interpreter.get_input_details()[0],
+                interpreter.get_output_details()[0]
+            )
+            self._interpreters[bucket] = entry
+        return entry
+
+    def bucket_for(self, n: int) -> int:
+        """Smallest bucket that fits n samples (or the largest bucket)."""
+        for bucket in self.batch_buckets:
+            if bucket >= n:
+                return bucket
+        return self.batch_buckets[-1]
+
+    def _invoke(self, chunk: np.ndarray) -> np.ndarray:
+        """Run one invoke on a chunk no larger than the largest bucket."""
+        n = len(chunk)
+        bucket = self.bucket_for(n)
+        interpreter, input_detail, output_detail = self._interpreter_for(bucket)
+
+        if n < bucket:
+            # Zero-pad the tail so the tensor keeps its allocated shape
+            padded = np.zeros((bucket,) + chunk.shape[1:], dtype=np.float32)
+            padded[:n] = chunk
+            chunk = padded
+
+        interpreter.set_tensor(input_detail['index'], _quantize_input(chunk, input_detail))
+        interpreter.invoke()
+        output = interpreter.get_tensor(output_detail['index'])
+        output = _dequantize_output(output, output_detail)
+        return output.reshape(bucket, -1)[:n, 0]
+
+    def predict_batch(self, batch: np.ndarray) -> np.ndarray:
+        """
+        Predict abnormal-class confidence for a batch of spectrograms.
+
+        Args:
+            batch: Array of shape (N, n_mels, frames, 1) or (N, n_mels, frames)
+
+        Returns:
+            float32 array of shape (N,) with confidences in [0, 1]
+        """
+        batch = np.asarray(batch, dtype=np.float32)
+        if batch.ndim == len(self.input_shape) - 1:
+            batch = batch[..., np.newaxis]
+
+        n = len(batch)
+        confidences = np.empty(n, dtype=np.float32)
+        largest = self.batch_buckets[-1]
+        for start in range(0, n, largest):
+            chunk = batch[start:start + largest]
+            confidences[start:start + len(chunk)] = self._invoke(chunk)
+        return confidences
+
+    def predict_into(self, fill: Callable[[np.ndarray], Any]) -> float:
+        """
+        Predict one sample whose spectrogram `fill` writes straight into the input tensor.
+
+        Args:
+            fill: Called with a float32 (n_mels, frames) array to write into: a view
+                of the batch-1 input tensor for float models, or a reused buffer that
+                is quantized into the tensor for quantized ones. It must not keep a
+                reference to the array, since invoke() needs the tensor buffers free.
+
+        Returns:
+            Abnormal-class confidence
+        """
+        interpreter, input_detail, output_detail = self._interpreter_for(1)
+        tensor = interpreter.tensor(input_detail['index'])()
+        sample = tensor[0, ..., 0] if tensor.ndim == 4 else tensor[0]
+
+        if input_detail['dtype'] == np.float32:
+            fill(sample)
+        else:
+            if self._fill_buffer is None:
+                self._fill_buffer = np.empty(sample.shape, dtype=np.float32)
+            fill(self._fill_buffer)
+            _quantize_into(self._fill_buffer, sample, input_detail)
+        del tensor, sample
+
+        interpreter.invoke()
+        output = interpreter.get_tensor(output_detail['index'])
+        return float(_dequantize_output(output, output_detail).reshape(-1)[0])
+
+    def predict(self, x: np.ndarray, verbose: int = 0) -> np.ndarray:
+        """Keras-compatible predict returning an (N, 1) array."""
+        return self.predict_batch(x)[:, np.newaxis]
+
+    def warm_up(self):
+        """Allocate and invoke every bucket's interpreter once."""
+        for bucket in self.batch_buckets:
+            self._invoke(np.zeros((bucket,) + self.input_shape[1:], dtype=np.float32))
+
+class InterpreterPool:
+    """
+    Bounded pool of pre-allocated TFLiteModels with checkout/return semantics.
+
+    TFLite interpreters must not be invoked concurrently, so one shared interpreter
+    serializes every session. The pool hands each caller its own model for the
+    duration of a prediction; invoke releases the GIL, so checkouts run in
+    parallel across cores.
+    """
+
+    def __init__(self, model_path, size: int = INTERPRETER_POOL_SIZE,
+                 batch_buckets: Sequence[int] = INFERENCE_BATCH_BUCKETS,
+                 num_threads: Optional[int] = None, use_xnnpack: bool = True):
+        self.model_path = Path(model_path)
+        self.size = max(1, int(size))
+        self.num_threads = num_threads
+        self.use_xnnpack = use_xnnpack
+        self._members = [
+            TFLiteModel(model_path, batch_buckets, num_threads, use_xnnpack)
+            for _ in range(self.size)
+        ]
+        self.input_shape = self._members[0].input_shape
+
+        # LIFO so the most recently used (cache-warm) interpreter is reused first
+        self._available = queue.LifoQueue()
+        for member in self._members:
+            self._available.put(member)
+
+        self._lock = threading.Lock()
+        self._wait_times_ms = deque(maxlen=1024)
+        self._checkouts = 0
+        self._timeouts = 0
+        self._total_wait_ms = 0.0
+
+    @property
+    def name(self) -> str:
+        return self.model_path.name
+
+    @contextmanager
+    def checkout(self, timeout: float = POOL_CHECKOUT_TIMEOUT):
+        """
+        Check out a model for exclusive use; it is returned when the block exits.
+
+        Raises:
+            TimeoutError: If no model becomes free within `timeout` seconds
+        """
+        start = time.perf_counter()
+        try:
+            model = self._available.get(timeout=timeout)
+        except queue.Empty:
+            with self._lock:
+                self._timeouts += 1
+            raise TimeoutError(f"No free interpreter within {timeout}s (pool size {self.size})")
+
+        wait_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._checkouts += 1
+            self._total_wait_ms += wait_ms
+            self._wait_times_ms.append(wait_ms)
+
+        try:
+            yield model
+        finally:
+            self._available.put(model)
+
+    def predict_batch(self, batch: np.ndarray) -> np.ndarray:
+        """Predict a batch on a checked-out model (see TFLiteModel.predict_batch)."""
+        with self.checkout() as model:
+            return model.predict_batch(batch)
+
+    def predict_into(self, fill: Callable[[np.ndarray], Any]) -> float:
+        """Predict one sample in place on a checked-out model (see TFLiteModel.predict_into)."""
+        with self.checkout() as model:
+            return model.predict_into(fill)
+
+    def predict(self, x: np.ndarray, verbose: int = 0) -> np.ndarray:
+        """Keras-compatible predict returning an (N, 1) array."""
+        return self.predict_batch(x)[:, np.newaxis]
+
+    def warm_up(self):
+        """Warm every pooled model, holding all of them so none is skipped."""
+        with ExitStack() as stack:
+            members = [stack.enter_context(self.checkout()) for _ in range(self.size)]
+            for member in members:
+                member.warm_up()
+
+    def metrics(self) -> Dict[str, float]:
+        """Pool occupancy and checkout wait-time metrics (recent window for percentiles)."""
+        with self._lock:
+            recent = summarize_timings(list(self._wait_times_ms))
+            checkouts = self._checkouts
+            return {
+                'pool_size': self.size,
+                'num_threads': self.num_threads,
+                'use_xnnpack': self.use_xnnpack,
+                'in_use': self.size - self._available.qsize(),
+                'checkouts': checkouts,
+                'timeouts': self._timeouts,
+                'wait_mean_ms': self._total_wait_ms / checkouts if checkouts else 0.0,
+                'wait_p50_ms': recent['p50_ms'],
+                'wait_p95_ms': recent['p95_ms'],
+                'wait_max_ms': recent['max_ms']
+            }
+
+class WarmupState:
+    """
+    Readiness flag and cold/warm latency for a model being warmed up.
+
+    The first prediction pays one-time costs (tensor allocation, kernel
+    selection, Keras graph tracing); callers should not route user traffic
+    to the model until `ready` is set.
+    """
+
+    def __init__(self):
+        self._ready = threading.Event()
+        self.state = 'warming'
+        self.cold_ms = None
+        self.warm = None
+        self.total_ms = None
+        self.error = None
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set() and self.state == 'ready'
+
+    @property
+    def failed(self) -> bool:
+        return self.state == 'failed'
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Block until warm-up succeeds; returns False on timeout or failure."""
+        self._ready.wait(timeout)
+        return self.ready
+
+    def status(self) -> Dict[str, Any]:
+        status = {'state': self.state, 'ready': self.ready, 'cold_ms': self.cold_ms,
+                  'total_ms': self.total_ms}
+        if self.warm is not None:
+            status['warm_mean_ms'] = self.warm['mean_ms']
+            status['warm_p50_ms'] = self.warm['p50_ms']
+        if self.error is not None:
+            status['error'] = self.error
+        return status
+
+def warm_up_model(model, iterations: int = WARMUP_ITERATIONS,
+                  state: Optional[WarmupState] = None) -> WarmupState:
+    """
+    Run synthetic predictions at the model's input shape and record cold vs warm latency.
+
+    Works with TFLite pools and models (all members and batch buckets are warmed)
+    and with Keras models.
+
+    Args:
+        model: Model with a Keras-style predict and input_shape
+        iterations: Number of timed predictions after the cold one
+        state: Existing WarmupState to update (a new one is created if None)
+
+    Returns:
+        The WarmupState, with `ready` set if warm-up succeeded
+    """
+    state = state or WarmupState()
+    start = time.perf_counter()
+    try:
+        # Values in the log-mel dB range, so quantized inputs are realistic
+        shape = (1,) + tuple(int(d) for d in model.input_shape[1:])
+        sample = np.random.default_rng(0).uniform(-80, 0, shape).astype(np.float32)
+
+        model.predict(sample, verbose=0)
+        state.cold_ms = (time.perf_counter() - start) * 1000
+
+        if hasattr(model, 'warm_up'):
+            model.warm_up()
+        state.warm = time_callable(lambda: model.predict(sample, verbose=0),
+                                   repeats=max(1, iterations), warmup=0)
+        state.total_ms = (time.perf_counter() - start) * 1000
+        state.state = 'ready'
+        state._ready.set()
+    except Exception as e:
+        state.total_ms = (time.perf_counter() - start) * 1000
+        state.state = 'failed'
+        state.error = str(e)
+        # Wake waiters so they see the failure instead of timing out
+        state._ready.set()
+    return state
+
+def start_warmup(model, iterations: int = WARMUP_ITERATIONS) -> WarmupState:
+    """Warm a model up on a background thread and return its WarmupState immediately."""
+    state = WarmupState()
+    threading.Thread(target=warm_up_model, args=(model, iterations, state),
+                     name='model-warmup', daemon=True).start()
+    return state
@@ -0,0 +1,443 @@
+"""
+Heart Sound Inference Service
+Lightweight stdlib/asyncio HTTP service with micro-batched TFLite inference.
+
+Endpoints:
+    POST /predict        Raw audio bytes in the body -> JSON prediction
+    POST /predict_batch  JSON {"files": [<base64 audio>, ...]} -> JSON predictions
+    GET  /healthz        Service, warm-up, batching and interpreter pool status
+                         (503 until the model has been warmed up)
+    GET  /metrics        Per-stage timing histograms and counters (Prometheus text format)
+
+Pipeline modes (--pipeline-mode / PIPELINE_MODE):
+    standard      Each request allocates its spectrogram; inference is micro-batched
+    preallocated  Each worker thread reuses a SpectrogramWorkspace and writes the
+                  spectrogram straight into a pooled interpreter's input tensor
+                  (batch size 1, no per-request buffers)
+
+With --cascade / CASCADE_ENABLED=1 the first-stage model (cascade.py) answers
+confident cases and only the uncertain band reaches the CNN (standard mode only).
+--first-stage / CASCADE_FIRST_STAGE_METADATA picks the first-stage model by its
+metadata file, e.g. models/feature_model_metadata.json from
+scripts/train_feature_model.py.
+
+Uploads are featurized with the preprocessing profile the model's metadata
+names (profiles.py), e.g. 2 kHz band-passed inputs for a fast-profile model.
+"""
+
+import json
+import time
+import base64
+import asyncio
+import argparse
+import numpy as np
+from http import HTTPStatus
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Tuple, Union
+
+from config import *
+from audio_io import UploadTooLarge, decode_audio, decode_stats
+from autotune import create_tuned_pool
+from inference import start_warmup
+from cascade import create_cascade
+from profiles import PreprocessingProfile, profile_for_served_model
+import metrics
+
+SERVICE_MODELS = [
+    "heart_sound_mobile_quantized.tflite",
+    "heart_sound_mobile.tflite"
+]
+
+class RequestError(Exception):
+    """Client error that maps to an HTTP status code."""
+
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+def load_service_model(cascade: bool = CASCADE_ENABLED, first_stage=CASCADE_FIRST_STAGE_METADATA):
+    """Load the first available TFLite model into a tuned interpreter pool (behind the cascade if enabled)."""
+    for model_name in SERVICE_MODELS:
+        model_path = MODELS_DIR / model_name
+        if model_path.exists():
+            pool = create_tuned_pool(model_path, size=INTERPRETER_POOL_SIZE)
+            return create_cascade(pool, first_stage) if cascade else pool
+    raise FileNotFoundError("No TFLite model found in models/ directory")
+
+def preprocess_audio_bytes(data: bytes, profile: PreprocessingProfile) -> np.ndarray:
+    """Decode uploaded audio bytes and return the (1, n_mels, frames, 1) model input for the profile."""
+    with metrics.profile_memory():
+        audio, sr = decode_audio(data, profile.sample_rate)
+
+        model_input, _ = profile.prepare_model_input(audio, sr)
+    return model_input
+
+def predict_audio_bytes_in_place(model, data: bytes,
+                                 profile: PreprocessingProfile) -> Tuple[float, Dict[str, float]]:
+    """
+    Preallocated pipeline: decode, then write the spectrogram into the input tensor.
+
+    Args:
+        model: InterpreterPool or TFLiteModel (anything with predict_into)
+        data: Uploaded audio bytes
+        profile: Preprocessing profile the model was trained with
+
+    Returns:
+        (confidence, timings_ms) with the same timing keys as the standard pipeline
+    """
+    start = time.perf_counter()
+    with metrics.profile_memory():
+        audio, sr = decode_audio(data, profile.sample_rate)
+        workspace = profile.workspace()
+        decoded = time.perf_counter()
+
+        timer = metrics.timed("prepare_in_place")
+        def fill(model_input):
+            with timer:
+                workspace.prepare(audio, model_input)
+
+        confidence = model.predict_into(fill)
+    preprocess_ms = (decoded - start) * 1000 + timer.elapsed_ms
+    return confidence, {
+        'preprocess': preprocess_ms,
+        'inference': (time.perf_counter() - start) * 1000 - preprocess_ms
+    }
+
+class MicroBatcher:
+    """
+    Collects concurrent single-item requests into batches.
+
+    A batch is dispatched as soon as it holds max_batch_size items or its first
+    item has waited max_wait_ms, so batching adds at most the wait budget to
+    latency. Up to `concurrency` batches run at once (one per pooled interpreter).
+    """
+
+    def __init__(self, model, max_batch_size: int = MICROBATCH_MAX_SIZE,
+                 max_wait_ms: float = MICROBATCH_MAX_WAIT_MS, concurrency: int = 1):
+        self.model = model
+        self._predict_batch = metrics.timed("inference_batch", model.predict_batch)
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max_wait_ms / 1000
+        self.concurrency = max(1, int(concurrency))
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        self._queue = None
+        self._slots = None
+        self._tasks = set()
+
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    def start(self):
+        """Start the collection loop on the running event loop."""
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._spawn(self._run())
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def submit(self, model_input: np.ndarray) -> float:
+        """Queue one model input and wait for its confidence."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((model_input, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Wait for a free interpreter first, so requests pile up into the next batch
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            self._spawn(self._dispatch(batch))
+
+    async def _dispatch(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            inputs = np.concatenate([model_input for model_input, _ in batch])
+            confidences = await loop.run_in_executor(
+                self._executor, self._predict_batch, inputs
+            )
+            for (_, future), confidence in zip(batch, confidences):
+                if not future.done():
+                    future.set_result(float(confidence))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._slots.release()
+
+        self.batches += 1
+        self.items += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'mean_batch_size': self.items / self.batches if self.batches else 0.0,
+            'largest_batch': self.largest_batch,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000
+        }
+
+def format_prediction(confidence: float, timings_ms: Dict[str, float]) -> Dict[str, Any]:
+    predicted_class = "Abnormal" if confidence > CLASSIFICATION_THRESHOLD else "Normal"
+    return {
+        'predicted_class': predicted_class,
+        'confidence': confidence,
+        'timings_ms': timings_ms
+    }
+
+class InferenceService:
+    """HTTP front end that runs preprocessing in threads and inference through a MicroBatcher."""
+
+    def __init__(self, model, max_batch_size: int = MICROBATCH_MAX_SIZE,
+                 max_wait_ms: float = MICROBATCH_MAX_WAIT_MS, preprocess_workers: int = None,
+                 pipeline_mode: str = PIPELINE_MODE, profile: PreprocessingProfile = None):
+        if pipeline_mode not in ('standard', 'preallocated'):
+            raise ValueError(f"Unknown pipeline mode {pipeline_mode!r} (use 'standard' or 'preallocated')")
+        if pipeline_mode == 'preallocated' and not hasattr(model, 'predict_into'):
+            raise ValueError(f"{type(model).__name__} does not support the preallocated pipeline")
+        self.model = model
+        self.pipeline_mode = pipeline_mode
+        self.profile = profile or profile_for_served_model(model)
+        self.batcher = MicroBatcher(
+            model, max_batch_size, max_wait_ms, concurrency=getattr(model, 'size', 1)
+        )
+        self.preprocess_executor = ThreadPoolExecutor(max_workers=preprocess_workers)
+        self.warmup = start_warmup(model)
+        metrics.start_reporter()
+        self.started_at = time.time()
+        self.requests = 0
+        self.errors = 0
+
+    async def _run_preprocessing(self, fn: Callable, *args):
+        """Run a decode/featurize step on the preprocessing threads, mapping bad uploads to 4xx."""
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.preprocess_executor, fn, *args)
+        except UploadTooLarge as e:
+            raise RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, str(e))
+        except ValueError as e:
+            raise RequestError(HTTPStatus.UNPROCESSABLE_ENTITY, str(e))
+
+    async def _wait_for_warmup(self):
+        if not self.warmup.ready:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.warmup.wait_until_ready, WARMUP_TIMEOUT)
+            if not self.warmup.ready:
+                raise RequestError(HTTPStatus.SERVICE_UNAVAILABLE, "Model is not ready")
+
+    async def predict_bytes(self, data: bytes) -> Dict[str, Any]:
+        """Full pipeline for one upload: decode/featurize in a thread, then micro-batched inference."""
+        if self.pipeline_mode == 'preallocated':
+            # Preprocessing writes into a checked-out interpreter, so warm-up comes first
+            await self._wait_for_warmup()
+            confidence, timings_ms = await self._run_preprocessing(
+                predict_audio_bytes_in_place, self.model, data, self.profile
+            )
+            return format_prediction(confidence, timings_ms)
+
+        start = time.perf_counter()
+        model_input = await self._run_preprocessing(preprocess_audio_bytes, data, self.profile)
+        preprocessed = time.perf_counter()
+
+        await self._wait_for_warmup()
+        confidence = await self.batcher.submit(model_input)
+        finished = time.perf_counter()
+
+        return format_prediction(confidence, {
+            'preprocess': (preprocessed - start) * 1000,
+            'inference': (finished - preprocessed) * 1000
+        })
+
+    async def predict_batch(self, body: bytes) -> Dict[str, Any]:
+        try:
+            files = [base64.b64decode(item) for item in json.loads(body)['files']]
+        except (ValueError, KeyError, TypeError):
+            raise RequestError(HTTPStatus.BAD_REQUEST,
+                               'Expected JSON body {"files": [<base64 audio>, ...]}')
+
+        # Items go through the same batcher, so they are batched with each other
+        results = await asyncio.gather(
+            *(self.predict_bytes(data) for data in files), return_exceptions=True
+        )
+        return {'results': [
+            {'error': str(result)} if isinstance(result, Exception) else result
+            for result in results
+        ]}
+
+    def health(self) -> Dict[str, Any]:
+        status = {
+            'status': 'ok' if self.warmup.ready else self.warmup.state,
+            'model': getattr(self.model, 'name', type(self.model).__name__),
+            'uptime_s': time.time() - self.started_at,
+            'requests': self.requests,
+            'errors': self.errors,
+            'warmup': self.warmup.status(),
+            'pipeline_mode': self.pipeline_mode,
+            'preprocessing_profile': self.profile.key,
+            'batching': self.batcher.stats(),
+            'decoding': decode_stats.summary()
+        }
+        if hasattr(self.model, 'metrics'):
+            status['pool'] = self.model.metrics()
+        return status
+
+    async def route(self, method: str, path: str, body: bytes) -> Tuple[HTTPStatus, Union[Dict, str]]:
+        if path == '/healthz' and method == 'GET':
+            # Load balancers should not route traffic here until warm-up is done
+            ready = self.warmup.ready
+            return HTTPStatus.OK if ready else HTTPStatus.SERVICE_UNAVAILABLE, self.health()
+        if path == '/predict' and method == 'POST':
+            if not body:
+                raise RequestError(HTTPStatus.BAD_REQUEST, "Empty request body")
+            return HTTPStatus.OK, await self.predict_bytes(body)
+        if path == '/predict_batch' and method == 'POST':
+            return HTTPStatus.OK, await self.predict_batch(body)
+        if path == '/metrics' and method == 'GET':
+            return HTTPStatus.OK, metrics.registry.prometheus_text()
+        if path in ('/healthz', '/predict', '/predict_batch', '/metrics'):
+            raise RequestError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} not allowed on {path}")
+        raise RequestError(HTTPStatus.NOT_FOUND, f"Unknown endpoint: {path}")
+
+    async def handle_connection(self, reader: asyncio.StreamReader,
+                                writer: asyncio.StreamWriter):
+        """Serve HTTP/1.1 requests (with keep-alive) on one client connection."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                keep_alive = False
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                    headers = await _read_headers(reader)
+                    keep_alive = _wants_keep_alive(version, headers)
+
+                    length = int(headers.get('content-length', 0))
+                    if length > MAX_REQUEST_BYTES:
+                        keep_alive = False
+                        raise RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                           f"Body exceeds {MAX_REQUEST_BYTES} bytes")
+                    body = await reader.readexactly(length) if length else b''
+
+                    self.requests += 1
+                    metrics.increment("requests_total")
+                    status, payload = await self.route(method, target.split('?')[0], body)
+                except RequestError as e:
+                    self.errors += 1
+                    metrics.increment("request_errors_total")
+                    status, payload = e.status, {'error': str(e)}
+                except ValueError:
+                    self.errors += 1
+                    metrics.increment("request_errors_total")
+                    keep_alive = False
+                    status, payload = HTTPStatus.BAD_REQUEST, {'error': 'Malformed request'}
+                except Exception as e:
+                    self.errors += 1
+                    metrics.increment("request_errors_total")
+                    status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)}
+
+                writer.write(_encode_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = SERVICE_HOST, port: int = SERVICE_PORT):
+        self.batcher.start()
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"🚀 Inference service listening on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+async def _read_headers(reader: asyncio.StreamReader) -> Dict[str, str]:
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            return headers
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+def _wants_keep_alive(version: str, headers: Dict[str, str]) -> bool:
+    connection = headers.get('connection', '').lower()
+    if version == 'HTTP/1.1':
+        return connection != 'close'
+    return connection == 'keep-alive'
+
+def _encode_response(status: HTTPStatus, payload: Union[Dict, str], keep_alive: bool) -> bytes:
+    if isinstance(payload, str):
+        body, content_type = payload.encode(), "text/plain; version=0.0.4; charset=utf-8"
+    else:
+        body, content_type = json.dumps(payload).encode(), "application/json"
+    head = (
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode('latin-1') + body
+
+def main():
+    parser = argparse.ArgumentParser(description="Heart sound inference service")
+    parser.add_argument('--host', default=SERVICE_HOST)
+    parser.add_argument('--port', type=int, default=SERVICE_PORT)
+    parser.add_argument('--max-batch-size', type=int, default=MICROBATCH_MAX_SIZE)
+    parser.add_argument('--max-wait-ms', type=float, default=MICROBATCH_MAX_WAIT_MS)
+    parser.add_argument('--preprocess-workers', type=int, default=None)
+    parser.add_argument('--pipeline-mode', choices=['standard', 'preallocated'], default=PIPELINE_MODE,
+                        help='preallocated: reuse per-worker buffers and fill the input tensor in place')
+    parser.add_argument('--cascade', action='store_true', default=CASCADE_ENABLED,
+                        help='Answer confident cases with the first-stage model; only escalate the rest to the CNN')
+    parser.add_argument('--first-stage', type=str, default=str(CASCADE_FIRST_STAGE_METADATA),
+                        help='Metadata JSON of the first-stage model used with --cascade')
+    args = parser.parse_args()
+
+    print("❤️ Heart Sound Inference Service")
+    print("=" * 50)
+    model = load_service_model(args.cascade, args.first_stage)
+    print(f"✅ Model loaded: {model.name} (pool size {getattr(model, 'size', 1)})")
+    try:
+        profile = profile_for_served_model(model)
+    except KeyError as e:
+        print(f"❌ {e}")
+        return
+    print(f"🎛️ Preprocessing profile: {profile}")
+    if args.pipeline_mode == 'preallocated':
+        print("♻️ Preallocated pipeline: per-worker buffers, in-place input tensors (no micro-batching)")
+    else:
+        print(f"⏱️ Micro-batching: up to {args.max_batch_size} items, {args.max_wait_ms}ms wait budget")
+
+    service = InferenceService(model, args.max_batch_size, args.max_wait_ms,
+                               args.preprocess_workers, args.pipeline_mode, profile)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\n👋 Service stopped")
+
+if __name__ == "__main__":
+    main()
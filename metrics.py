@@ -0,0 +1,410 @@
+"""
+Per-stage timing instrumentation for the Heart Sound Analyzer.
+In-process histograms, counters and gauges, exported as Prometheus text (the
+inference service's /metrics) and as JSON snapshots. Each process writes its
+snapshots to its own file under runtime_metrics/; system_health_check.py
+merges them into system_health_report.json when it generates the report.
+
+Usage:
+    @timed("preprocess_audio")
+    def preprocess_audio(...): ...
+
+    with timed("inference") as timer:
+        ...
+    timer.elapsed_ms
+
+A sampled fraction of requests (MEMORY_PROFILE_SAMPLE_RATE) run under
+`with profile_memory():`, which traces allocations with tracemalloc and
+records the peak of every stage timed inside it, alongside process RSS.
+
+With METRICS_ENABLED=0, decorated functions are returned unwrapped and
+timers measure but record nothing.
+"""
+
+import os
+import sys
+import json
+import time
+import bisect
+import random
+import functools
+import threading
+import tracemalloc
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from config import (
+    METRICS_ENABLED, METRICS_SNAPSHOT_DIR, METRICS_REPORT_INTERVAL, METRICS_REPORT_MAX_SNAPSHOTS,
+    MEMORY_PROFILE_SAMPLE_RATE
+)
+
+# Histogram bucket upper bounds in seconds (Prometheus convention)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RECENT_SAMPLES = 1024  # Raw durations kept per stage for percentiles in JSON snapshots
+
+class Histogram:
+    """Duration histogram with cumulative-able bucket counts plus a window of recent samples."""
+
+    def __init__(self):
+        self.bucket_counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, seconds: float):
+        self.bucket_counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds * 1000)
+
+class PeakMemory:
+    """Peak traced allocation per profiled call of one stage."""
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def observe(self, nbytes: int):
+        self.count += 1
+        self.sum += nbytes
+        self.max = max(self.max, nbytes)
+
+def process_memory() -> Dict[str, Optional[float]]:
+    """Current and peak resident set size of this process in MB (None where unavailable)."""
+    rss = peak = None
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        rss, peak = info.rss, getattr(info, 'peak_wset', None)
+    except ImportError:
+        try:
+            with open("/proc/self/statm") as f:
+                rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, AttributeError):
+            pass
+    if peak is None:
+        try:
+            import resource
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            peak = max_rss if sys.platform == 'darwin' else max_rss * 1024  # Bytes on macOS, KB elsewhere
+        except ImportError:
+            pass
+    to_mb = lambda value: value / (1024 * 1024) if value is not None else None
+    return {'rss_mb': to_mb(rss), 'peak_rss_mb': to_mb(peak)}
+
+class MetricsRegistry:
+    """Thread-safe stage histograms, named counters and gauges."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms: Dict[str, Histogram] = {}
+        self.memory: Dict[str, PeakMemory] = {}
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, float] = {}
+        self.started_at = time.time()
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def observe_memory(self, stage: str, nbytes: int):
+        with self._lock:
+            peak = self.memory.get(stage)
+            if peak is None:
+                peak = self.memory[stage] = PeakMemory()
+            peak.observe(nbytes)
+
+    def increment(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self.gauges[name] = value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-friendly summary: per-stage count, mean, max and recent percentiles in ms."""
+        from benchmarking import summarize_timings
+
+        with self._lock:
+            stages = {}
+            for stage, h in sorted(self.histograms.items()):
+                recent = summarize_timings(list(h.recent))
+                stages[stage] = {
+                    'count': h.count,
+                    'mean_ms': h.sum / h.count * 1000,
+                    'max_ms': h.max * 1000,
+                    'p50_ms': recent['p50_ms'],
+                    'p95_ms': recent['p95_ms'],
+                    'p99_ms': recent['p99_ms']
+                }
+            memory = {
+                stage: {'count': m.count, 'mean_peak_mb': m.sum / m.count / (1024 * 1024),
+                        'max_peak_mb': m.max / (1024 * 1024)}
+                for stage, m in sorted(self.memory.items())
+            }
+            return {
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'uptime_s': time.time() - self.started_at,
+                'stages': stages,
+                'memory': memory,
+                'process': process_memory(),
+                'counters': dict(sorted(self.counters.items())),
+                'gauges': dict(sorted(self.gauges.items()))
+            }
+
+    def prometheus_text(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            if self.histograms:
+                lines += ["# HELP heart_stage_duration_seconds Time spent in each pipeline stage.",
+                          "# TYPE heart_stage_duration_seconds histogram"]
+            for stage, h in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS + (float('inf'),), h.bucket_counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'heart_stage_duration_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'heart_stage_duration_seconds_sum{{stage="{stage}"}} {h.sum!r}')
+                lines.append(f'heart_stage_duration_seconds_count{{stage="{stage}"}} {h.count}')
+            if self.memory:
+                lines += ["# HELP heart_stage_peak_memory_bytes Peak traced allocation per profiled stage call.",
+                          "# TYPE heart_stage_peak_memory_bytes summary"]
+                for stage, m in sorted(self.memory.items()):
+                    lines.append(f'heart_stage_peak_memory_bytes_sum{{stage="{stage}"}} {m.sum}')
+                    lines.append(f'heart_stage_peak_memory_bytes_count{{stage="{stage}"}} {m.count}')
+                lines.append("# TYPE heart_stage_peak_memory_max_bytes gauge")
+                for stage, m in sorted(self.memory.items()):
+                    lines.append(f'heart_stage_peak_memory_max_bytes{{stage="{stage}"}} {m.max}')
+            for name, value in sorted(self.counters.items()):
+                lines += [f"# TYPE heart_{name} counter", f"heart_{name} {value:g}"]
+            for name, value in sorted(self.gauges.items()):
+                lines += [f"# TYPE heart_{name} gauge", f"heart_{name} {value:g}"]
+
+        process = process_memory()
+        for key, name in [('rss_mb', 'process_resident_memory_bytes'),
+                          ('peak_rss_mb', 'process_peak_resident_memory_bytes')]:
+            if process[key] is not None:
+                lines += [f"# TYPE heart_{name} gauge", f"heart_{name} {int(process[key] * 1024 * 1024)}"]
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.memory.clear()
+            self.counters.clear()
+            self.gauges.clear()
+            self.started_at = time.time()
+
+registry = MetricsRegistry()
+_enabled = METRICS_ENABLED
+
+def enabled() -> bool:
+    return _enabled
+
+def set_enabled(value: bool):
+    """Turn recording on or off (functions decorated while disabled stay unwrapped)."""
+    global _enabled
+    _enabled = value
+
+# Per-thread stack of [traced bytes at stage start, highest peak seen by nested stages]
+_memory_local = threading.local()
+_memory_lock = threading.Lock()
+
+def _memory_enter(stack):
+    current, peak = tracemalloc.get_traced_memory()
+    if stack:
+        stack[-1][1] = max(stack[-1][1], peak)
+    tracemalloc.reset_peak()
+    stack.append([current, current])
+
+def _memory_exit(stack, stage: str):
+    start, nested_peak = stack.pop()
+    peak = max(tracemalloc.get_traced_memory()[1], nested_peak)
+    registry.observe_memory(stage, peak - start)
+    if stack:
+        stack[-1][1] = max(stack[-1][1], peak)
+
+class Timer:
+    """Context manager that times a block and records it under a stage name."""
+
+    __slots__ = ('stage', 'start', 'elapsed_ms', 'memory_stack')
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.elapsed_ms = 0.0
+
+    def __enter__(self):
+        # Only set on a thread inside a sampled profile_memory() block
+        self.memory_stack = getattr(_memory_local, 'stack', None)
+        if self.memory_stack is not None:
+            _memory_enter(self.memory_stack)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        self.elapsed_ms = elapsed * 1000
+        if self.memory_stack is not None:
+            _memory_exit(self.memory_stack, self.stage)
+        if _enabled:
+            registry.observe(self.stage, elapsed)
+            if exc_type is not None:
+                registry.increment(f"{self.stage}_errors_total")
+        return False
+
+def timed(stage: str, fn: Optional[Callable] = None):
+    """
+    Time a block (`with timed(stage) as t:`) or a function (`@timed(stage)`).
+
+    Args:
+        stage: Stage name used as the histogram label
+        fn: Function to wrap directly, as an alternative to decorator syntax
+
+    Returns:
+        A Timer, or the wrapped function when used as a decorator
+    """
+    if fn is not None:
+        return _decorate(stage, fn)
+    return _TimedDecorator(stage)
+
+class _TimedDecorator(Timer):
+    """Timer that can also be applied as a decorator."""
+
+    __slots__ = ()
+
+    def __call__(self, fn: Callable) -> Callable:
+        return _decorate(self.stage, fn)
+
+def _decorate(stage: str, fn: Callable) -> Callable:
+    if not _enabled:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with Timer(stage):
+            return fn(*args, **kwargs)
+    return wrapper
+
+def increment(name: str, value: float = 1):
+    """Add to a counter (no-op when metrics are disabled)."""
+    if _enabled:
+        registry.increment(name, value)
+
+def set_gauge(name: str, value: float):
+    """Set a gauge to its current value (no-op when metrics are disabled)."""
+    if _enabled:
+        registry.set_gauge(name, value)
+
+def observe(stage: str, seconds: float):
+    """Record a duration measured elsewhere, e.g. in a worker process (no-op when metrics are disabled)."""
+    if _enabled:
+        registry.observe(stage, seconds)
+
+class profile_memory:
+    """
+    Trace allocations of a sampled request with tracemalloc.
+
+    Stages timed inside the block (on the same thread) record their peak
+    allocation, and the block itself records one under `stage`. Only one
+    request is traced at a time; tracemalloc sees every thread, so
+    concurrent requests can inflate a sampled peak.
+
+    Args:
+        stage: Name recorded for the whole block
+        sample_rate: Fraction of calls traced (0 disables)
+    """
+
+    def __init__(self, stage: str = "request", sample_rate: float = MEMORY_PROFILE_SAMPLE_RATE):
+        self.stage = stage
+        self.active = (_enabled and sample_rate > 0 and random.random() < sample_rate
+                       and getattr(_memory_local, 'stack', None) is None
+                       and _memory_lock.acquire(blocking=False))
+
+    def __enter__(self):
+        if self.active:
+            self.started_tracing = not tracemalloc.is_tracing()
+            if self.started_tracing:
+                tracemalloc.start()
+            _memory_local.stack = []
+            _memory_enter(_memory_local.stack)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.active:
+            _memory_exit(_memory_local.stack, self.stage)
+            _memory_local.stack = None
+            if self.started_tracing:
+                tracemalloc.stop()
+            _memory_lock.release()
+        return False
+
+# This process's recent snapshots, rewritten to its snapshot file as a whole
+_snapshots = deque(maxlen=METRICS_REPORT_MAX_SNAPSHOTS)
+
+def snapshot_path(directory=METRICS_SNAPSHOT_DIR) -> Path:
+    """This process's snapshot file (one per process, so processes never overwrite each other)."""
+    return Path(directory) / f"{Path(sys.argv[0]).stem or 'python'}-{os.getpid()}.json"
+
+def write_snapshot(directory=METRICS_SNAPSHOT_DIR) -> Optional[Dict[str, Any]]:
+    """
+    Take a snapshot and atomically rewrite this process's snapshot file with its recent ones.
+
+    Returns:
+        The snapshot written, or None if there was nothing to record or the write failed
+    """
+    snapshot = registry.snapshot()
+    if not snapshot['stages'] and not snapshot['counters']:
+        return None
+    snapshot['pid'] = os.getpid()
+    _snapshots.append(snapshot)
+
+    path = snapshot_path(directory)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(list(_snapshots), indent=2))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Could not write metrics to {path}: {e}")
+        return None
+    return snapshot
+
+def collect_snapshots(directory=METRICS_SNAPSHOT_DIR,
+                      max_snapshots: int = METRICS_REPORT_MAX_SNAPSHOTS) -> List[Dict[str, Any]]:
+    """The newest snapshots across every process's snapshot file, oldest first (for the health report)."""
+    snapshots = []
+    for path in sorted(Path(directory).glob("*.json")):
+        try:
+            snapshots += json.loads(path.read_text())
+        except (OSError, ValueError, TypeError):
+            continue
+    snapshots.sort(key=lambda snapshot: snapshot.get('timestamp', ''))
+    return snapshots[-max_snapshots:]
+
+_reporter_lock = threading.Lock()
+_reporter_thread = None
+
+def start_reporter(interval: float = METRICS_REPORT_INTERVAL, directory=METRICS_SNAPSHOT_DIR):
+    """Write a snapshot every `interval` seconds from a daemon thread (once per process)."""
+    global _reporter_thread
+    if not _enabled:
+        return None
+    with _reporter_lock:
+        if _reporter_thread is None:
+            def run():
+                while True:
+                    time.sleep(interval)
+                    write_snapshot(directory)
+            _reporter_thread = threading.Thread(target=run, name="metrics-reporter", daemon=True)
+            _reporter_thread.start()
+    return _reporter_thread
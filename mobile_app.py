@@ -5,19 +5,11 @@ Python 3.13 - NO scipy/librosa/TensorFlow dependencies
 """
 
 import streamlit as st
-import numpy as np
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import tempfile
 import os
 import json
 from pathlib import Path
-from PIL import Image
-import io
 import warnings
 warnings.filterwarnings('ignore')
-import wave
 
 # Try lightweight TensorFlow Lite Runtime (Python 3.13 compatible)
 try:
@@ -37,6 +29,12 @@ except ImportError:
 
 # Import config
 from config import *
+from rendering import spectrogram_png, waveform_png
+from inference import start_warmup
+from offload import OffloadedModel, OffloadPool, prepare_upload_simple
+from result_cache import ResultCache, content_key, model_version, preprocessing_version
+from profiles import profile_for_served_model
+import metrics
 
 # Page config
 st.set_page_config(
@@ -85,96 +83,27 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # ===== AUDIO PROCESSING (NO LIBROSA) =====
+# preprocess_audio_simple and simple_spectrogram live in dsp.py; uploads run them in
+# offload.py's worker processes (prepare_upload_simple)
 
-def load_wav_audio(file_path, target_sr=8000):
-    """Load WAV audio file without librosa."""
+@st.cache_resource
+def get_preprocessing_profile(_model):
+    """Preprocessing profile the served model was trained with (from its metadata)."""
     try:
-        with wave.open(file_path, 'rb') as wav_file:
-            n_channels = wav_file.getnchannels()
-            sample_width = wav_file.getsampwidth()
-            framerate = wav_file.getframerate()
-            n_frames = wav_file.getnframes()
-            
-            # Read audio data
-            audio_data = wav_file.readframes(n_frames)
-            
-            # Convert byte data to numpy array
-            audio = np.frombuffer(audio_data, dtype=np.int16).astype(np.float32)
-            
-            # Normalize to [-1, 1]
-            if sample_width == 2:
-                audio = audio / 32768.0
-            elif sample_width == 1:
-                audio = (audio - 128) / 128.0
-            
-            # Convert to mono if stereo
-            if n_channels == 2:
-                audio = audio.reshape(-1, 2).mean(axis=1)
-            
-            # Resample if needed (simple downsampling)
-            if framerate != target_sr:
-                ratio = target_sr / framerate
-                new_length = int(len(audio) * ratio)
-                audio = np.interp(
-                    np.linspace(0, len(audio)-1, new_length),
-                    np.arange(len(audio)),
-                    audio
-                )
-            
-            return audio, target_sr
-    except Exception as e:
-        st.error(f"Error loading audio: {e}")
-        return np.array([]), 8000
+        return profile_for_served_model(_model)
+    except KeyError as e:
+        st.error(f"❌ {e}")
+        return None
 
-def preprocess_audio_simple(audio, sr, duration=5.0):
-    """Preprocess audio - NO librosa."""
-    try:
-        # Normalize
-        if np.max(np.abs(audio)) > 0:
-            audio = audio / np.max(np.abs(audio))
-        
-        # Fix duration
-        target_length = int(duration * sr)
-        if len(audio) < target_length:
-            audio = np.pad(audio, (0, target_length - len(audio)), mode='constant')
-        else:
-            audio = audio[:target_length]
-        
-        return audio
-    except Exception as e:
-        st.error(f"Error preprocessing: {e}")
-        return audio
+@st.cache_resource
+def get_offload_pool(model_path):
+    """Worker processes for decoding, featurizing and inference (of model_path), shared by all sessions on this server."""
+    return OffloadPool(preload_models=[model_path] if model_path else ())
 
-def simple_spectrogram(audio, sr, n_mels=128, n_fft=1024, hop_length=256):
-    """Compute mel-spectrogram without librosa using numpy FFT."""
-    try:
-        # Compute STFT
-        mel_spec_list = []
-        for i in range(0, len(audio) - n_fft, hop_length):
-            frame = audio[i:i + n_fft]
-            # Apply Hann window
-            window = np.hanning(n_fft)
-            windowed = frame * window
-            # FFT
-            fft = np.fft.rfft(windowed)
-            mag = np.abs(fft)
-            mel_spec_list.append(mag)
-        
-        mel_spec = np.array(mel_spec_list).T
-        
-        # Simple log scale
-        mel_spec = np.log(mel_spec + 1e-9)
-        
-        # Normalize to n_mels bins (simple binning)
-        if mel_spec.shape[0] > n_mels:
-            # Downsample frequency
-            indices = np.linspace(0, mel_spec.shape[0]-1, n_mels).astype(int)
-            mel_spec = mel_spec[indices, :]
-        
-        return mel_spec
-    except Exception as e:
-        st.error(f"Spectrogram error: {e}")
-        return None
+@st.cache_resource
+def get_result_cache():
+    """Result cache shared by all sessions on this server."""
+    return ResultCache()
 
 @st.cache_resource
 def load_tflite_model():
@@ -198,14 +127,10 @@ def load_tflite_model():
             try:
                 # Load TFLite model
                 if str(model_path).endswith('.tflite'):
-                    if USE_TF_LITE_RUNTIME:
-                        interpreter = tflite.Interpreter(model_path=str(model_path))
-                    else:
-                        interpreter = tf.lite.Interpreter(model_path=str(model_path))
-                    
-                    interpreter.allocate_tensors()
+                    # Served from the worker processes; this process keeps no interpreters
+                    model = OffloadedModel(get_offload_pool(str(model_path)), model_path)
                     st.success(f"✅ Model loaded: {model_path.name}")
-                    return interpreter
+                    return model
                     
                 else:
                     # Try Keras model
@@ -225,31 +150,35 @@ def load_tflite_model():
         st.error(f"❌ Error: {e}")
         return None
 
-def make_prediction(model, mel_spec):
+@st.cache_resource
+def get_model_warmup(_model):
+    """Start warming the shared model in the background (once per server)."""
+    return start_warmup(_model)
+
+@st.cache_resource
+def start_metrics_reporter():
+    """Append stage timings to the health report periodically (once per server)."""
+    return metrics.start_reporter()
+
+def ensure_model_ready(warmup):
+    """Wait for model warm-up before running a user prediction."""
+    if not warmup.ready and not warmup.failed:
+        with st.spinner("🔥 Warming up the model..."):
+            warmup.wait_until_ready(WARMUP_TIMEOUT)
+    if not warmup.ready:
+        st.error(f"❌ Model is not ready: {warmup.error or 'warm-up timed out'}")
+        return False
+    return True
+
+@metrics.timed("predict")
+def make_prediction(model, mel_spec, offload):
     """Make prediction - works with both TFLite and Keras."""
     try:
         if model is None:
             return None, None
         
-        # Get input/output details
-        if hasattr(model, 'get_input_details'):
-            input_details = model.get_input_details()
-            output_details = model.get_output_details()
-            
-            # Prepare input
-            input_data = mel_spec.astype(np.float32)
-            model.set_tensor(input_details[0]['index'], input_data)
-            
-            # Run inference
-            model.invoke()
-            
-            # Get output
-            output = model.get_tensor(output_details[0]['index'])
-            confidence = float(output[0][0])
-        else:
-            # Keras model
-            output = model.predict(mel_spec, verbose=0)
-            confidence = float(output[0][0])
+        # TFLite runs on a worker process's interpreter, Keras in this thread
+        confidence = float(offload.predict(model, mel_spec)[0])
         
         # Classify
         prediction = "Abnormal" if confidence > CLASSIFICATION_THRESHOLD else "Normal"
@@ -259,34 +188,16 @@ def make_prediction(model, mel_spec):
         st.error(f"❌ Prediction failed: {e}")
         return None, None
 
-def process_audio_file(audio_file):
-    """Process uploaded audio file."""
+def process_audio_file(audio_file, profile, offload):
+    """Process uploaded audio file with the model's preprocessing profile."""
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp:
-            tmp.write(audio_file.getvalue())
-            tmp_path = tmp.name
-        
-        # Load audio
-        audio, sr = load_wav_audio(tmp_path, SAMPLE_RATE)
-        
-        if len(audio) == 0:
-            st.error("Could not load audio file")
-            return None, None, None
-        
-        # Preprocess
-        audio_proc = preprocess_audio_simple(audio, sr, AUDIO_DURATION)
-        
-        # Get spectrogram
-        mel_spec = simple_spectrogram(audio_proc, sr, N_MELS, N_FFT, HOP_LENGTH)
+        # Decode, preprocess and get the spectrogram (with batch and channel dimensions) in a worker
+        mel_spec, audio_proc, sr = offload.run(prepare_upload_simple, audio_file.getvalue(), profile)
         
         if mel_spec is None:
             st.error("Failed to compute spectrogram")
             return None, None, None
         
-        # Add batch and channel dimensions
-        mel_spec = np.expand_dims(mel_spec, axis=[0, -1])
-        
-        os.unlink(tmp_path)
         return mel_spec, audio_proc, sr
         
     except Exception as e:
@@ -294,41 +205,45 @@ def process_audio_file(audio_file):
         return None, None, None
 
 def plot_waveform(audio):
-    """Plot waveform."""
+    """Render the waveform as PNG bytes, decimated to screen resolution."""
     try:
-        fig, ax = plt.subplots(figsize=(12, 3))
-        ax.plot(audio, linewidth=0.5)
-        ax.set_title("Audio Waveform")
-        ax.set_xlabel("Sample")
-        ax.set_ylabel("Amplitude")
-        ax.grid(alpha=0.3)
-        plt.tight_layout()
-        return fig
+        return waveform_png(audio, width=1200)
     except Exception as e:
         st.warning(f"Could not plot waveform: {e}")
         return None
 
 def plot_spectrogram_simple(mel_spec):
-    """Plot spectrogram using matplotlib."""
+    """Render the spectrogram as PNG bytes with a NumPy colormap lookup."""
     try:
-        fig, ax = plt.subplots(figsize=(12, 4))
-        im = ax.imshow(
-            mel_spec[0, :, :, 0],
-            aspect='auto',
-            origin='lower',
-            cmap='viridis',
-            interpolation='nearest'
-        )
-        ax.set_title('Mel-Spectrogram')
-        ax.set_xlabel('Time Frame')
-        ax.set_ylabel('Mel Frequency Bin')
-        plt.colorbar(im, ax=ax, label='dB')
-        plt.tight_layout()
-        return fig
+        return spectrogram_png(mel_spec)
     except Exception as e:
         st.warning(f"Could not plot spectrogram: {e}")
         return None
 
+def analyze_upload(model, profile, offload, uploaded_file):
+    """Run preprocessing, prediction and plot rendering for one upload."""
+    with st.spinner("🔄 Processing audio..."):
+        mel_spec, audio_proc, sr = process_audio_file(uploaded_file, profile, offload)
+    if mel_spec is None:
+        st.error("Failed to process audio")
+        return None
+
+    with st.spinner("🧠 Running AI analysis..."):
+        prediction, confidence = make_prediction(model, mel_spec, offload)
+    if prediction is None:
+        st.error("Failed to make prediction")
+        return None
+
+    return {
+        'spectrogram': mel_spec,
+        'prediction': prediction,
+        'confidence': confidence,
+        'plots': {
+            'waveform': plot_waveform(audio_proc),
+            'spectrogram': plot_spectrogram_simple(mel_spec)
+        }
+    }
+
 # ===== MAIN APP =====
 
 def main():
@@ -354,13 +269,25 @@ def main():
     if model is None:
         st.warning("⚠️ Model loading failed - app may not function correctly")
         st.stop()
+    profile = get_preprocessing_profile(model)
+    if profile is None:
+        st.stop()
+    # Cached results are only valid for the served model's preprocessing profile
+    pipeline_version = preprocessing_version("numpy-simple", profile)
+    # TFLite models come with their worker pool; the Keras fallback gets one for decoding only
+    offload = model.pool if isinstance(model, OffloadedModel) else get_offload_pool(None)
+
+    # Warm-up runs in the background (TFLite: through the worker pool); analysis waits for it
+    # (see ensure_model_ready)
+    warmup = get_model_warmup(model)
+    start_metrics_reporter()
     
     # File uploader section
     st.markdown("### 🎵 Upload Audio File")
     uploaded_file = st.file_uploader(
         "Choose a heart sound audio file (WAV format recommended)",
-        type=['wav', 'mp3', 'mp4', 'webm', 'ogg', 'm4a'],
-        help="Supported formats: WAV, MP3, MP4, WebM, OGG, M4A"
+        type=['wav', 'flac', 'mp3', 'mp4', 'webm', 'ogg', 'm4a'],
+        help="Supported formats: WAV, FLAC, MP3, MP4, WebM, OGG, M4A"
     )
     
     if uploaded_file is not None:
@@ -370,50 +297,46 @@ def main():
         
         # Process button
         if st.button("🔍 Analyze Heart Sound", use_container_width=True):
-            with st.spinner("🔄 Processing audio..."):
-                result = process_audio_file(uploaded_file)
+            # Identical uploads (from any session) reuse the cached analysis
+            result_cache = get_result_cache()
+            cache_key = content_key(uploaded_file.getvalue(), model_version(model), pipeline_version)
+            analysis = result_cache.get(cache_key)
+
+            if analysis is not None:
+                st.success("⚡ Reusing cached analysis for this recording")
+            elif ensure_model_ready(warmup):
+                analysis = analyze_upload(model, profile, offload, uploaded_file)
+                if analysis is not None:
+                    result_cache.put(cache_key, analysis)
+
+            if analysis is not None:
+                prediction, confidence = analysis['prediction'], analysis['confidence']
+
+                # Display result
+                st.markdown('<div class="result-card">', unsafe_allow_html=True)
                 
-                if result[0] is not None:
-                    mel_spec, audio_proc, sr = result
-                    
-                    # Make prediction
-                    with st.spinner("🧠 Running AI analysis..."):
-                        prediction, confidence = make_prediction(model, mel_spec)
-                    
-                    if prediction is not None:
-                        # Display result
-                        st.markdown('<div class="result-card">', unsafe_allow_html=True)
-                        
-                        if prediction == "Normal":
-                            st.markdown(f'<div class="normal">✅ NORMAL HEART SOUND</div>', unsafe_allow_html=True)
-                        else:
-                            st.markdown(f'<div class="abnormal">⚠️ ABNORMAL HEART SOUND</div>', unsafe_allow_html=True)
-                        
-                        st.markdown(f"**Confidence Score:** {confidence*100:.1f}%", unsafe_allow_html=True)
-                        st.markdown('</div>', unsafe_allow_html=True)
-                        
-                        # Visualizations
-                        col1, col2 = st.columns(2)
-                        
-                        with col1:
-                            st.subheader("🌊 Waveform")
-                            fig_wave = plot_waveform(audio_proc)
-                            if fig_wave:
-                                st.pyplot(fig_wave, use_container_width=True)
-                                plt.close(fig_wave)
-                        
-                        with col2:
-                            st.subheader("🎵 Spectrogram")
-                            fig_spec = plot_spectrogram_simple(mel_spec)
-                            if fig_spec:
-                                st.pyplot(fig_spec, use_container_width=True)
-                                plt.close(fig_spec)
-                        
-                        st.success("✅ Analysis complete!")
-                    else:
-                        st.error("Failed to make prediction")
+                if prediction == "Normal":
+                    st.markdown(f'<div class="normal">✅ NORMAL HEART SOUND</div>', unsafe_allow_html=True)
                 else:
-                    st.error("Failed to process audio")
+                    st.markdown(f'<div class="abnormal">⚠️ ABNORMAL HEART SOUND</div>', unsafe_allow_html=True)
+                
+                st.markdown(f"**Confidence Score:** {confidence*100:.1f}%", unsafe_allow_html=True)
+                st.markdown('</div>', unsafe_allow_html=True)
+                
+                # Visualizations
+                col1, col2 = st.columns(2)
+                
+                with col1:
+                    st.subheader("🌊 Waveform")
+                    if analysis['plots'].get('waveform'):
+                        st.image(analysis['plots']['waveform'], use_column_width=True)
+                
+                with col2:
+                    st.subheader("🎵 Spectrogram")
+                    if analysis['plots'].get('spectrogram'):
+                        st.image(analysis['plots']['spectrogram'], use_column_width=True)
+                
+                st.success("✅ Analysis complete!")
 
 if __name__ == "__main__":
     main()
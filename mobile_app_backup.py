@@ -10,10 +10,8 @@ import librosa
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-import tempfile
 import os
 import json
-import time
 from pathlib import Path
 from PIL import Image
 import io
@@ -33,6 +31,8 @@ except ImportError:
 # Import configuration and utilities
 from config import *
 from utils import *
+from audio_io import decode_audio, upload_bytes
+import metrics
 
 # Gemini API Configuration
 from dotenv import load_dotenv
@@ -304,9 +304,9 @@ class MobileTFLiteInference:
             self.interpreter.set_tensor(self.input_details[0]['index'], input_data)
             
             # Run inference - optimized for mobile speed
-            start_time = time.time()
-            self.interpreter.invoke()
-            inference_time = (time.time() - start_time) * 1000  # Convert to ms
+            with metrics.timed("tflite_invoke") as timer:
+                self.interpreter.invoke()
+            inference_time = timer.elapsed_ms
             
             # Get prediction
             prediction = self.interpreter.get_tensor(self.output_details[0]['index'])
@@ -485,34 +485,23 @@ def preprocess_mobile_audio(audio_file):
         </div>
         """, unsafe_allow_html=True)
         
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp_file:
-            tmp_file.write(audio_file.getvalue())
-            tmp_path = tmp_file.name
-
-        # Load and preprocess audio using optimized pipeline
-        start_time = time.time()
-        audio, sr = load_audio(tmp_path, SAMPLE_RATE)
-        if len(audio) == 0:
-            raise ValueError("Could not load audio file")
-
-        # Preprocess audio
-        processed_audio = preprocess_audio(audio, sr, AUDIO_DURATION)
-
-        # Convert to mel-spectrogram
-        mel_spec = audio_to_melspectrogram(
-            processed_audio, SAMPLE_RATE,
-            N_MELS, N_FFT, HOP_LENGTH
-        )
+        # Decode straight from the upload's bytes (no temp file)
+        with metrics.timed("preprocess_upload") as timer:
+            audio, sr = decode_audio(upload_bytes(audio_file), SAMPLE_RATE)
 
-        # Add batch and channel dimensions for TFLite
-        mel_spec = np.expand_dims(mel_spec, axis=[0, -1])
-        
-        preprocessing_time = (time.time() - start_time) * 1000  # Convert to ms
+            # Preprocess audio
+            processed_audio = preprocess_audio(audio, sr, AUDIO_DURATION)
+
+            # Convert to mel-spectrogram
+            mel_spec = audio_to_melspectrogram(
+                processed_audio, SAMPLE_RATE,
+                N_MELS, N_FFT, HOP_LENGTH
+            )
+
+            # Add batch and channel dimensions for TFLite
+            mel_spec = np.expand_dims(mel_spec, axis=[0, -1])
+        preprocessing_time = timer.elapsed_ms
 
-        # Clean up temp file
-        os.unlink(tmp_path)
-        
         # Clear processing indicator
         processing_placeholder.empty()
 
@@ -0,0 +1,349 @@
+"""
+Shared worker-process pool for the Streamlit apps.
+
+Decoding, librosa trimming and the spectrogram hold the GIL, so running them
+in the Streamlit script thread stalls every other session on the server.
+OffloadPool runs them, and TFLite inference, in a bounded set of worker
+processes created once per server (st.cache_resource):
+
+    offload = OffloadPool(preload_models=[model_path])
+    model = OffloadedModel(offload, model_path)
+    model_input, audio, sr = offload.run(prepare_upload, data, profile)
+    confidences = offload.predict(model, model_input)
+
+Each worker holds one interpreter per preloaded model, with the host-tuned
+options (autotune.py) and a thread count capped so that workers x threads
+stays within the CPU cores. The apps keep no interpreters of their own.
+
+Backpressure: at most `max_pending` tasks are queued or running. Further
+submissions wait up to `admission_timeout` for a slot and then fail with
+OffloadBusy. Each caller waits at most `task_timeout` for its result
+(OffloadTimeout). A task that times out keeps its slot until its worker
+finishes it, so a stuck task still counts against the bound.
+
+The pool records the queue depth as a gauge, along with the queue wait and
+run time of every task. Stage timings and decode stats recorded inside a
+worker stay in that worker process.
+"""
+
+import time
+import threading
+import multiprocessing as mp
+import numpy as np
+from pathlib import Path
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+from config import OFFLOAD_WORKERS, OFFLOAD_MAX_PENDING, OFFLOAD_ADMISSION_TIMEOUT, OFFLOAD_TASK_TIMEOUT
+from autotune import tuned_worker_options
+import metrics
+
+class OffloadBusy(Exception):
+    """Every pool slot stayed taken for the whole admission timeout."""
+
+class OffloadTimeout(TimeoutError):
+    """A task did not finish within its timeout."""
+
+# ===== WORKER SIDE (module-level, so spawned workers can unpickle the tasks) =====
+
+_worker_models: Dict[str, Any] = {}
+_worker_options: Dict[str, Dict[str, Any]] = {}
+
+def _worker_model(model_path):
+    """This worker's TFLiteModel for a model file (loaded on first use, with the pool's tuned options)."""
+    model = _worker_models.get(str(model_path))
+    if model is None:
+        from inference import TFLiteModel
+        options = _worker_options.get(str(model_path), {})
+        model = _worker_models[str(model_path)] = TFLiteModel(model_path, **options)
+    return model
+
+def _init_worker(model_options: Dict[str, Dict[str, Any]]):
+    """Runs once in each new worker: pay the import and model warm-up costs before the first request."""
+    import utils  # noqa: F401
+    try:
+        import librosa  # noqa: F401
+    except ImportError:
+        pass
+    _worker_options.update(model_options)
+    for model_path in model_options:
+        try:
+            _worker_model(model_path).warm_up()
+        except Exception:
+            # predict_input reports the error to the caller if the model is used
+            _worker_models.pop(str(model_path), None)
+
+def _noop():
+    return None
+
+def _run_task(fn: Callable, args: Tuple) -> Tuple[Any, float, float]:
+    """(result, wall-clock start, run seconds) of one task; the start time gives the queue wait."""
+    started_at = time.time()
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, started_at, time.perf_counter() - start
+
+def prepare_upload(data: bytes, profile) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Decode upload bytes and build the model input (app.py's librosa pipeline).
+
+    Args:
+        data: Raw upload bytes
+        profile: profiles.PreprocessingProfile of the served model
+
+    Returns:
+        Tuple of (model_input of shape (1, n_mels, frames, 1), processed_audio, sample_rate)
+    """
+    from audio_io import decode_audio
+
+    audio, sr = decode_audio(data, profile.sample_rate)
+    model_input, processed_audio = profile.prepare_model_input(audio, sr)
+    return model_input, processed_audio, sr
+
+def prepare_upload_simple(data: bytes, profile) -> Tuple[Optional[np.ndarray], np.ndarray, int]:
+    """
+    Decode upload bytes and build the model input without librosa (mobile_app.py's pipeline).
+
+    Returns:
+        Tuple of (model_input of shape (1, n_mels, frames, 1) or None, processed_audio, sample_rate)
+    """
+    from audio_io import decode_audio
+    from dsp import bandpass, preprocess_audio_simple, simple_spectrogram
+
+    audio, sr = decode_audio(data, profile.sample_rate, fast_resample=True)
+    audio_proc = preprocess_audio_simple(audio, sr, profile.duration)
+    if profile.band is not None:
+        audio_proc = bandpass(audio_proc, sr, *profile.band)
+    mel_spec = simple_spectrogram(audio_proc, sr, profile.n_mels, profile.n_fft, profile.hop_length)
+    if mel_spec is None:
+        return None, audio_proc, sr
+    return np.expand_dims(mel_spec, axis=[0, -1]), audio_proc, sr
+
+def predict_input(model_path, model_input: np.ndarray) -> np.ndarray:
+    """Abnormal-class confidences, (N,), from this worker's copy of a TFLite model."""
+    return _worker_model(model_path).predict_batch(model_input)
+
+# ===== CALLER SIDE =====
+
+class OffloadPool:
+    """
+    Bounded process pool with backpressure, per-task timeouts and queue-depth metrics.
+
+    Workers are started with 'spawn': forking a process that has TFLite and the
+    Streamlit server threads loaded can deadlock the children. workers=0 runs
+    tasks in the calling thread, inside submit(): the max_pending bound still
+    applies, but task_timeout cannot interrupt them.
+    """
+
+    def __init__(self, workers: int = OFFLOAD_WORKERS, max_pending: int = OFFLOAD_MAX_PENDING,
+                 admission_timeout: float = OFFLOAD_ADMISSION_TIMEOUT,
+                 task_timeout: float = OFFLOAD_TASK_TIMEOUT,
+                 preload_models: Sequence = (), start: bool = True):
+        """
+        Args:
+            workers: Worker processes (0 runs tasks inline)
+            max_pending: Most tasks queued or running at once
+            admission_timeout: Seconds a submission waits for a slot before OffloadBusy
+            task_timeout: Default seconds run() waits for a result before OffloadTimeout
+                (not applied with workers=0)
+            preload_models: TFLite files every worker loads and warms up when it starts
+            start: Spawn all workers now (in the background) rather than on first use
+        """
+        if max_pending < max(workers, 1):
+            raise ValueError(f"max_pending ({max_pending}) must be at least the worker count ({workers})")
+        self.workers = int(workers)
+        self.max_pending = int(max_pending)
+        self.admission_timeout = admission_timeout
+        self.task_timeout = task_timeout
+        # Tuned once here (calibration results are cached per host), then shared with every worker
+        self.model_options = {str(p): tuned_worker_options(p, max(self.workers, 1))
+                              for p in preload_models if p is not None and Path(p).suffix == '.tflite'}
+        if not self.workers:
+            _worker_options.update(self.model_options)
+
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._counts = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0,
+                        'timeouts': 0, 'worker_restarts': 0}
+        self._executor = self._create_executor() if self.workers else None
+        if start and self._executor is not None:
+            # One no-op per worker spawns them all; initializers run while the app renders
+            for _ in range(self.workers):
+                self._executor.submit(_noop)
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=mp.get_context('spawn'),
+                                   initializer=_init_worker, initargs=(self.model_options,))
+
+    def _restart(self, broken: ProcessPoolExecutor):
+        """Replace an executor whose worker died (e.g. killed for memory); its tasks have already failed."""
+        with self._lock:
+            if self._executor is not broken:
+                return
+            self._executor = self._create_executor()
+            self._counts['worker_restarts'] += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+        metrics.increment("offload_worker_restarts")
+
+    @property
+    def queue_depth(self) -> int:
+        """Tasks admitted but not yet picked up by a worker (estimated from the in-flight count)."""
+        return max(0, self._in_flight - max(self.workers, 1))
+
+    def _update_gauges(self):
+        metrics.set_gauge("offload_in_flight", self._in_flight)
+        metrics.set_gauge("offload_queue_depth", self.queue_depth)
+
+    def _admit(self, name: str):
+        if not self._slots.acquire(timeout=self.admission_timeout):
+            with self._lock:
+                self._counts['rejected'] += 1
+            metrics.increment("offload_rejected")
+            raise OffloadBusy(f"Server busy: {self.max_pending} tasks already queued or running "
+                              f"({name} waited {self.admission_timeout:g}s); please try again shortly")
+        with self._lock:
+            self._in_flight += 1
+            self._counts['submitted'] += 1
+            self._update_gauges()
+
+    def _finished(self, name: str, submitted_at: float, future: Future):
+        with self._lock:
+            self._in_flight -= 1
+            failed = future.cancelled() or future.exception() is not None
+            self._counts['failed' if failed else 'completed'] += 1
+            self._update_gauges()
+        self._slots.release()
+        if not failed:
+            _, started_at, run_s = future.result()
+            metrics.observe("offload_queue_wait", max(0.0, started_at - submitted_at))
+            metrics.observe(f"offload:{name}", run_s)
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """
+        Queue fn(*args) on a worker, waiting for a free slot first.
+
+        Returns:
+            Future resolving to (result, wall-clock start, run seconds)
+
+        Raises:
+            OffloadBusy: If no slot frees up within the admission timeout
+        """
+        name = getattr(fn, '__name__', 'task')
+        self._admit(name)
+        submitted_at = time.time()
+        try:
+            if self._executor is None:
+                future = Future()
+                try:
+                    future.set_result(_run_task(fn, args))
+                except Exception as e:
+                    future.set_exception(e)
+            else:
+                future = self._executor.submit(_run_task, fn, args)
+        except BaseException:
+            # Never queued (e.g. the executor is broken or shut down): give the slot back
+            with self._lock:
+                self._in_flight -= 1
+                self._update_gauges()
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda f: self._finished(name, submitted_at, f))
+        return future
+
+    def run(self, fn: Callable, *args, timeout: Optional[float] = None) -> Any:
+        """
+        Run fn(*args) on a worker and wait for its result.
+
+        Args:
+            fn: Module-level function (it is pickled by reference)
+            *args: Picklable arguments
+            timeout: Seconds to wait for the result (default: the pool's task_timeout)
+
+        Raises:
+            OffloadBusy: If the pool stays full for the admission timeout
+            OffloadTimeout: If the task does not finish in time
+            Whatever fn raises in the worker
+        """
+        timeout = self.task_timeout if timeout is None else timeout
+        executor = self._executor
+        try:
+            future = self.submit(fn, *args)
+        except BrokenProcessPool:
+            self._restart(executor)
+            future = self.submit(fn, *args)
+
+        try:
+            result, _, _ = future.result(timeout=timeout)
+            return result
+        except FutureTimeout:
+            future.cancel()
+            with self._lock:
+                self._counts['timeouts'] += 1
+            metrics.increment("offload_timeouts")
+            raise OffloadTimeout(f"{getattr(fn, '__name__', 'task')} did not finish within {timeout:g}s")
+        except BrokenProcessPool:
+            self._restart(executor)
+            raise
+
+    def predict(self, model, model_input: np.ndarray, timeout: Optional[float] = None) -> np.ndarray:
+        """
+        Abnormal-class confidences, (N,), for a loaded model.
+
+        OffloadedModels run on a worker's interpreter; other models (the Keras
+        fallback) run in the calling thread.
+        """
+        if isinstance(model, OffloadedModel):
+            return model.predict_batch(model_input, timeout=timeout)
+        if hasattr(model, 'predict_batch'):
+            return model.predict_batch(model_input)
+        return np.asarray(model.predict(model_input, verbose=0)).reshape(len(model_input), -1)[:, 0]
+
+    def stats(self) -> Dict[str, Any]:
+        """Configuration, current load and lifetime task counts."""
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'in_flight': self._in_flight,
+                'queue_depth': self.queue_depth,
+                'task_timeout_s': self.task_timeout,
+                'model_options': {Path(p).name: options for p, options in self.model_options.items()},
+                **self._counts
+            }
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+
+class OffloadedModel:
+    """
+    A TFLite model served by an OffloadPool's workers, usable wherever a TFLiteModel is.
+
+    Only the input shape is read in this process (the interpreter is created
+    without allocating tensors and dropped). start_warmup(model) therefore
+    times real predictions through the pool, so readiness reflects the workers.
+    """
+
+    def __init__(self, pool: OffloadPool, model_path):
+        from inference import create_interpreter
+
+        self.pool = pool
+        self.model_path = Path(model_path)
+        # Also validates the file before any request reaches a worker
+        input_detail = create_interpreter(self.model_path).get_input_details()[0]
+        self.input_shape = (None,) + tuple(int(d) for d in input_detail['shape'][1:])
+
+    @property
+    def name(self) -> str:
+        return self.model_path.name
+
+    def predict_batch(self, batch: np.ndarray, timeout: Optional[float] = None) -> np.ndarray:
+        """Abnormal-class confidences, (N,), from a worker's interpreter."""
+        return self.pool.run(predict_input, str(self.model_path),
+                             np.ascontiguousarray(batch, dtype=np.float32), timeout=timeout)
+
+    def predict(self, x: np.ndarray, verbose: int = 0) -> np.ndarray:
+        """Keras-compatible predict returning an (N, 1) array."""
+        return self.predict_batch(x)[:, np.newaxis]
@@ -67,6 +67,7 @@ def test_preprocessing_config():
 
         preprocess_config = load_preprocessing_config(config_path)
         print('✅ Preprocessing config loaded')
+        print(f'   Profile: {preprocess_config.get("profile") or "unnamed"} v{preprocess_config.get("version", "N/A")}')
         print(f'   Sample rate: {preprocess_config.get("sample_rate", "N/A")}')
         print(f'   Duration: {preprocess_config.get("duration", "N/A")}')
         print(f'   Mel bins: {preprocess_config.get("n_mels", "N/A")}')
@@ -0,0 +1,238 @@
+"""
+Named, versioned preprocessing profiles for the Heart Sound Analyzer.
+
+A profile fixes every setting that shapes a model input (sample rate, clip
+duration, mel bins, FFT size, hop length, band-pass). Each model's metadata
+binds it to one profile ('preprocessing_profile': {name, version}), and the
+apps, the inference service and the caches look the profile up from there
+instead of reading the config.py globals. A model trained on the fast profile
+and one trained on the standard profile can then be served side by side.
+
+Registered profiles never change. To change a pipeline, register a new version
+under the same name. Models bound to the old version keep getting the inputs
+they were trained on.
+"""
+
+import json
+from functools import lru_cache
+from pathlib import Path, PureWindowsPath
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import (SAMPLE_RATE, AUDIO_DURATION, N_MELS, N_FFT, HOP_LENGTH,
+                    FAST_SAMPLE_RATE, FAST_N_MELS, FAST_N_FFT, FAST_HOP_LENGTH,
+                    BANDPASS_LOW_HZ, BANDPASS_HIGH_HZ, DEFAULT_PROFILE)
+
+class PreprocessingProfile:
+    """One named, versioned set of preprocessing parameters."""
+
+    def __init__(self, name: str, version: int, sample_rate: int, duration: float,
+                 n_mels: int, n_fft: int, hop_length: int,
+                 band: Optional[Tuple[float, float]] = None, description: str = ""):
+        self.name = name
+        self.version = int(version)
+        self.sample_rate = int(sample_rate)
+        self.duration = float(duration)
+        self.n_mels = int(n_mels)
+        self.n_fft = int(n_fft)
+        self.hop_length = int(hop_length)
+        self.band = (float(band[0]), float(band[1])) if band is not None else None
+        self.description = description
+
+    @property
+    def key(self) -> str:
+        """'name@vN', unique per registered profile."""
+        return f"{self.name}@v{self.version}"
+
+    @property
+    def expected_shape(self) -> Tuple[int, int]:
+        """(n_mels, frames) of the spectrograms this profile produces."""
+        return (self.n_mels, int(self.duration * self.sample_rate // self.hop_length) + 1)
+
+    def params(self) -> Dict[str, Any]:
+        """The parameters that determine the model input."""
+        return {
+            'sample_rate': self.sample_rate,
+            'duration': self.duration,
+            'n_mels': self.n_mels,
+            'n_fft': self.n_fft,
+            'hop_length': self.hop_length,
+            'band': list(self.band) if self.band is not None else None
+        }
+
+    def matches(self, params: Dict[str, Any]) -> bool:
+        """True if a preprocessing config dict describes this profile's parameters."""
+        try:
+            band = params.get('band', params.get('bandpass_hz'))
+            return (int(params['sample_rate']) == self.sample_rate
+                    and float(params['duration']) == self.duration
+                    and int(params['n_mels']) == self.n_mels
+                    and int(params['n_fft']) == self.n_fft
+                    and int(params['hop_length']) == self.hop_length
+                    and (tuple(float(b) for b in band) if band else None) == self.band)
+        except (KeyError, TypeError, ValueError):
+            return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Preprocessing config dict, as saved next to spectrograms and in model metadata."""
+        return {
+            'profile': self.name,
+            'version': self.version,
+            **self.params(),
+            'expected_shape': list(self.expected_shape)
+        }
+
+    def workspace(self):
+        """The calling thread's dsp.SpectrogramWorkspace for this profile."""
+        from dsp import thread_workspace
+        return thread_workspace(self.sample_rate, self.duration, self.n_mels,
+                                self.n_fft, self.hop_length, band=self.band)
+
+    def prepare_model_input(self, audio, sr: int):
+        """utils.prepare_model_input with this profile's parameters (resampling first if needed)."""
+        from utils import prepare_model_input
+        if sr != self.sample_rate:
+            import librosa
+            audio, sr = librosa.resample(audio, orig_sr=sr, target_sr=self.sample_rate), self.sample_rate
+        return prepare_model_input(audio, sr, self.duration, self.n_mels, self.n_fft,
+                                   self.hop_length, band=self.band)
+
+    def __repr__(self) -> str:
+        band = f", band={self.band[0]:g}-{self.band[1]:g}Hz" if self.band else ""
+        return (f"PreprocessingProfile({self.key}: {self.sample_rate}Hz, {self.duration:g}s, "
+                f"{self.n_mels} mels, n_fft={self.n_fft}, hop={self.hop_length}{band})")
+
+_REGISTRY: Dict[Tuple[str, int], PreprocessingProfile] = {}
+
+def register_profile(profile: PreprocessingProfile) -> PreprocessingProfile:
+    """
+    Add a profile to the registry.
+
+    Registering the same name and version again with other parameters is an
+    error, because models already bound to that version would silently drift.
+    """
+    existing = _REGISTRY.get((profile.name, profile.version))
+    if existing is not None and existing.params() != profile.params():
+        raise ValueError(f"Profile {profile.key} is already registered with other parameters; "
+                         f"register version {profile.version + 1} instead")
+    _REGISTRY[(profile.name, profile.version)] = profile
+    return profile
+
+def get_profile(name: str = DEFAULT_PROFILE, version: Optional[int] = None) -> PreprocessingProfile:
+    """
+    Look up a registered profile.
+
+    Args:
+        name: Profile name
+        version: Profile version (None for the latest one)
+
+    Returns:
+        The PreprocessingProfile; raises KeyError if it is not registered
+    """
+    versions = sorted(v for n, v in _REGISTRY if n == name)
+    if not versions:
+        raise KeyError(f"Unknown preprocessing profile {name!r} (registered: {', '.join(list_profiles())})")
+    version = versions[-1] if version is None else int(version)
+    if (name, version) not in _REGISTRY:
+        raise KeyError(f"Preprocessing profile {name!r} has no version {version} (registered: {versions})")
+    return _REGISTRY[(name, version)]
+
+def list_profiles() -> List[str]:
+    """Keys of every registered profile."""
+    return [_REGISTRY[k].key for k in sorted(_REGISTRY)]
+
+def find_profile(params: Dict[str, Any]) -> Optional[PreprocessingProfile]:
+    """The registered profile a preprocessing config dict describes (named or by parameters)."""
+    if params.get('profile') is not None:
+        profile = get_profile(params['profile'], params.get('version'))
+        if profile.matches(params):
+            return profile
+    return next((p for _, p in sorted(_REGISTRY.items()) if p.matches(params)), None)
+
+# Built-in profiles, following config.py. Register a new version here when those settings change.
+STANDARD_PROFILE = register_profile(PreprocessingProfile(
+    'standard', 1, SAMPLE_RATE, AUDIO_DURATION, N_MELS, N_FFT, HOP_LENGTH,
+    description="8 kHz, full band - the deployed CNN"
+))
+FAST_PROFILE = register_profile(PreprocessingProfile(
+    'fast', 1, FAST_SAMPLE_RATE, AUDIO_DURATION, FAST_N_MELS, FAST_N_FFT, FAST_HOP_LENGTH,
+    band=(BANDPASS_LOW_HZ, BANDPASS_HIGH_HZ),
+    description="2 kHz, band-passed - fast screening"
+))
+
+def bind_profile(metadata: Dict[str, Any], profile: PreprocessingProfile) -> Dict[str, Any]:
+    """Record in model metadata which profile the model was trained with (returns the metadata)."""
+    metadata['preprocessing_profile'] = {'name': profile.name, 'version': profile.version}
+    metadata['preprocessing'] = profile.to_dict()
+    return metadata
+
+def profile_from_metadata(metadata: Dict[str, Any]) -> Optional[PreprocessingProfile]:
+    """
+    The profile bound in model metadata.
+
+    Metadata written before profiles existed has no binding; its inline
+    'preprocessing' dict is matched against the registry instead.
+    """
+    binding = metadata.get('preprocessing_profile')
+    if binding:
+        return get_profile(binding['name'], binding.get('version'))
+    if isinstance(metadata.get('preprocessing'), dict):
+        return find_profile(metadata['preprocessing'])
+    return None
+
+@lru_cache(maxsize=32)
+def model_metadata_path(model_path) -> Optional[Path]:
+    """
+    The metadata file describing a model file, or None.
+
+    <stem>_metadata.json next to the model is used when it exists; otherwise the
+    metadata files in the model's directory are searched for one naming the file
+    in 'model_path' or 'model_files'.
+    """
+    model_path = Path(model_path)
+    candidate = model_path.with_name(f"{model_path.stem}_metadata.json")
+    if candidate.exists():
+        return candidate
+
+    for metadata_path in sorted(model_path.parent.glob("*metadata.json")):
+        try:
+            with open(metadata_path, 'r') as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if not isinstance(metadata, dict):
+            continue
+        named = [metadata.get('model_path'), *(metadata.get('model_files') or {}).values()]
+        # Older metadata stores absolute Windows paths
+        if model_path.name in {PureWindowsPath(str(n)).name for n in named if n}:
+            return metadata_path
+    return None
+
+def profile_for_model(model_path=None, default: str = DEFAULT_PROFILE) -> PreprocessingProfile:
+    """
+    The preprocessing profile a model was trained with.
+
+    Args:
+        model_path: Model file (.tflite/.keras); None for models without one
+        default: Profile name used when the model's metadata does not name one
+
+    Returns:
+        The bound PreprocessingProfile, else the latest version of `default`.
+        Raises KeyError if the metadata names a profile that is not registered.
+    """
+    metadata_path = model_metadata_path(Path(model_path)) if model_path is not None else None
+    if metadata_path is not None:
+        with open(metadata_path, 'r') as f:
+            profile = profile_from_metadata(json.load(f))
+        if profile is not None:
+            return profile
+    return get_profile(default)
+
+def served_model_path(model) -> Optional[Path]:
+    """File behind a loaded model (TFLiteModel, InterpreterPool or a cascade in front of one)."""
+    while model is not None and getattr(model, 'model_path', None) is None:
+        model = getattr(model, 'second_stage', None)
+    return Path(model.model_path) if model is not None else None
+
+def profile_for_served_model(model, default: str = DEFAULT_PROFILE) -> PreprocessingProfile:
+    """profile_for_model for a loaded model object."""
+    return profile_for_model(served_model_path(model), default)
@@ -0,0 +1,215 @@
+"""
+Fast plot rendering for the Heart Sound Analyzer.
+Waveforms are decimated to screen resolution and spectrograms are color-mapped
+with a NumPy lookup table; both are encoded straight to PNG without Matplotlib.
+"""
+
+import zlib
+import struct
+import numpy as np
+from typing import Optional, Tuple
+
+from config import RENDER_CACHE_MAX_ENTRIES, RENDER_CACHE_MAX_MB
+from result_cache import ResultCache, content_key
+
+# Viridis sampled at 9 evenly spaced stops; interpolated into a 256-entry LUT
+_VIRIDIS_STOPS = np.array([
+    (68, 1, 84), (72, 40, 120), (62, 73, 137), (49, 104, 142), (38, 130, 142),
+    (31, 158, 137), (53, 183, 121), (110, 206, 88), (253, 231, 37)
+], dtype=np.float64)
+VIRIDIS_LUT = np.stack([
+    np.interp(np.linspace(0, 1, 256), np.linspace(0, 1, len(_VIRIDIS_STOPS)), _VIRIDIS_STOPS[:, c])
+    for c in range(3)
+], axis=1).round().astype(np.uint8)
+
+WAVEFORM_COLOR = (31, 119, 180)  # Matplotlib's default blue (#1f77b4)
+BACKGROUND_COLOR = (255, 255, 255)
+AXIS_COLOR = (200, 200, 200)
+
+_render_cache = ResultCache(max_entries=RENDER_CACHE_MAX_ENTRIES,
+                            max_bytes=RENDER_CACHE_MAX_MB * 1024 * 1024,
+                            ttl_seconds=float('inf'))
+
+def encode_png(rgb: np.ndarray, compress_level: int = 1) -> bytes:
+    """
+    Encode an (H, W, 3) uint8 image as PNG.
+
+    Args:
+        rgb: Image array
+        compress_level: zlib level; plots compress well even at the fastest setting
+
+    Returns:
+        PNG file bytes
+    """
+    height, width, _ = rgb.shape
+    # Each scanline is prefixed with filter type 0 (None)
+    raw = np.empty((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 0] = 0
+    raw[:, 1:] = rgb.reshape(height, width * 3)
+
+    def chunk(tag: bytes, body: bytes) -> bytes:
+        return struct.pack('>I', len(body)) + tag + body + struct.pack('>I', zlib.crc32(tag + body))
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) +
+            chunk(b'IDAT', zlib.compress(raw.tobytes(), compress_level)) + chunk(b'IEND', b''))
+
+def minmax_decimate(audio: np.ndarray, n_buckets: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-bucket minimum and maximum, preserving every peak at screen resolution.
+
+    Returns:
+        Tuple of (minimums, maximums), each of length n_buckets
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    n_buckets = max(1, min(n_buckets, len(audio)))
+    usable = len(audio) - len(audio) % n_buckets
+    if usable == len(audio):
+        buckets = audio.reshape(n_buckets, -1)
+        return buckets.min(axis=1), buckets.max(axis=1)
+
+    # Uneven lengths: reduce over variable-size buckets
+    edges = np.linspace(0, len(audio), n_buckets + 1).astype(int)[:-1]
+    return np.minimum.reduceat(audio, edges), np.maximum.reduceat(audio, edges)
+
+def lttb(audio: np.ndarray, n_out: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the points that best preserve the visual shape of the line.
+
+    Returns:
+        Tuple of (sample indices, values), each of length n_out
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    n = len(audio)
+    if n_out >= n or n_out < 3:
+        return np.arange(n), audio
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+
+    x = np.arange(n, dtype=np.float64)
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point) is the third triangle vertex
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = audio[next_start:next_end].mean()
+
+        prev = indices[i]
+        area = np.abs((x[prev] - avg_x) * (audio[start:end] - audio[prev]) -
+                      (x[prev] - x[start:end]) * (avg_y - audio[prev]))
+        indices[i + 1] = start + int(np.argmax(area))
+
+    return indices, audio[indices]
+
+def _column_spans(audio: np.ndarray, width: int, method: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Lowest and highest value drawn in each pixel column."""
+    if method == 'minmax':
+        return minmax_decimate(audio, width)
+    if method == 'lttb':
+        indices, values = lttb(audio, width)
+        # Connect consecutive points: each column spans the segment it starts
+        columns = np.minimum((indices * width) // max(len(audio), 1), width - 1)
+        following = np.append(values[1:], values[-1])
+        lo = np.full(width, np.inf, dtype=np.float32)
+        hi = np.full(width, -np.inf, dtype=np.float32)
+        np.minimum.at(lo, columns, np.minimum(values, following))
+        np.maximum.at(hi, columns, np.maximum(values, following))
+        # Columns without a point continue the previous segment
+        filled = np.isfinite(lo)
+        last = np.maximum.accumulate(np.where(filled, np.arange(width), 0))
+        return lo[last], hi[last]
+    raise ValueError(f"Unknown decimation method: {method}")
+
+def render_waveform(audio: np.ndarray, width: int = 1000, height: int = 240,
+                    method: str = 'minmax') -> np.ndarray:
+    """
+    Rasterize a waveform to an (height, width, 3) image.
+
+    Args:
+        audio: Audio samples (roughly in [-1, 1])
+        width: Image width in pixels; the waveform is decimated to this many columns
+        height: Image height in pixels
+        method: 'minmax' (exact envelope) or 'lttb' (shape-preserving line)
+
+    Returns:
+        RGB image array
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[:] = BACKGROUND_COLOR
+    image[height // 2, :] = AXIS_COLOR
+    if len(audio) == 0:
+        return image
+
+    width_used = min(width, len(audio))
+    lo, hi = _column_spans(audio, width_used, method)
+
+    peak = float(np.max(np.abs(audio))) or 1.0
+    to_row = lambda v: np.clip(((1 - v / peak) * 0.5 * (height - 1)).round(), 0, height - 1)
+    top, bottom = to_row(hi), to_row(lo)
+
+    rows = np.arange(height)[:, np.newaxis]
+    mask = (rows >= top) & (rows <= bottom)
+    if width_used < width:
+        # Short signals: stretch columns to the full width (nearest neighbor)
+        mask = mask[:, np.linspace(0, width_used - 1, width).round().astype(int)]
+    image[mask] = WAVEFORM_COLOR
+    return image
+
+def render_spectrogram(spec: np.ndarray, width: Optional[int] = None, height: Optional[int] = None,
+                       vmin: Optional[float] = None, vmax: Optional[float] = None) -> np.ndarray:
+    """
+    Color-map a (n_mels, frames) spectrogram to an RGB image with low frequencies at the bottom.
+
+    Args:
+        spec: Spectrogram in dB (extra singleton dimensions are squeezed)
+        width: Output width (defaults to 4 pixels per frame)
+        height: Output height (defaults to 2 pixels per mel bin)
+        vmin: Value mapped to the bottom of the colormap (defaults to the minimum)
+        vmax: Value mapped to the top of the colormap (defaults to the maximum)
+
+    Returns:
+        RGB image array
+    """
+    spec = np.squeeze(np.asarray(spec, dtype=np.float32))
+    n_bins, n_frames = spec.shape
+    width = width or n_frames * 4
+    height = height or n_bins * 2
+
+    vmin = float(spec.min()) if vmin is None else vmin
+    vmax = float(spec.max()) if vmax is None else vmax
+    scale = 255.0 / (vmax - vmin) if vmax > vmin else 0.0
+    levels = np.clip((spec - vmin) * scale, 0, 255).astype(np.uint8)
+
+    # Nearest-neighbor resize by index lookup, flipping so bin 0 is at the bottom
+    rows = np.linspace(n_bins - 1, 0, height).round().astype(int)
+    cols = np.linspace(0, n_frames - 1, width).round().astype(int)
+    return VIRIDIS_LUT[levels[rows[:, np.newaxis], cols]]
+
+def waveform_png(audio: np.ndarray, width: int = 1000, height: int = 240,
+                 method: str = 'minmax') -> bytes:
+    """PNG of a decimated waveform, cached by content hash."""
+    audio = np.ascontiguousarray(audio, dtype=np.float32)
+    key = content_key(audio.data, 'waveform', width, height, method)
+    return _cached(key, lambda: encode_png(render_waveform(audio, width, height, method)))
+
+def spectrogram_png(spec: np.ndarray, width: Optional[int] = None,
+                    height: Optional[int] = None) -> bytes:
+    """PNG of a color-mapped spectrogram, cached by content hash."""
+    spec = np.ascontiguousarray(spec, dtype=np.float32)
+    key = content_key(spec.data, 'spectrogram', spec.shape, width, height)
+    return _cached(key, lambda: encode_png(render_spectrogram(spec, width, height)))
+
+def _cached(key: str, render_fn) -> bytes:
+    png = _render_cache.get(key)
+    if png is None:
+        png = render_fn()
+        _render_cache.put(key, png)
+    return png
+
+def render_cache_stats():
+    return _render_cache.stats()
@@ -0,0 +1,132 @@
+"""
+Content-addressed result cache for the Heart Sound Analyzer.
+Shared across Streamlit reruns and sessions so identical uploads are analyzed once.
+"""
+
+import sys
+import json
+import time
+import hashlib
+import threading
+import numpy as np
+from pathlib import Path
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from config import RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_MAX_MB, RESULT_CACHE_TTL_SECONDS
+from profiles import PreprocessingProfile, get_profile
+
+def content_key(data: bytes, *versions: str) -> str:
+    """Cache key from the upload bytes plus model/preprocessing version strings."""
+    digest = hashlib.sha256(data)
+    for version in versions:
+        digest.update(b'\0' + str(version).encode())
+    return digest.hexdigest()
+
+def model_version(model) -> str:
+    """Version string for a loaded model; changes when its file is replaced."""
+    model_path = getattr(model, 'model_path', None)
+    if model_path is not None and Path(model_path).exists():
+        stat = Path(model_path).stat()
+        return f"{Path(model_path).name}:{stat.st_size}:{stat.st_mtime_ns}"
+    return getattr(model, 'name', type(model).__name__)
+
+def preprocessing_version(pipeline: str, profile: Optional[PreprocessingProfile] = None) -> str:
+    """Short hash of the preprocessing pipeline name and the profile it runs (default profile if None)."""
+    profile = profile or get_profile()
+    params = {'pipeline': pipeline, 'profile': profile.key, **profile.params()}
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+
+def estimate_size(value: Any) -> int:
+    """Approximate memory footprint of a cached value in bytes."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+class ResultCache:
+    """
+    Thread-safe LRU cache with a TTL, an entry limit and a memory cap.
+
+    Entries larger than the whole memory cap are not stored. Hit, miss,
+    eviction and expiry counters are exposed through stats().
+    """
+
+    def __init__(self, max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+                 max_bytes: int = RESULT_CACHE_MAX_MB * 1024 * 1024,
+                 ttl_seconds: float = RESULT_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (value, size, stored_at)
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value (refreshing its LRU position) or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, _, stored_at = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: Any) -> bool:
+        """Store a value, evicting least recently used entries to stay within limits."""
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return False
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic())
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return True
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'size_mb': self._bytes / (1024 * 1024),
+                'max_mb': self.max_bytes / (1024 * 1024),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+"""
+Offline Batch Scoring
+Scores a directory (or manifest) of recordings without the UI: decoding and
+featurization fan out across a process pool, inference runs in large batches
+through TFLite or Keras, and per-window results stream to CSV or Parquet.
+Re-running with --resume skips files already in the output; files that failed
+are scored again.
+"""
+
+import io
+import os
+import csv
+import sys
+import time
+import argparse
+import multiprocessing as mp
+import numpy as np
+from pathlib import Path
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# Add parent directory for imports
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from config import *
+from profiles import profile_for_model
+
+COLUMNS = ['file', 'window', 'start_s', 'confidence', 'predicted_class',
+           'decode_ms', 'featurize_ms', 'inference_ms', 'error']
+
+DEFAULT_MODELS = [
+    "heart_sound_mobile.tflite",
+    "heart_sound_mobile_quantized.tflite",
+    "gpu_optimized_cnn_final.keras"
+]
+
+# ===== INPUTS =====
+
+def collect_files(inputs):
+    """Audio files from directories (recursive), manifests (.csv with a `path` column, or .txt) and paths."""
+    files = []
+    for item in map(Path, inputs):
+        if item.is_dir():
+            files.extend(sorted(p for p in item.rglob('*') if p.suffix.lower() in AUDIO_EXTENSIONS))
+        elif item.suffix.lower() == '.csv':
+            with open(item, newline='') as f:
+                rows = csv.DictReader(f)
+                column = 'path' if 'path' in (rows.fieldnames or []) else 'file'
+                files.extend(item.parent / row[column] for row in rows)
+        elif item.suffix.lower() == '.txt':
+            with open(item) as f:
+                files.extend(item.parent / line.strip() for line in f if line.strip())
+        else:
+            files.append(item)
+    # Relative manifest entries resolve against the manifest; dedupe while keeping order
+    return list(dict.fromkeys(str(p) for p in files))
+
+def window_starts(n_samples, sr, duration, hop_s):
+    """Sample offsets of the scoring windows (one window, covering the whole file, when hop_s is None)."""
+    window = int(duration * sr)
+    if hop_s is None or n_samples <= window:
+        return [0]
+    hop = max(1, int(hop_s * sr))
+    starts = list(range(0, n_samples - window + 1, hop))
+    if starts[-1] + window < n_samples:
+        # Keep the tail: the last window ends at the end of the recording
+        starts.append(n_samples - window)
+    return starts
+
+# ===== WORKERS (decode + featurize, run in the process pool) =====
+
+def featurize_file(path, hop_s, features, profile):
+    """
+    Decode one recording and compute the model input for each scoring window.
+
+    Each window goes through the same trim/normalize/pad + log-mel pipeline as a
+    standalone upload of that window would, with the model's preprocessing profile.
+
+    Returns:
+        Dictionary with file, spectrograms (n_windows, n_mels, frames), start_s,
+        decode_ms, featurize_ms and error (None on success)
+    """
+    from audio_io import decode_audio
+    result = {'file': path, 'spectrograms': None, 'start_s': [], 'decode_ms': 0.0,
+              'featurize_ms': 0.0, 'error': None}
+    try:
+        start = time.perf_counter()
+        with open(path, 'rb') as f:
+            audio, sr = decode_audio(f.read(), profile.sample_rate)
+        decoded = time.perf_counter()
+        if len(audio) == 0:
+            raise ValueError("Empty audio")
+
+        starts = window_starts(len(audio), sr, profile.duration, hop_s)
+        window = int(profile.duration * sr) if len(starts) > 1 else len(audio)
+        if features == 'librosa':
+            spectrograms = np.stack([
+                profile.prepare_model_input(audio[s:s + window], sr)[0][0, ..., 0]
+                for s in starts
+            ])
+        else:
+            workspace = profile.workspace()
+            spectrograms = np.empty((len(starts),) + workspace.shape, dtype=np.float32)
+            for i, s in enumerate(starts):
+                workspace.prepare(audio[s:s + window], spectrograms[i])
+
+        result.update(spectrograms=spectrograms, start_s=[s / sr for s in starts],
+                      decode_ms=(decoded - start) * 1000,
+                      featurize_ms=(time.perf_counter() - decoded) * 1000)
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    return result
+
+# ===== INFERENCE =====
+
+def load_scoring_model(model_path, batch_size):
+    """Return (name, predict_fn) where predict_fn maps (N, n_mels, frames) -> (N,) confidences."""
+    model_path = Path(model_path)
+    if model_path.suffix == '.tflite':
+        from inference import TFLiteModel
+        model = TFLiteModel(model_path, batch_buckets=tuple(INFERENCE_BATCH_BUCKETS) + (batch_size,))
+        return model.name, model.predict_batch
+
+    import tensorflow as tf
+    model = tf.keras.models.load_model(str(model_path), compile=False)
+    return model_path.name, lambda batch: model.predict(
+        batch[..., np.newaxis], batch_size=batch_size, verbose=0)[:, 0]
+
+def default_model_path():
+    for model_name in DEFAULT_MODELS:
+        if (MODELS_DIR / model_name).exists():
+            return MODELS_DIR / model_name
+    return None
+
+# ===== OUTPUT =====
+
+class CsvResultWriter:
+    """Appends result rows to a CSV file, flushing after every batch."""
+
+    def __init__(self, path, resume):
+        self.path = Path(path)
+        exists = resume and self.path.exists() and self.path.stat().st_size > 0
+        if exists:
+            _prepare_csv_resume(self.path)
+            exists = self.path.stat().st_size > 0
+        self._file = open(self.path, 'a' if exists else 'w', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=COLUMNS)
+        if not exists:
+            self._writer.writeheader()
+
+    @staticmethod
+    def completed_files(path):
+        if not Path(path).exists():
+            return set()
+        with open(path, newline='') as f:
+            return {row['file'] for row in csv.DictReader(f) if row.get('file') and not row.get('error')}
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+class ParquetResultWriter:
+    """
+    Writes result rows as a directory of Parquet part files.
+
+    Parquet files are only readable once closed, so each part is closed after
+    `rows_per_part` rows; an interrupted run loses at most the open part.
+    """
+
+    def __init__(self, path, resume, rows_per_part=50_000):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("❌ Parquet output needs pyarrow (pip install pyarrow) - or use a .csv output")
+        self._pa, self._pq = pa, pq
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        if not resume:
+            for part in self.path.glob('part-*.parquet'):
+                part.unlink()
+        self._next_part = len(list(self.path.glob('part-*.parquet')))
+        self.rows_per_part = rows_per_part
+        self._schema = pa.schema([
+            ('file', pa.string()), ('window', pa.int32()), ('start_s', pa.float64()),
+            ('confidence', pa.float32()), ('predicted_class', pa.string()),
+            ('decode_ms', pa.float64()), ('featurize_ms', pa.float64()),
+            ('inference_ms', pa.float64()), ('error', pa.string())
+        ])
+        self._writer = None
+        self._part_rows = 0
+
+    @staticmethod
+    def completed_files(path):
+        parts = sorted(Path(path).glob('part-*.parquet'))
+        if not parts:
+            return set()
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+        completed = set()
+        for part in parts:
+            try:
+                table = pq.read_table(part, columns=['file', 'error'])
+            except Exception:
+                # Part left open by an interrupted run: its files are scored again
+                part.unlink()
+                continue
+            failed = pc.is_valid(table.column('error'))
+            if pc.any(failed).as_py():
+                # Failed files are scored again; drop their error rows so they are not reported twice
+                kept = pq.read_table(part).filter(pc.invert(failed))
+                tmp_path = part.with_suffix('.tmp')
+                pq.write_table(kept, tmp_path)
+                os.replace(tmp_path, part)
+                table = kept
+            completed.update(table.column('file').to_pylist())
+        return completed
+
+    def write(self, rows):
+        if not rows:
+            return
+        if self._writer is None:
+            part = self.path / f"part-{self._next_part:05d}.parquet"
+            self._writer = self._pq.ParquetWriter(part, self._schema)
+            self._next_part += 1
+        columns = {name: [row[name] for row in rows] for name in COLUMNS}
+        self._writer.write_table(self._pa.table(columns, schema=self._schema))
+        self._part_rows += len(rows)
+        if self._part_rows >= self.rows_per_part:
+            self.close()
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            self._part_rows = 0
+
+def _csv_records(f):
+    """(start offset, raw bytes, fields) of each complete record in a CSV opened in binary mode."""
+    start, record = f.tell(), b''
+    for line in iter(f.readline, b''):
+        record += line
+        # An odd number of quotes means a quoted field (e.g. a multi-line error) continues on the next line
+        if record.count(b'"') % 2 or not record.endswith(b'\n'):
+            continue
+        yield start, record, next(csv.reader(io.StringIO(record.decode('utf-8', errors='replace'), newline='')))
+        start, record = start + len(record), b''
+
+def _prepare_csv_resume(path):
+    """
+    Make a CSV left by an interrupted run safe to append to.
+
+    Rows reach the file through its buffer, so a run killed mid-batch can leave
+    a partial line and only some windows of the last file written. Files are
+    written contiguously, so only that last file can be incomplete: its rows
+    are dropped, along with any partial line, and it is scored again. Error
+    rows are dropped too, so files that failed (e.g. on a transient I/O or
+    decode error) are retried instead of being counted as done.
+    """
+    cut = 0             # End of the last row before the final file's rows
+    last_file = None
+    has_errors = False
+    with open(path, 'rb') as f:
+        for start, record, fields in _csv_records(f):
+            if start == 0:
+                cut = len(record)   # Header
+                continue
+            file = fields[0] if fields else None
+            if file != last_file:
+                cut, last_file = start, file
+            has_errors = has_errors or bool(fields[-1:] and fields[-1])
+        if not has_errors:
+            f.seek(0, os.SEEK_END)
+            if f.tell() != cut:
+                with open(path, 'rb+') as out:
+                    out.truncate(cut)
+            return
+
+        # Rewrite without the error rows (rare: only when earlier files failed)
+        f.seek(0)
+        tmp_path = Path(path).with_suffix('.tmp')
+        with open(tmp_path, 'wb') as out:
+            for start, record, fields in _csv_records(f):
+                if start >= cut:
+                    break
+                if start == 0 or not (fields[-1:] and fields[-1]):
+                    out.write(record)
+    os.replace(tmp_path, path)
+
+def open_writer(path, resume):
+    writer_class = ParquetResultWriter if Path(path).suffix == '.parquet' else CsvResultWriter
+    # Open first: the writer discards rows left incomplete by an interrupted run
+    writer = writer_class(path, resume)
+    completed = writer_class.completed_files(path) if resume else set()
+    return writer, completed
+
+# ===== SCORING LOOP =====
+
+def result_rows(item, confidences=None, inference_ms=0.0):
+    """Output rows for one featurized file (a single error row if it failed)."""
+    base = {'file': item['file'], 'decode_ms': item['decode_ms'], 'featurize_ms': item['featurize_ms']}
+    if item['error'] is not None:
+        return [dict(base, window=0, start_s=0.0, confidence=None, predicted_class=None,
+                     inference_ms=0.0, error=item['error'])]
+    return [
+        dict(base, window=i, start_s=start_s, confidence=float(confidence),
+             predicted_class=CLASS_NAMES[int(confidence > CLASSIFICATION_THRESHOLD)],
+             inference_ms=inference_ms, error=None)
+        for i, (start_s, confidence) in enumerate(zip(item['start_s'], confidences))
+    ]
+
+class BatchScorer:
+    """Collects featurized files into batches, runs inference and writes their rows."""
+
+    def __init__(self, predict, writer, batch_size):
+        self.predict = predict
+        self.writer = writer
+        self.batch_size = batch_size
+        self.pending = []
+        self.pending_windows = 0
+        self.files = 0
+        self.windows = 0
+        self.errors = 0
+        self.inference_s = 0.0
+
+    def add(self, item):
+        if item['error'] is not None:
+            self.errors += 1
+            self.files += 1
+            self.writer.write(result_rows(item))
+            return
+        # A file's windows always land in one batch and are written contiguously, so after a
+        # crash only the last file in the output can be incomplete (dropped on --resume)
+        if self.pending and self.pending_windows + len(item['spectrograms']) > self.batch_size:
+            self.flush()
+        self.pending.append(item)
+        self.pending_windows += len(item['spectrograms'])
+        if self.pending_windows >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        batch = np.concatenate([item['spectrograms'] for item in self.pending])
+        start = time.perf_counter()
+        confidences = np.asarray(self.predict(batch), dtype=np.float32)
+        elapsed = time.perf_counter() - start
+        self.inference_s += elapsed
+        per_window_ms = elapsed * 1000 / len(batch)
+
+        rows, offset = [], 0
+        for item in self.pending:
+            n = len(item['spectrograms'])
+            rows.extend(result_rows(item, confidences[offset:offset + n], per_window_ms))
+            offset += n
+        self.writer.write(rows)
+
+        self.files += len(self.pending)
+        self.windows += len(batch)
+        self.pending, self.pending_windows = [], 0
+
+def score_files(files, predict, writer, workers, batch_size, hop_s, features, profile, progress_every=500):
+    """Featurize `files` across a process pool and score them in batches; returns the BatchScorer."""
+    scorer = BatchScorer(predict, writer, batch_size)
+    # Bounded in-flight tasks keep memory flat on very large inputs
+    max_in_flight = workers * 4
+    started = time.perf_counter()
+    remaining = iter(files)
+
+    # spawn: forking a process that has TensorFlow/TFLite loaded can deadlock the children
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context('spawn')) as executor:
+        in_flight = set()
+        exhausted = False
+        while True:
+            while not exhausted and len(in_flight) < max_in_flight:
+                path = next(remaining, None)
+                if path is None:
+                    exhausted = True
+                    break
+                in_flight.add(executor.submit(featurize_file, path, hop_s, features, profile))
+            if not in_flight:
+                break
+
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                scorer.add(future.result())
+                total = scorer.files + len(scorer.pending)
+                if total % progress_every == 0:
+                    rate = total / (time.perf_counter() - started)
+                    print(f"   📈 {total}/{len(files)} files ({rate:.1f} files/s, {scorer.errors} errors)")
+        scorer.flush()
+    return scorer
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a directory or manifest of heart sound recordings")
+    parser.add_argument('inputs', nargs='+', help="Directories, manifests (.csv with a 'path' column, .txt) or files")
+    parser.add_argument('--output', required=True, help="Results file: .csv, or .parquet (a directory of parts)")
+    parser.add_argument('--model', default=None, help="TFLite or Keras model (default: first one found in models/)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Decode/featurize processes")
+    parser.add_argument('--batch-size', type=int, default=256, help="Windows per inference batch")
+    parser.add_argument('--window-hop', type=float, default=None,
+                        help=f"Score overlapping {AUDIO_DURATION:g}s windows this many seconds apart "
+                             "(default: one centered window per file, as the apps do)")
+    parser.add_argument('--features', choices=['numpy', 'librosa'], default='numpy',
+                        help="numpy: preallocated workspace (matches librosa to <0.01dB); librosa: utils.prepare_model_input")
+    parser.add_argument('--resume', action='store_true', help="Skip files already in --output and append")
+    parser.add_argument('--limit', type=int, default=None, help="Only score the first N files")
+    args = parser.parse_args()
+
+    print("📦 Offline Batch Scoring")
+    print("=" * 50)
+
+    model_path = Path(args.model) if args.model else default_model_path()
+    if model_path is None or not model_path.exists():
+        print("❌ No model found - pass --model")
+        sys.exit(1)
+    try:
+        model_name, predict = load_scoring_model(model_path, args.batch_size)
+    except Exception as e:
+        print(f"❌ Could not load {model_path.name}: {e}")
+        sys.exit(1)
+    print(f"✅ Model loaded: {model_name}")
+    try:
+        profile = profile_for_model(model_path)
+    except KeyError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"🎛️ Preprocessing profile: {profile}")
+
+    files = collect_files(args.inputs)
+    writer, completed = open_writer(args.output, args.resume)
+    if completed:
+        files = [f for f in files if f not in completed]
+        print(f"⏭️ Resuming: {len(completed)} files already scored")
+    if args.limit is not None:
+        files = files[:args.limit]
+    print(f"📋 {len(files)} files to score with {args.workers} workers, batches of {args.batch_size} windows")
+
+    started = time.perf_counter()
+    try:
+        scorer = score_files(files, predict, writer, args.workers, args.batch_size,
+                             args.window_hop, args.features, profile)
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - started
+
+    print("\n📊 Scoring Complete:")
+    print(f"   ✅ Files: {scorer.files - scorer.errors} scored, {scorer.errors} failed")
+    print(f"   🪟 Windows: {scorer.windows}")
+    if elapsed > 0:
+        print(f"   ⚡ Throughput: {scorer.files / elapsed:.1f} files/s "
+              f"(inference {scorer.inference_s:.1f}s of {elapsed:.1f}s)")
+    print(f"💾 Results: {args.output}")
+
+if __name__ == "__main__":
+    main()
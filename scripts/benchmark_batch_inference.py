@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Batched TFLite Inference Benchmark
+Measures throughput vs batch size for the standard and quantized TFLite models
+"""
+
+import sys
+import json
+import argparse
+import numpy as np
+from pathlib import Path
+
+# Add parent directory for imports
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from config import *
+from inference import TFLiteModel
+from benchmarking import time_callable
+
+MODELS_TO_TEST = [
+    ("Standard TFLite", MODELS_DIR / "heart_sound_mobile.tflite"),
+    ("Quantized TFLite", MODELS_DIR / "heart_sound_mobile_quantized.tflite")
+]
+
+def benchmark_model(model_path, batch_sizes, repeats, warmup):
+    """Benchmark one model across batch sizes against sequential batch-1 invokes."""
+    model = TFLiteModel(model_path, batch_buckets=batch_sizes)
+    input_shape = model.input_shape[1:]
+
+    results = []
+    for batch_size in batch_sizes:
+        batch = np.random.randn(batch_size, *input_shape).astype(np.float32)
+
+        batched = time_callable(lambda: model.predict_batch(batch), repeats, warmup)
+        sequential = time_callable(
+            lambda: [model.predict_batch(batch[i:i + 1]) for i in range(batch_size)],
+            repeats, warmup
+        )
+
+        batched_throughput = batch_size / (batched['mean_ms'] / 1000)
+        sequential_throughput = batch_size / (sequential['mean_ms'] / 1000)
+        results.append({
+            'batch_size': batch_size,
+            'batched': batched,
+            'sequential': sequential,
+            'batched_throughput_per_s': batched_throughput,
+            'sequential_throughput_per_s': sequential_throughput,
+            'speedup': batched_throughput / sequential_throughput
+        })
+
+        print(f"   batch {batch_size:>3}: {batched_throughput:8.1f} samples/s batched, "
+              f"{sequential_throughput:8.1f} samples/s sequential "
+              f"({batched_throughput / sequential_throughput:.2f}x), "
+              f"p95 {batched['p95_ms']:.2f}ms")
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batched TFLite inference")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--output', type=str, default=None, help="Optional JSON results path")
+    args = parser.parse_args()
+
+    print("⚡ Batched TFLite Inference Benchmark")
+    print("=" * 50)
+
+    report = {}
+    for model_name, model_path in MODELS_TO_TEST:
+        if not model_path.exists():
+            print(f"\n❌ {model_name}: {model_path} not found")
+            continue
+
+        print(f"\n🧠 {model_name} ({model_path.name})")
+        report[model_name] = benchmark_model(model_path, args.batch_sizes, args.repeats, args.warmup)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Results saved to: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Hot Path Benchmark: standard vs preallocated pipeline
+Runs a sustained multi-threaded loop of preprocess + inference requests in both
+pipeline modes and compares latency spread, per-request allocations and
+garbage-collector activity
+"""
+
+import gc
+import sys
+import json
+import time
+import argparse
+import threading
+import tracemalloc
+import numpy as np
+from pathlib import Path
+
+# Add parent directory for imports
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from config import *
+from audio_io import decode_audio
+from benchmarking import summarize_timings, synthetic_heart_wav
+from dsp import thread_workspace
+
+class GCCounter:
+    """gc callback counting collections per generation."""
+
+    def __init__(self):
+        self.collections = [0, 0, 0]
+
+    def __call__(self, phase, info):
+        if phase == 'start':
+            self.collections[info['generation']] += 1
+
+def load_pool(model_name, pool_size):
+    """Interpreter pool for the benchmark, or None to time preprocessing only."""
+    try:
+        from inference import InterpreterPool
+        return InterpreterPool(MODELS_DIR / model_name, size=pool_size)
+    except Exception as e:
+        print(f"⚠️ No TFLite model ({e}) - timing preprocessing into a preallocated array only")
+        return None
+
+def request_functions(pool, audio):
+    """Zero-argument callables for one request in each pipeline mode (safe to call from many threads)."""
+    from utils import prepare_model_input
+
+    def standard():
+        model_input, _ = prepare_model_input(audio, SAMPLE_RATE, AUDIO_DURATION, N_MELS, N_FFT, HOP_LENGTH)
+        if pool is not None:
+            pool.predict_batch(model_input)
+
+    targets = threading.local()
+
+    def preallocated():
+        workspace = thread_workspace(SAMPLE_RATE, AUDIO_DURATION, N_MELS, N_FFT, HOP_LENGTH)
+        if pool is not None:
+            pool.predict_into(lambda model_input: workspace.prepare(audio, model_input))
+            return
+        # Stand-in for the input tensor: one array per thread, allocated once
+        target = getattr(targets, 'array', None)
+        if target is None:
+            target = targets.array = np.empty(workspace.shape, dtype=np.float32)
+        workspace.prepare(audio, target)
+
+    return {'standard': standard, 'preallocated': preallocated}
+
+def traced_bytes(fn, repeats=5):
+    """Mean bytes allocated (tracemalloc peak) by one call, after an untraced warm-up call."""
+    fn()
+    peaks = []
+    for _ in range(repeats):
+        tracemalloc.start()
+        fn()
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return float(np.mean(peaks))
+
+def run_sustained(fn, threads, requests_per_thread, warmup):
+    """Run fn in `threads` closed-loop workers; returns latency and GC statistics."""
+    latencies = [[] for _ in range(threads)]
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(index):
+        for _ in range(warmup):
+            fn()
+        barrier.wait()
+        timings = latencies[index]
+        for _ in range(requests_per_thread):
+            start = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - start) * 1000)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+
+    counter = GCCounter()
+    gc.collect()
+    barrier.wait()
+    gc.callbacks.append(counter)
+    started = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    gc.callbacks.remove(counter)
+
+    all_timings = [t for timings in latencies for t in timings]
+    summary = summarize_timings(all_timings)
+    summary['std_ms'] = float(np.std(all_timings))
+    summary['throughput_rps'] = len(all_timings) / elapsed
+    summary['gc_collections'] = counter.collections
+    summary['gc_per_1000_requests'] = sum(counter.collections) * 1000 / len(all_timings)
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the standard and preallocated hot paths")
+    parser.add_argument('--durations', type=float, nargs='+', default=[5.0, 20.0, 60.0],
+                        help="Recording lengths in seconds")
+    parser.add_argument('--threads', type=int, default=INTERPRETER_POOL_SIZE)
+    parser.add_argument('--requests', type=int, default=200, help="Timed requests per thread")
+    parser.add_argument('--warmup', type=int, default=5, help="Untimed requests per thread")
+    parser.add_argument('--model', default="heart_sound_mobile.tflite", help="TFLite model in models/")
+    parser.add_argument('--output', type=str, default=None, help="Write results JSON here")
+    args = parser.parse_args()
+
+    print("♻️ Hot Path Benchmark: standard vs preallocated")
+    print("=" * 50)
+    pool = load_pool(args.model, args.threads)
+
+    results = {}
+    for duration in args.durations:
+        # Decoding is identical in both modes, so it stays outside the timed loop
+        audio, _ = decode_audio(synthetic_heart_wav(duration, SAMPLE_RATE, "abnormal"), SAMPLE_RATE)
+        print(f"\n🎵 {duration:g}s recording, {args.threads} threads x {args.requests} requests")
+
+        for mode, fn in request_functions(pool, audio).items():
+            summary = run_sustained(fn, args.threads, args.requests, args.warmup)
+            summary['allocated_kb_per_request'] = traced_bytes(fn) / 1024
+            results[f"{mode}/{duration:g}s"] = summary
+            print(f"   {mode:<13} p50 {summary['p50_ms']:7.2f}ms  p99 {summary['p99_ms']:7.2f}ms  "
+                  f"std {summary['std_ms']:6.2f}ms  {summary['throughput_rps']:7.1f} req/s  "
+                  f"alloc {summary['allocated_kb_per_request']:8.1f}KB  "
+                  f"gc/1k req {summary['gc_per_1000_requests']:6.1f}")
+
+    if args.output:
+        report = {
+            'settings': {'durations': args.durations, 'threads': args.threads,
+                         'requests': args.requests, 'model': args.model if pool is not None else None},
+            'results': results
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Results saved to: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Inference Service Benchmark
+Compares the micro-batched HTTP service against the Streamlit request path
+under the same local concurrent load
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import http.client
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+# Add parent directory for imports
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from config import *
+from utils import prepare_model_input
+from audio_io import decode_audio
+from benchmarking import summarize_timings, synthetic_heart_wav
+from inference_server import load_service_model
+
+def build_corpus(size):
+    """Synthetic WAV uploads alternating between normal and abnormal."""
+    labels = ["normal", "abnormal"]
+    return [synthetic_heart_wav(label=labels[i % 2], seed=i) for i in range(size)]
+
+def run_load(request_fn, corpus, concurrency, total_requests):
+    """Fire total_requests through request_fn with a fixed number of concurrent clients."""
+    def timed_request(i):
+        start = time.perf_counter()
+        request_fn(corpus[i % len(corpus)])
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(timed_request, range(total_requests)))
+    elapsed = time.perf_counter() - start
+
+    result = summarize_timings(latencies)
+    result['throughput_per_s'] = total_requests / elapsed
+    return result
+
+def streamlit_path_request(model):
+    """Replicates what one Streamlit session does per upload."""
+    def request(data):
+        audio, sr = decode_audio(data, SAMPLE_RATE)
+        model_input, _ = prepare_model_input(
+            audio, sr, AUDIO_DURATION, N_MELS, N_FFT, HOP_LENGTH
+        )
+        model.predict_batch(model_input)
+    return request
+
+def service_request(host, port):
+    def request(data):
+        conn = http.client.HTTPConnection(host, port, timeout=60)
+        try:
+            conn.request('POST', '/predict', body=data,
+                         headers={'Content-Type': 'application/octet-stream'})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                raise RuntimeError(f"Service returned {response.status}")
+        finally:
+            conn.close()
+    return request
+
+def wait_for_service(host, port, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=2)
+            conn.request('GET', '/healthz')
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            time.sleep(0.5)
+    return False
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the inference service vs the Streamlit path")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 32])
+    parser.add_argument('--requests', type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument('--corpus-size', type=int, default=16)
+    parser.add_argument('--port', type=int, default=SERVICE_PORT + 1)
+    parser.add_argument('--max-wait-ms', type=float, default=MICROBATCH_MAX_WAIT_MS)
+    parser.add_argument('--output', type=str, default=None, help="Optional JSON results path")
+    args = parser.parse_args()
+
+    print("🌐 Inference Service vs Streamlit Path Benchmark")
+    print("=" * 50)
+
+    corpus = build_corpus(args.corpus_size)
+    host = '127.0.0.1'
+
+    print("🧠 Loading model for the Streamlit path...")
+    streamlit_request = streamlit_path_request(load_service_model())
+
+    print(f"🚀 Starting inference service on port {args.port}...")
+    server = subprocess.Popen(
+        [sys.executable, str(project_root / 'inference_server.py'),
+         '--host', host, '--port', str(args.port), '--max-wait-ms', str(args.max_wait_ms)],
+        cwd=str(project_root), stdout=subprocess.DEVNULL
+    )
+
+    report = {'streamlit_path': {}, 'service': {}}
+    try:
+        if not wait_for_service(host, args.port):
+            print("❌ Service did not become healthy")
+            return
+
+        for concurrency in args.concurrency:
+            print(f"\n👥 Concurrency {concurrency}")
+            for name, request_fn in [('streamlit_path', streamlit_request),
+                                     ('service', service_request(host, args.port))]:
+                result = run_load(request_fn, corpus, concurrency, args.requests)
+                report[name][concurrency] = result
+                print(f"   {name:<15} {result['throughput_per_s']:7.1f} req/s, "
+                      f"p50 {result['p50_ms']:7.1f}ms, p95 {result['p95_ms']:7.1f}ms")
+    finally:
+        server.terminate()
+        server.wait()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Results saved to: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+End-to-End Pipeline Benchmark
+Times each stage (decode, resample, trim/normalize, spectrogram, inference,
+rendering) per backend and input length, writes JSON, and fails when a stage
+regresses beyond a stored baseline
+"""
+
+import sys
+import json
+import argparse
+import numpy as np
+from pathlib import Path
+from datetime import datetime
+
+# Add parent directory for imports
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from config import *
+from audio_io import decode_audio, resample_linear
+from autotune import host_fingerprint
+from benchmarking import synthetic_heart_wav, time_callable
+from dsp import mel_spectrogram, preprocess_audio_simple, simple_spectrogram
+from rendering import encode_png, render_spectrogram, render_waveform
+
+def optional_librosa():
+    try:
+        import librosa
+        return librosa
+    except ImportError:
+        print("⚠️ librosa not installed - skipping librosa backends")
+        return None
+
+def resample_backends(librosa):
+    backends = {'linear': resample_linear}
+    if librosa is not None:
+        backends['librosa'] = lambda audio, orig_sr, target_sr: librosa.resample(
+            audio, orig_sr=orig_sr, target_sr=target_sr)
+    return backends
+
+def preprocess_backends(librosa):
+    backends = {'numpy-simple': preprocess_audio_simple}
+    if librosa is not None:
+        from utils import preprocess_audio
+        backends['librosa'] = preprocess_audio
+    return backends
+
+def spectrogram_backends(librosa):
+    backends = {'numpy-simple': simple_spectrogram, 'numpy-mel': mel_spectrogram}
+    if librosa is not None:
+        from utils import audio_to_melspectrogram
+        backends['librosa'] = audio_to_melspectrogram
+    return backends
+
+def inference_backends():
+    """Batch-1 predict functions for every model format that loads on this host."""
+    from inference import TFLiteModel
+
+    backends = {}
+    for name, model_file in [('tflite', "heart_sound_mobile.tflite"),
+                             ('tflite-quantized', "heart_sound_mobile_quantized.tflite")]:
+        try:
+            model = TFLiteModel(MODELS_DIR / model_file, batch_buckets=(1,))
+            backends[name] = (model.predict_batch, model.input_shape)
+        except Exception as e:
+            print(f"⚠️ Skipping {name}: {e}")
+
+    try:
+        import tensorflow as tf
+        model = tf.keras.models.load_model(MODELS_DIR / "gpu_optimized_cnn_final.keras", compile=False)
+        backends['keras'] = (lambda x: model.predict(x, verbose=0), model.input_shape)
+    except Exception as e:
+        print(f"⚠️ Skipping keras: {e}")
+    return backends
+
+def run_benchmarks(durations, source_sr, repeats, warmup):
+    """Time every stage/backend combination; returns {stage/backend[/length]: summary}."""
+    librosa = optional_librosa()
+    results = {}
+
+    def bench(key, fn):
+        results[key] = time_callable(fn, repeats=repeats, warmup=warmup)
+        print(f"   {key:<40} p50 {results[key]['p50_ms']:8.2f}ms  "
+              f"p95 {results[key]['p95_ms']:8.2f}ms  p99 {results[key]['p99_ms']:8.2f}ms")
+
+    print("\n🎧 Decode / resample / trim+normalize")
+    for duration in durations:
+        data = synthetic_heart_wav(duration=duration, sr=source_sr, label="abnormal")
+        length = f"{duration:g}s"
+
+        bench(f"decode/native/{length}", lambda: decode_audio(data, source_sr))
+        audio, _ = decode_audio(data, source_sr)
+
+        for name, resample in resample_backends(librosa).items():
+            bench(f"resample/{name}/{length}", lambda: resample(audio, source_sr, SAMPLE_RATE))
+        audio_8k = resample_linear(audio, source_sr, SAMPLE_RATE)
+
+        for name, preprocess in preprocess_backends(librosa).items():
+            bench(f"trim_normalize/{name}/{length}",
+                  lambda: preprocess(audio_8k, SAMPLE_RATE, AUDIO_DURATION))
+
+    # Later stages always see AUDIO_DURATION seconds of preprocessed audio
+    clip = preprocess_audio_simple(
+        decode_audio(synthetic_heart_wav(AUDIO_DURATION, SAMPLE_RATE, "abnormal"), SAMPLE_RATE)[0],
+        SAMPLE_RATE, AUDIO_DURATION
+    )
+
+    print("\n🎵 Spectrogram")
+    spectrograms = {}
+    for name, spectrogram in spectrogram_backends(librosa).items():
+        bench(f"spectrogram/{name}", lambda: spectrogram(clip, SAMPLE_RATE, N_MELS, N_FFT, HOP_LENGTH))
+        spectrograms[name] = spectrogram(clip, SAMPLE_RATE, N_MELS, N_FFT, HOP_LENGTH)
+
+    print("\n🧠 Inference (batch 1)")
+    for name, (predict, input_shape) in inference_backends().items():
+        model_input = np.random.default_rng(0).uniform(
+            -80, 0, (1,) + tuple(input_shape[1:])).astype(np.float32)
+        bench(f"inference/{name}", lambda: predict(model_input))
+
+    print("\n🖼️ Rendering (uncached)")
+    bench("rendering/waveform", lambda: encode_png(render_waveform(clip)))
+    spectrogram = spectrograms.get('librosa', spectrograms['numpy-simple'])
+    bench("rendering/spectrogram", lambda: encode_png(render_spectrogram(spectrogram)))
+
+    return results
+
+def check_regressions(results, baseline, stat, tolerance, min_delta_ms):
+    """Stages slower than baseline by more than `tolerance` (relative) and `min_delta_ms` (absolute)."""
+    regressions = []
+    for key, current in results.items():
+        base = baseline.get('results', {}).get(key)
+        if base is None:
+            continue
+        limit = base[stat] * (1 + tolerance)
+        if current[stat] > limit and current[stat] - base[stat] > min_delta_ms:
+            regressions.append({'stage': key, 'baseline_ms': base[stat], 'current_ms': current[stat],
+                                'ratio': current[stat] / base[stat] if base[stat] else float('inf')})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark each stage of the analysis pipeline")
+    parser.add_argument('--durations', type=float, nargs='+', default=[2.0, 5.0, 10.0, 30.0],
+                        help="Input lengths in seconds for the decode/resample/trim stages")
+    parser.add_argument('--source-sr', type=int, default=44100, help="Sample rate of the benchmark uploads")
+    parser.add_argument('--repeats', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--output', type=str, default=None, help="Write results JSON here")
+    parser.add_argument('--baseline', type=str, default=None, help="Baseline JSON to compare against")
+    parser.add_argument('--update-baseline', action='store_true', help="Write these results to --baseline")
+    parser.add_argument('--stat', default='p50_ms', choices=['p50_ms', 'p95_ms', 'p99_ms', 'mean_ms'])
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed relative slowdown")
+    parser.add_argument('--min-delta-ms', type=float, default=0.5,
+                        help="Ignore slowdowns smaller than this (timer noise)")
+    args = parser.parse_args()
+
+    print("🏁 Pipeline Stage Benchmark")
+    print("=" * 50)
+
+    report = {
+        'host': host_fingerprint(),
+        'timestamp': datetime.now().isoformat(),
+        'settings': {'durations': args.durations, 'source_sr': args.source_sr,
+                     'repeats': args.repeats, 'warmup': args.warmup},
+        'results': run_benchmarks(args.durations, args.source_sr, args.repeats, args.warmup)
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Results saved to: {args.output}")
+
+    if not args.baseline:
+        return
+
+    baseline_path = Path(args.baseline)
+    if args.update_baseline:
+        with open(baseline_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📌 Baseline updated: {baseline_path}")
+        return
+
+    if not baseline_path.exists():
+        print(f"❌ Baseline not found: {baseline_path} (create it with --update-baseline)")
+        sys.exit(1)
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+    if baseline.get('host') != report['host']:
+        print("⚠️ Baseline was recorded on a different host; comparisons may not be meaningful")
+
+    regressions = check_regressions(report['results'], baseline, args.stat,
+                                    args.tolerance, args.min_delta_ms)
+    if regressions:
+        print(f"\n❌ {len(regressions)} stage(s) regressed ({args.stat}, tolerance {args.tolerance:.0%}):")
+        for r in regressions:
+            print(f"   {r['stage']:<40} {r['baseline_ms']:8.2f}ms -> {r['current_ms']:8.2f}ms "
+                  f"({r['ratio']:.2f}x)")
+        sys.exit(1)
+    print(f"\n✅ No stage regressed beyond {args.tolerance:.0%} of baseline ({args.stat})")
+
+if __name__ == "__main__":
+    main()
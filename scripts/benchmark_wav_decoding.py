@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+WAV Decoding Benchmark
+Compares the native NumPy WAV decoder against soundfile and librosa
+across sample formats and channel counts
+"""
+
+import io
+import sys
+import json
+import struct
+import argparse
+import numpy as np
+from pathlib import Path
+
+# Add parent directory for imports
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from audio_io import read_wav, WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT, WAVE_FORMAT_EXTENSIBLE
+from benchmarking import time_callable
+
+# name -> (format tag, bytes per sample)
+SAMPLE_FORMATS = {
+    'pcm_u8': (WAVE_FORMAT_PCM, 1),
+    'pcm_16': (WAVE_FORMAT_PCM, 2),
+    'pcm_24': (WAVE_FORMAT_PCM, 3),
+    'pcm_32': (WAVE_FORMAT_PCM, 4),
+    'float_32': (WAVE_FORMAT_IEEE_FLOAT, 4),
+    'float_64': (WAVE_FORMAT_IEEE_FLOAT, 8),
+}
+
+def encode_wav(audio, sr, sample_format, extensible=False):
+    """
+    Encode a (frames, channels) float array in [-1, 1] as WAV bytes.
+
+    Written by hand so every format can be generated without soundfile.
+    """
+    format_tag, width = SAMPLE_FORMATS[sample_format]
+    channels = audio.shape[1]
+
+    if format_tag == WAVE_FORMAT_IEEE_FLOAT:
+        data = audio.astype(f'<f{width}').tobytes()
+    elif width == 1:
+        data = np.clip(np.round(audio * 128 + 128), 0, 255).astype(np.uint8).tobytes()
+    else:
+        full_scale = 2 ** (8 * width - 1)
+        ints = np.clip(np.round(audio * full_scale), -full_scale, full_scale - 1).astype('<i8')
+        # Keep the low `width` bytes of each little-endian int64
+        data = ints.view(np.uint8).reshape(-1, 8)[:, :width].tobytes()
+
+    block_align = channels * width
+    fmt = struct.pack('<HHIIHH', WAVE_FORMAT_EXTENSIBLE if extensible else format_tag,
+                      channels, sr, sr * block_align, block_align, 8 * width)
+    if extensible:
+        guid_tail = b'\x00\x00\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71'
+        fmt += struct.pack('<HHI', 22, 8 * width, 0) + struct.pack('<H', format_tag) + guid_tail
+
+    chunks = b'fmt ' + struct.pack('<I', len(fmt)) + fmt
+    chunks += b'data' + struct.pack('<I', len(data)) + data + (b'\0' if len(data) & 1 else b'')
+    return b'RIFF' + struct.pack('<I', 4 + len(chunks)) + b'WAVE' + chunks
+
+def available_decoders():
+    """Decoders to compare; each takes WAV bytes and returns mono float32 audio."""
+    decoders = {'native': lambda data: read_wav(data)[0]}
+    try:
+        import soundfile as sf
+        decoders['soundfile'] = lambda data: _downmix(sf.read(io.BytesIO(data), dtype='float32')[0])
+    except ImportError:
+        print("⚠️ soundfile not installed - skipping")
+    try:
+        import librosa
+        decoders['librosa'] = lambda data: librosa.load(io.BytesIO(data), sr=None, mono=True)[0]
+    except ImportError:
+        print("⚠️ librosa not installed - skipping")
+    return decoders
+
+def _downmix(audio):
+    return audio if audio.ndim == 1 else audio.mean(axis=1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark WAV decoders")
+    parser.add_argument('--duration', type=float, default=60.0, help="Seconds of audio per file")
+    parser.add_argument('--sample-rate', type=int, default=44100)
+    parser.add_argument('--channels', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--output', type=str, default=None, help="Optional JSON results path")
+    args = parser.parse_args()
+
+    print("🎧 WAV Decoding Benchmark")
+    print("=" * 50)
+
+    decoders = available_decoders()
+    rng = np.random.default_rng(0)
+    n_frames = int(args.duration * args.sample_rate)
+    report = []
+
+    for channels in args.channels:
+        audio = (0.5 * rng.uniform(-1, 1, (n_frames, channels))).astype(np.float64)
+        reference = audio.mean(axis=1)
+
+        for sample_format in SAMPLE_FORMATS:
+            for extensible in (False, True):
+                data = encode_wav(audio, args.sample_rate, sample_format, extensible)
+                label = f"{sample_format}{' (ext)' if extensible else ''} x{channels}"
+                size_mb = len(data) / (1024 * 1024)
+
+                for name, decode in decoders.items():
+                    try:
+                        decoded = decode(data)
+                    except Exception as e:
+                        print(f"   {label:<22} {name:<10} ❌ {e}")
+                        report.append({'format': sample_format, 'extensible': extensible,
+                                       'channels': channels, 'decoder': name, 'error': str(e)})
+                        continue
+
+                    max_error = float(np.max(np.abs(decoded - reference)))
+                    timing = time_callable(lambda: decode(data), repeats=args.repeats, warmup=1)
+                    throughput = size_mb / (timing['p50_ms'] / 1000)
+                    print(f"   {label:<22} {name:<10} {timing['p50_ms']:8.2f}ms "
+                          f"{throughput:8.1f} MB/s  max err {max_error:.1e}")
+                    report.append({'format': sample_format, 'extensible': extensible,
+                                   'channels': channels, 'decoder': name, 'size_mb': size_mb,
+                                   'max_abs_error': max_error, 'throughput_mb_s': throughput,
+                                   **timing})
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Results saved to: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Demo Bundle Builder
+Packages a few demo recordings with their spectrograms, predictions and
+rendered plots into models/demo_bundle.npz for the Streamlit app
+"""
+
+import sys
+import argparse
+import numpy as np
+from pathlib import Path
+
+# Add parent directory for imports
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from config import *
+from utils import get_physionet_labels
+from audio_io import decode_audio
+from benchmarking import synthetic_heart_wav
+from rendering import spectrogram_png, waveform_png
+from result_cache import model_version, preprocessing_version
+from demo_bundle import save_demo_bundle
+from profiles import STANDARD_PROFILE, profile_for_served_model
+from inference_server import load_service_model
+
+LABELS = ["normal", "abnormal"]
+
+def physionet_samples(physionet_dir, per_label, rng):
+    """Real recordings from the PhysioNet 2016 training sets, if downloaded."""
+    if not Path(physionet_dir).exists():
+        return []
+    labels_df = get_physionet_labels(physionet_dir)
+    if labels_df.empty:
+        return []
+
+    samples = []
+    for label in LABELS:
+        rows = labels_df[labels_df['binary_label'] == label]
+        picks = rng.choice(len(rows), size=min(per_label, len(rows)), replace=False)
+        for _, row in rows.iloc[picks].iterrows():
+            audio, sr = decode_audio(Path(row['file_path']).read_bytes(), SAMPLE_RATE)
+            samples.append({'id': f"real-{row['file_id']}", 'label': label, 'kind': 'real',
+                             'source': f"{row['file_id']}.wav", 'audio': audio, 'sr': sr})
+    return samples
+
+def spectrogram_samples(spectrograms_dir, per_label, rng):
+    """
+    Preprocessed spectrograms when the raw recordings are not available.
+
+    The spectrogram itself is the model input; Griffin-Lim inversion runs here,
+    once, only to get a waveform to display.
+    """
+    import librosa
+
+    samples = []
+    for label in LABELS:
+        spec_files = sorted((Path(spectrograms_dir) / label).glob("*.npy"))
+        if not spec_files:
+            continue
+        picks = rng.choice(len(spec_files), size=min(per_label, len(spec_files)), replace=False)
+        for pick in picks:
+            spec_file = spec_files[pick]
+            spectrogram = np.load(spec_file).astype(np.float32)
+            audio = librosa.feature.inverse.mel_to_audio(
+                librosa.db_to_power(spectrogram), sr=SAMPLE_RATE, n_fft=N_FFT, hop_length=HOP_LENGTH
+            )
+            samples.append({'id': f"real-{spec_file.stem}", 'label': label, 'kind': 'real',
+                            'source': spec_file.name, 'audio': audio, 'sr': SAMPLE_RATE,
+                            'spectrogram': spectrogram})
+    return samples
+
+def synthetic_samples(per_label):
+    """The app's synthetic demo tones, with fixed seeds."""
+    samples = []
+    for label in LABELS:
+        for seed in range(per_label):
+            audio, sr = decode_audio(synthetic_heart_wav(AUDIO_DURATION, SAMPLE_RATE, label, seed),
+                                     SAMPLE_RATE)
+            samples.append({'id': f"synthetic-{label}-{seed}", 'label': label, 'kind': 'synthetic',
+                            'source': f"synthetic (seed {seed})", 'audio': audio, 'sr': sr})
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the precomputed demo bundle")
+    parser.add_argument('--per-label', type=int, default=3, help="Real recordings per label")
+    parser.add_argument('--synthetic-per-label', type=int, default=2)
+    parser.add_argument('--physionet-dir', type=str, default=str(PHYSIONET_DIR))
+    parser.add_argument('--spectrograms-dir', type=str, default=str(SPECTROGRAMS_DIR))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', type=str, default=str(DEMO_BUNDLE_PATH))
+    args = parser.parse_args()
+
+    print("📦 Demo Bundle Builder")
+    print("=" * 50)
+
+    rng = np.random.default_rng(args.seed)
+    samples = physionet_samples(args.physionet_dir, args.per_label, rng)
+    if samples:
+        print(f"🎵 {len(samples)} PhysioNet recordings")
+    else:
+        samples = spectrogram_samples(args.spectrograms_dir, args.per_label, rng)
+        print(f"🎵 {len(samples)} spectrograms (no raw recordings found)")
+    samples += synthetic_samples(args.synthetic_per_label)
+
+    print("🧠 Loading model...")
+    model = load_service_model()
+    profile = profile_for_served_model(model)
+    print(f"🎛️ Preprocessing profile: {profile}")
+
+    for sample in samples:
+        spectrogram = sample.pop('spectrogram', None)
+        # Cached spectrograms are standard-profile inputs; other profiles start from the reconstructed audio
+        if spectrogram is None or profile.key != STANDARD_PROFILE.key:
+            # Same as the app's upload path: the processed clip is stored and plotted, not the full recording
+            sample['model_input'], sample['audio'] = profile.prepare_model_input(sample['audio'], sample['sr'])
+            sample['sr'] = profile.sample_rate
+            spectrogram = sample['model_input'][0, ..., 0]
+        else:
+            sample['model_input'] = spectrogram[np.newaxis, :, :, np.newaxis]
+        audio = sample['audio']
+
+        confidence = float(model.predict_batch(sample['model_input'])[0])
+        sample['confidence'] = confidence
+        sample['predicted_class'] = "Abnormal" if confidence > CLASSIFICATION_THRESHOLD else "Normal"
+        sample['plots'] = {'waveform': waveform_png(audio), 'spectrogram': spectrogram_png(spectrogram)}
+        print(f"   {sample['id']:<28} {sample['label']:<9} -> "
+              f"{sample['predicted_class']} ({confidence:.1%})")
+
+    save_demo_bundle(samples, args.output, model_version(model), preprocessing_version("librosa", profile))
+    size_mb = Path(args.output).stat().st_size / (1024 * 1024)
+    print(f"\n💾 Bundle saved to: {args.output} ({size_mb:.2f} MB)")
+
+if __name__ == "__main__":
+    main()
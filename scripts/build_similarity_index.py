@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Similarity Index Builder
+Embeds every labelled PhysioNet training recording with the CNN's penultimate
+(GlobalAveragePooling2D) layer once, builds the IVF-PQ index used for similar-case
+retrieval and saves it next to the model as <model stem>_similarity.npz.
+Also reports recall against exact search and lookup latency
+"""
+
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from datetime import datetime
+from pathlib import Path
+
+# Add parent directory for imports
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from config import *
+from audio_io import decode_audio
+from benchmarking import summarize_timings
+from profiles import STANDARD_PROFILE, bind_profile, profile_for_model
+from similarity_index import EmbeddingModel, SimilarityIndex, _normalize, model_file_hash, similarity_index_path
+from utils import get_physionet_labels
+
+# Same preference order as the Streamlit app, so the app finds an index for the model it serves
+DEFAULT_MODELS = [
+    "heart_sound_mobile_quantized.tflite",
+    "heart_sound_mobile.tflite",
+    "gpu_optimized_cnn_final.keras"
+]
+
+def training_recordings(physionet_dir, dataset_csv, split, limit):
+    """PhysioNet label rows, restricted to one split of the processed dataset when it exists."""
+    labels_df = get_physionet_labels(physionet_dir)
+    if labels_df.empty:
+        return labels_df
+
+    if dataset_csv and Path(dataset_csv).exists() and split:
+        import pandas as pd
+        dataset = pd.read_csv(dataset_csv)
+        if 'split' in dataset.columns:
+            keep = set(dataset.loc[dataset['split'] == split, 'file_id'])
+            labels_df = labels_df[labels_df['file_id'].isin(keep)]
+    if limit:
+        labels_df = labels_df.sample(min(limit, len(labels_df)), random_state=0)
+    return labels_df.reset_index(drop=True)
+
+def spectrogram_for(row, profile, out):
+    """Fill `out` from the spectrogram cache (standard profile only), or decode and featurize the recording."""
+    cached = SPECTROGRAMS_DIR / row['binary_label'] / f"{row['file_id']}.npy"
+    if profile.key == STANDARD_PROFILE.key and cached.exists():
+        spectrogram = np.load(cached)
+        if spectrogram.shape == out.shape:
+            out[...] = spectrogram
+            return
+    audio, _ = decode_audio(Path(row['file_path']).read_bytes(), profile.sample_rate)
+    profile.workspace().prepare(audio, out)
+
+def embed_recordings(embedder, labels_df, batch_size, profile):
+    """(N, dim) embeddings for every row, featurized with the model's profile and embedded one batch at a time."""
+    workspace = profile.workspace()
+    batch = np.empty((batch_size,) + workspace.shape, dtype=np.float32)
+    embeddings = np.empty((len(labels_df), embedder.dim), dtype=np.float32)
+
+    rows = list(labels_df.iterrows())
+    for start in range(0, len(rows), batch_size):
+        chunk = rows[start:start + batch_size]
+        for i, (_, row) in enumerate(chunk):
+            spectrogram_for(row, profile, batch[i])
+        embeddings[start:start + len(chunk)] = embedder.embed_batch(batch[:len(chunk)])
+        if (start // batch_size) % 10 == 0:
+            print(f"   {start + len(chunk)}/{len(rows)} recordings embedded")
+    return embeddings
+
+def evaluate(index, embeddings, labels, queries, k, n_probe, seed=0):
+    """Recall@k against exact cosine search, label agreement and lookup latency (self-matches excluded)."""
+    rng = np.random.default_rng(seed)
+    normalized = _normalize(embeddings)
+    picks = rng.choice(len(embeddings), size=min(queries, len(embeddings)), replace=False)
+
+    recalls, agreement, ann_ms, exact_ms = [], [], [], []
+    for query in picks:
+        start = time.perf_counter()
+        positions, _ = index.search_ids(embeddings[query], k + 1, n_probe)
+        ann_ms.append((time.perf_counter() - start) * 1000)
+        found = [i for i in index.ids[positions] if i != query][:k]
+
+        start = time.perf_counter()
+        similarity = normalized @ normalized[query]
+        similarity[query] = -np.inf
+        exact = np.argpartition(-similarity, k)[:k]
+        exact_ms.append((time.perf_counter() - start) * 1000)
+
+        recalls.append(len(set(found) & set(exact)) / k)
+        agreement.append(float(np.mean(labels[found] == labels[query])) if found else 0.0)
+
+    return {
+        'queries': int(len(picks)),
+        'k': k,
+        'n_probe': n_probe,
+        f'recall_at_{k}': float(np.mean(recalls)),
+        'label_agreement': float(np.mean(agreement)),
+        'ann_latency': summarize_timings(ann_ms),
+        'exact_latency': summarize_timings(exact_ms)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the similar-case retrieval index")
+    parser.add_argument('--physionet-dir', type=str, default=str(PHYSIONET_DIR))
+    parser.add_argument('--dataset', type=str, default=str(DATA_DIR / "full_processed_dataset.csv"),
+                        help="Processed-dataset CSV; when present only --split recordings are indexed")
+    parser.add_argument('--split', type=str, default='train')
+    parser.add_argument('--model', type=str, default=None, help="CNN (.tflite or .keras); default as the app")
+    parser.add_argument('--layer-name', type=str, default=None, help="Embedding layer / tensor name")
+    parser.add_argument('--limit', type=int, default=None, help="Index a random subset of this size")
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--n-lists', type=int, default=None, help="Inverted lists (default ~sqrt(N))")
+    parser.add_argument('--n-subvectors', type=int, default=32, help="PQ bytes per recording")
+    parser.add_argument('--n-probe', type=int, default=SIMILARITY_N_PROBE)
+    parser.add_argument('--k', type=int, default=SIMILARITY_TOP_K)
+    parser.add_argument('--eval-queries', type=int, default=200)
+    parser.add_argument('--output', type=str, default=None, help="Index path (default next to the model)")
+    parser.add_argument('--report', type=str, default=None, help="Write build report JSON here")
+    args = parser.parse_args()
+
+    print("🔎 Similarity Index Builder")
+    print("=" * 50)
+
+    model_path = Path(args.model) if args.model else next(
+        (MODELS_DIR / name for name in DEFAULT_MODELS if (MODELS_DIR / name).exists()), None)
+    if model_path is None or not model_path.exists():
+        print("❌ No model found - pass --model")
+        sys.exit(1)
+
+    if not Path(args.physionet_dir).exists():
+        print(f"❌ PhysioNet data not found at {args.physionet_dir}")
+        sys.exit(1)
+    labels_df = training_recordings(args.physionet_dir, args.dataset, args.split, args.limit)
+    if labels_df.empty:
+        print("❌ No labelled recordings to index")
+        sys.exit(1)
+    labels = (labels_df['binary_label'] == 'abnormal').astype(int).values
+    print(f"📋 {len(labels)} recordings ({labels.sum()} abnormal)")
+
+    try:
+        embedder = EmbeddingModel(model_path, args.layer_name, args.batch_size)
+    except Exception as e:
+        print(f"❌ Could not load embedding model: {e}")
+        sys.exit(1)
+    print(f"✅ {embedder.name}: {embedder.dim}-d embeddings from {embedder.layer_name}")
+    profile = profile_for_model(model_path)
+    print(f"🎛️ Preprocessing profile: {profile}")
+
+    start = time.perf_counter()
+    embeddings = embed_recordings(embedder, labels_df, args.batch_size, profile)
+    embed_s = time.perf_counter() - start
+    print(f"⏱️ Embedded in {embed_s:.1f}s ({len(labels) / embed_s:.0f} recordings/s)")
+
+    metadata = {
+        'model': embedder.name,
+        'model_sha1': model_file_hash(model_path),
+        'layer_name': embedder.layer_name,
+        'split': args.split,
+        'built_at': datetime.now().isoformat()
+    }
+    bind_profile(metadata, profile)
+    start = time.perf_counter()
+    sources = [f"{row['subset']}/{row['file_id']}.wav" for _, row in labels_df.iterrows()]
+    index = SimilarityIndex.build(embeddings, labels, labels_df['file_id'].values, sources,
+                                  n_lists=args.n_lists, n_subvectors=args.n_subvectors, metadata=metadata)
+    build_s = time.perf_counter() - start
+    print(f"🏗️ Built in {build_s:.1f}s: {index.n_lists} lists, {index.n_subvectors} bytes per recording, "
+          f"{index.nbytes / 1024:.0f}KB (raw embeddings {embeddings.nbytes / 1024:.0f}KB)")
+
+    output = Path(args.output) if args.output else similarity_index_path(model_path)
+    index.save(output)
+    print(f"💾 Index saved to: {output}")
+
+    report = evaluate(index, embeddings, labels, args.eval_queries, args.k, args.n_probe)
+    print(f"\n📊 {report['queries']} queries, top-{args.k}, {args.n_probe} lists probed:")
+    print(f"   recall@{args.k} vs exact search  {report[f'recall_at_{args.k}']:.3f}")
+    print(f"   neighbours with the query's label {report['label_agreement']:.1%}")
+    print(f"   lookup p50 {report['ann_latency']['p50_ms']:.2f}ms  p95 {report['ann_latency']['p95_ms']:.2f}ms "
+          f"(exact search p50 {report['exact_latency']['p50_ms']:.2f}ms)")
+
+    if args.report:
+        report.update(n=int(len(labels)), embed_s=embed_s, build_s=build_s, index_bytes=index.nbytes,
+                      index_path=str(output), metadata=metadata)
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Report saved to: {args.report}")
+
+if __name__ == "__main__":
+    main()
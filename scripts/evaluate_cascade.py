@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Cascade Evaluation
+Sweeps the cascade's uncertain band over a labelled validation set and reports,
+per band, the fraction of recordings escalated to the CNN, the resulting AUC and
+accuracy, and the latency per recording compared with running the CNN on everything
+"""
+
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from pathlib import Path
+
+# Add parent directory for imports
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from config import *
+from benchmarking import summarize_timings, time_callable
+from cascade import CascadeModel, FirstStageModel
+from utils import load_dataset_spectrograms, load_physionet_spectrograms
+
+DEFAULT_BANDS = ['0.5:0.5', '0.4:0.6', '0.3:0.7', '0.2:0.8', '0.1:0.9', '0:1']
+
+def parse_band(text):
+    lower, upper = (float(v) for v in text.split(':'))
+    return lower, upper
+
+def band_report(first_conf, cnn_conf, labels, lower, upper, first_ms, cnn_ms):
+    """Escalation rate, AUC, accuracy and expected latency for one uncertain band."""
+    from sklearn.metrics import roc_auc_score
+
+    escalate = (first_conf >= lower) & (first_conf <= upper)
+    combined = np.where(escalate, cnn_conf, first_conf)
+    return {
+        'lower': lower,
+        'upper': upper,
+        'escalation_rate': float(escalate.mean()),
+        'auc': float(roc_auc_score(labels, combined)),
+        'accuracy': float(((combined > CLASSIFICATION_THRESHOLD) == labels).mean()),
+        'expected_latency_ms': first_ms + float(escalate.mean()) * cnn_ms
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate cascade escalation thresholds")
+    parser.add_argument('--dataset', type=str, default=str(DATA_DIR / "full_processed_dataset.csv"),
+                        help="Processed-dataset CSV (spectrogram_path, label, split)")
+    parser.add_argument('--split', type=str, default='val',
+                        help="Split to evaluate on - use one the first stage was not trained on")
+    parser.add_argument('--physionet-dir', type=str, default=str(PHYSIONET_DIR),
+                        help="Used when --dataset does not exist")
+    parser.add_argument('--limit', type=int, default=None, help="Evaluate a random subset of this size")
+    parser.add_argument('--model', type=str, default=str(MODELS_DIR / "heart_sound_mobile.tflite"),
+                        help="Second-stage (CNN) TFLite model")
+    parser.add_argument('--first-stage', type=str, default=str(CASCADE_FIRST_STAGE_METADATA),
+                        help="First-stage model metadata JSON")
+    parser.add_argument('--bands', nargs='+', default=DEFAULT_BANDS,
+                        help="Uncertain bands as lower:upper (0:1 = CNN on everything)")
+    parser.add_argument('--repeats', type=int, default=50, help="Timed batch-1 predictions per stage")
+    parser.add_argument('--output', type=str, default=None, help="Write results JSON here")
+    args = parser.parse_args()
+
+    print("🪜 Cascade Evaluation")
+    print("=" * 50)
+
+    if Path(args.dataset).exists():
+        spectrograms, labels = load_dataset_spectrograms(args.dataset, args.split, args.limit, SPECTROGRAMS_DIR)
+        source = f"{args.dataset} ({args.split or 'all'})"
+    elif Path(args.physionet_dir).exists():
+        spectrograms, labels = load_physionet_spectrograms(args.physionet_dir, args.limit, SAMPLE_RATE,
+                                                           AUDIO_DURATION, N_MELS, N_FFT, HOP_LENGTH)
+        source = args.physionet_dir
+    else:
+        print("❌ No labelled data: run scripts/fast_batch_process.py or download PhysioNet 2016")
+        sys.exit(1)
+    if len(np.unique(labels)) < 2:
+        print("❌ Both classes are needed to compute AUC")
+        sys.exit(1)
+    print(f"📋 {len(labels)} recordings from {source} ({labels.sum()} abnormal)")
+
+    try:
+        from inference import TFLiteModel
+        cnn = TFLiteModel(args.model)
+        first_stage = FirstStageModel.from_metadata(args.first_stage)
+    except Exception as e:
+        print(f"❌ Could not load models: {e}")
+        sys.exit(1)
+    print(f"✅ First stage: {first_stage.name} ({first_stage.feature_set}), second stage: {cnn.name}")
+
+    # Score everything with both stages once; every band is then a cheap recombination
+    first_conf = first_stage.predict_proba(spectrograms)
+    cnn_conf = cnn.predict_batch(spectrograms)
+
+    sample = spectrograms[:1]
+    first_timing = time_callable(lambda: first_stage.predict_proba(sample), repeats=args.repeats)
+    cnn_timing = time_callable(lambda: cnn.predict_batch(sample), repeats=args.repeats)
+    first_ms, cnn_ms = first_timing['mean_ms'], cnn_timing['mean_ms']
+    print(f"⏱️ Batch-1 latency: first stage {first_ms:.2f}ms, CNN {cnn_ms:.2f}ms")
+
+    print(f"\n{'band':>10} {'escalated':>10} {'AUC':>7} {'accuracy':>9} {'latency':>10} {'vs CNN':>7}")
+    bands = []
+    for lower, upper in map(parse_band, args.bands):
+        report = band_report(first_conf, cnn_conf, labels, lower, upper, first_ms, cnn_ms)
+        bands.append(report)
+        print(f"{lower:>4g}-{upper:<5g} {report['escalation_rate']:>9.1%} {report['auc']:>7.3f} "
+              f"{report['accuracy']:>9.3f} {report['expected_latency_ms']:>8.2f}ms "
+              f"{report['expected_latency_ms'] / cnn_ms:>6.2f}x")
+
+    # Measured per-recording latency for the configured band, through CascadeModel itself
+    cascade = CascadeModel(first_stage, cnn, CASCADE_LOWER_THRESHOLD, CASCADE_UPPER_THRESHOLD)
+    timings = {'cascade': [], 'cnn_only': []}
+    for spectrogram in spectrograms[:, np.newaxis]:
+        for name, predict in [('cascade', cascade.predict_batch), ('cnn_only', cnn.predict_batch)]:
+            start = time.perf_counter()
+            predict(spectrogram)
+            timings[name].append((time.perf_counter() - start) * 1000)
+    measured = {name: summarize_timings(values) for name, values in timings.items()}
+    print(f"\n📊 Configured band {CASCADE_LOWER_THRESHOLD:g}-{CASCADE_UPPER_THRESHOLD:g}, measured per recording:")
+    for name, timing in measured.items():
+        print(f"   {name:<9} mean {timing['mean_ms']:7.2f}ms  p50 {timing['p50_ms']:7.2f}ms  "
+              f"p95 {timing['p95_ms']:7.2f}ms")
+
+    if args.output:
+        report = {
+            'source': source,
+            'n': int(len(labels)),
+            'first_stage': first_stage.name,
+            'second_stage': cnn.name,
+            'latency_ms': {'first_stage': first_timing, 'cnn': cnn_timing},
+            'bands': bands,
+            'configured_band': {'lower': CASCADE_LOWER_THRESHOLD, 'upper': CASCADE_UPPER_THRESHOLD,
+                                'measured': measured}
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Results saved to: {args.output}")
+
+if __name__ == "__main__":
+    main()
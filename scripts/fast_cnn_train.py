@@ -28,6 +28,7 @@ project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
 from utils import *
+from profiles import bind_profile, get_profile
 from config import *
 
 def create_efficient_cnn(input_shape):
@@ -243,6 +244,8 @@ def main():
         'class_weights': class_weight_dict,
         'preprocessing_config': str(DATA_DIR / "full_preprocess_config.json")
     }
+    # Trained on data/spectrograms, which scripts/fast_batch_process.py writes with the standard profile
+    bind_profile(metadata, get_profile('standard'))
 
     metadata_path = MODELS_DIR / "full_cnn_metadata.json"
     with open(metadata_path, 'w') as f:
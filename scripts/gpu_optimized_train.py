@@ -28,6 +28,7 @@ project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
 from utils import *
+from profiles import bind_profile, get_profile
 from config import *
 
 def setup_gpu_acceleration():
@@ -320,6 +321,8 @@ def main():
             'learning_rate': 0.001
         }
     }
+    # Trained on data/spectrograms, which scripts/fast_batch_process.py writes with the standard profile
+    bind_profile(metadata, get_profile('standard'))
 
     metadata_path = MODELS_DIR / "gpu_optimized_metadata.json"
     with open(metadata_path, 'w') as f:
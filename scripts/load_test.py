@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Concurrent Load Test
+Replays a corpus of recordings against a locally started inference service
+(or an already running one) with a configurable number of simulated users,
+ramp-up and duration. Reports throughput, latency percentiles, error rate and
+server CPU/RSS over time, for sizing deployments
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+import http.client
+import numpy as np
+from pathlib import Path
+from datetime import datetime
+from urllib.parse import urlparse
+
+# Add parent directory for imports
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from config import *
+from benchmarking import summarize_timings, synthetic_heart_wav
+
+def load_corpus(corpus_dir, limit):
+    """Raw upload bytes of real recordings; synthetic demo tones if none are found."""
+    files = []
+    if corpus_dir and Path(corpus_dir).exists():
+        files = sorted(p for p in Path(corpus_dir).rglob("*")
+                       if p.suffix.lower() in AUDIO_EXTENSIONS)[:limit]
+    if files:
+        print(f"🎵 Corpus: {len(files)} recordings from {corpus_dir}")
+        return [p.read_bytes() for p in files]
+
+    print(f"⚠️ No recordings found in {corpus_dir} - using {limit} synthetic uploads")
+    labels = ["normal", "abnormal"]
+    return [synthetic_heart_wav(AUDIO_DURATION, SAMPLE_RATE, labels[i % 2], seed=i) for i in range(limit)]
+
+class ProcessSampler:
+    """Samples CPU% and RSS of one process at a fixed interval (psutil, or /proc on Linux)."""
+
+    def __init__(self, pid, interval):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        try:
+            import psutil
+            self._process = psutil.Process(pid)
+        except ImportError:
+            self._process = None
+
+    def _cpu_seconds_and_rss(self):
+        if self._process is not None:
+            times = self._process.cpu_times()
+            return times.user + times.system, self._process.memory_info().rss
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open(f"/proc/{self.pid}/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        cpu_seconds = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        return cpu_seconds, resident_pages * os.sysconf('SC_PAGE_SIZE')
+
+    def _run(self):
+        try:
+            last_cpu, _ = self._cpu_seconds_and_rss()
+            last_time = time.perf_counter()
+            while not self._stop.wait(self.interval):
+                cpu, rss = self._cpu_seconds_and_rss()
+                now = time.perf_counter()
+                self.samples.append({'time': now, 'cpu_percent': 100 * (cpu - last_cpu) / (now - last_time),
+                                     'rss_mb': rss / (1024 * 1024)})
+                last_cpu, last_time = cpu, now
+        except Exception as e:
+            # Server exited (OSError from /proc, psutil.NoSuchProcess)
+            print(f"⚠️ Resource sampling stopped: {e}")
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+class ServiceClient:
+    """One simulated user's keep-alive connection to the service."""
+
+    def __init__(self, host, port, timeout):
+        self.host, self.port, self.timeout = host, port, timeout
+        self.conn = None
+
+    def predict(self, data):
+        """POST one upload; returns the HTTP status (0 for connection errors)."""
+        try:
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self.conn.request('POST', '/predict', body=data,
+                              headers={'Content-Type': 'application/octet-stream'})
+            response = self.conn.getresponse()
+            response.read()
+            if response.getheader('Connection', '').lower() == 'close':
+                self.close()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            self.close()
+            return 0
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+def run_load(host, port, corpus, users, ramp_s, duration_s, timeout):
+    """
+    Closed-loop load: each user sends its next upload as soon as the previous answer arrives.
+
+    Users start evenly spread over the ramp; the run ends duration_s after the first start.
+
+    Returns:
+        (records, start_time) where records are (start, latency_ms, status, user) tuples
+    """
+    records = []
+    lock = threading.Lock()
+    start_time = time.perf_counter()
+    end_time = start_time + duration_s
+
+    def user_loop(user):
+        client = ServiceClient(host, port, timeout)
+        delay = start_time + (ramp_s * user / users if users > 1 else 0) - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        i = user
+        while time.perf_counter() < end_time:
+            started = time.perf_counter()
+            status = client.predict(corpus[i % len(corpus)])
+            latency_ms = (time.perf_counter() - started) * 1000
+            with lock:
+                records.append((started, latency_ms, status, user))
+            i += users
+        client.close()
+
+    threads = [threading.Thread(target=user_loop, args=(u,), daemon=True) for u in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return records, start_time
+
+def summarize_run(records, start_time, duration_s, users, ramp_s, samples, window_s):
+    """Overall and per-window throughput, latency, errors and server resources."""
+    ok = [r for r in records if r[2] == 200]
+    errors = {}
+    for r in records:
+        if r[2] != 200:
+            key = str(r[2]) if r[2] else 'connection'
+            errors[key] = errors.get(key, 0) + 1
+
+    summary = {
+        'requests': len(records),
+        'throughput_per_s': len(ok) / duration_s,
+        'error_rate': (len(records) - len(ok)) / len(records) if records else 0.0,
+        'errors': errors,
+        'latency': summarize_timings([r[1] for r in ok])
+    }
+    if samples:
+        summary['server'] = {
+            'cpu_percent_mean': float(np.mean([s['cpu_percent'] for s in samples])),
+            'cpu_percent_max': float(max(s['cpu_percent'] for s in samples)),
+            'rss_mb_max': float(max(s['rss_mb'] for s in samples))
+        }
+
+    timeline = []
+    for window_start in np.arange(0, duration_s, window_s):
+        lo, hi = start_time + window_start, start_time + min(window_start + window_s, duration_s)
+        in_window = [r for r in records if lo <= r[0] < hi]
+        window_ok = [r[1] for r in in_window if r[2] == 200]
+        window_samples = [s for s in samples if lo <= s['time'] < hi + 1e-9]
+        # Users started by the end of the window (user u starts at ramp_s * u / users)
+        active = users if ramp_s <= 0 else min(users, int((hi - start_time) * users / ramp_s) + 1)
+        timeline.append({
+            't_s': float(window_start),
+            'active_users': active,
+            'throughput_per_s': len(window_ok) / (hi - lo),
+            'p50_ms': float(np.percentile(window_ok, 50)) if window_ok else None,
+            'p95_ms': float(np.percentile(window_ok, 95)) if window_ok else None,
+            'errors': len(in_window) - len(window_ok),
+            'cpu_percent': float(np.mean([s['cpu_percent'] for s in window_samples])) if window_samples else None,
+            'rss_mb': float(max(s['rss_mb'] for s in window_samples)) if window_samples else None
+        })
+    summary['timeline'] = timeline
+    return summary
+
+def wait_for_service(host, port, timeout):
+    """Poll /healthz until the service reports ready (warm-up done)."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=2)
+            conn.request('GET', '/healthz')
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.5)
+    return False
+
+def print_timeline(timeline):
+    fmt = lambda v, spec: format(v, spec) if v is not None else '-'
+    print(f"\n{'t (s)':>6} {'users':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'errors':>7} {'cpu %':>7} {'rss MB':>8}")
+    for w in timeline:
+        print(f"{w['t_s']:>6.0f} {w['active_users']:>6} {w['throughput_per_s']:>8.1f} "
+              f"{fmt(w['p50_ms'], '8.1f'):>8} {fmt(w['p95_ms'], '8.1f'):>8} {w['errors']:>7} "
+              f"{fmt(w['cpu_percent'], '7.0f'):>7} {fmt(w['rss_mb'], '8.1f'):>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the inference service with concurrent users")
+    parser.add_argument('--users', type=int, nargs='+', default=[20],
+                        help="Concurrent users; several values run one test per level")
+    parser.add_argument('--ramp', type=float, default=10.0, help="Seconds to start all users")
+    parser.add_argument('--duration', type=float, default=60.0, help="Seconds per test, including the ramp")
+    parser.add_argument('--corpus-dir', type=str, default=str(PHYSIONET_DIR),
+                        help="Directory of recordings to replay")
+    parser.add_argument('--corpus-size', type=int, default=64)
+    parser.add_argument('--url', type=str, default=None,
+                        help="Test an already running service instead of starting one (e.g. http://host:8502)")
+    parser.add_argument('--pid', type=int, default=None, help="Server PID to sample when using --url")
+    parser.add_argument('--port', type=int, default=SERVICE_PORT + 1, help="Port for the locally started service")
+    parser.add_argument('--server-args', type=str, nargs=argparse.REMAINDER, default=[],
+                        help="Extra arguments for inference_server.py (must come last)")
+    parser.add_argument('--timeout', type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument('--sample-interval', type=float, default=1.0, help="Seconds between CPU/RSS samples")
+    parser.add_argument('--window', type=float, default=5.0, help="Timeline window in seconds")
+    parser.add_argument('--output', type=str, default=None, help="Write the report JSON here")
+    args = parser.parse_args()
+
+    print("🔥 Inference Service Load Test")
+    print("=" * 50)
+    corpus = load_corpus(args.corpus_dir, args.corpus_size)
+
+    server = None
+    if args.url:
+        parsed = urlparse(args.url)
+        host, port, pid = parsed.hostname, parsed.port or 80, args.pid
+    else:
+        host, port = '127.0.0.1', args.port
+        print(f"🚀 Starting inference service on port {port}...")
+        server = subprocess.Popen(
+            [sys.executable, str(project_root / 'inference_server.py'),
+             '--host', host, '--port', str(port)] + args.server_args,
+            cwd=str(project_root), stdout=subprocess.DEVNULL
+        )
+        pid = server.pid
+
+    report = {'timestamp': datetime.now().isoformat(), 'target': f"http://{host}:{port}",
+              'settings': {'ramp_s': args.ramp, 'duration_s': args.duration,
+                           'corpus_size': len(corpus), 'server_args': args.server_args},
+              'runs': {}}
+    try:
+        if not wait_for_service(host, port, timeout=120):
+            print("❌ Service did not become ready")
+            sys.exit(1)
+        if pid is None:
+            print("⚠️ No server PID (pass --pid) - CPU/RSS will not be reported")
+
+        for users in args.users:
+            print(f"\n👥 {users} users, {args.ramp:g}s ramp, {args.duration:g}s")
+            sampler = ProcessSampler(pid, args.sample_interval).start() if pid else None
+            records, start_time = run_load(host, port, corpus, users, args.ramp, args.duration, args.timeout)
+            if sampler:
+                sampler.stop()
+
+            result = summarize_run(records, start_time, args.duration, users, args.ramp,
+                                   sampler.samples if sampler else [], args.window)
+            report['runs'][users] = result
+            print_timeline(result['timeline'])
+
+            latency = result['latency']
+            print(f"\n   ✅ {result['throughput_per_s']:.1f} req/s, p50 {latency['p50_ms']:.1f}ms, "
+                  f"p95 {latency['p95_ms']:.1f}ms, p99 {latency['p99_ms']:.1f}ms, "
+                  f"errors {result['error_rate']:.1%} {result['errors'] or ''}")
+            if 'server' in result:
+                print(f"   🖥️ Server CPU mean {result['server']['cpu_percent_mean']:.0f}% "
+                      f"(max {result['server']['cpu_percent_max']:.0f}%), "
+                      f"RSS max {result['server']['rss_mb_max']:.0f}MB")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Results saved to: {args.output}")
+
+if __name__ == "__main__":
+    main()
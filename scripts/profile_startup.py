@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Startup Profiler
+Reports per-module import time for app.py and the total time to first render,
+optionally failing when a startup budget is exceeded
+"""
+
+import sys
+import json
+import time
+import argparse
+import subprocess
+from pathlib import Path
+
+# Profiled modules are imported from the project root
+project_root = Path(__file__).parent.parent
+
+FIRST_RENDER_SNIPPET = """
+import time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({app!r}, default_timeout=600)
+at.run()
+elapsed = (time.perf_counter() - start) * 1000
+print('FIRST_RENDER_MS', elapsed, len(at.exception))
+"""
+
+def parse_importtime(stderr):
+    """
+    Parse `python -X importtime` output.
+
+    Returns:
+        Dictionary of module -> (self_ms, cumulative_ms)
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            modules[name.strip()] = (int(self_us) / 1000, int(cumulative_us) / 1000)
+        except ValueError:
+            continue
+    return modules
+
+def profile_imports(module):
+    """Import `module` in a fresh interpreter with -X importtime."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=str(project_root), capture_output=True, text=True
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    return parse_importtime(result.stderr), wall_ms, result.returncode
+
+def profile_first_render(app_file):
+    """Run the app once with Streamlit's AppTest in a fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, '-c', FIRST_RENDER_SNIPPET.format(app=app_file)],
+        cwd=str(project_root), capture_output=True, text=True
+    )
+    for line in result.stdout.splitlines():
+        if line.startswith('FIRST_RENDER_MS'):
+            _, elapsed, exceptions = line.split()
+            return float(elapsed), int(exceptions)
+    print(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "unknown error")
+    return None, None
+
+def top_level_packages(modules):
+    """Cumulative import time per top-level package (taken from its root module)."""
+    return {name: times[1] for name, times in modules.items() if '.' not in name}
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile app cold-start import time")
+    parser.add_argument('--app', default='app.py', help="Streamlit app file to profile")
+    parser.add_argument('--top', type=int, default=20, help="Number of slowest modules to list")
+    parser.add_argument('--skip-render', action='store_true', help="Only measure imports")
+    parser.add_argument('--budget-ms', type=float, default=None,
+                        help="Exit non-zero if time to first render (or import time) exceeds this")
+    parser.add_argument('--output', type=str, default=None, help="Optional JSON results path")
+    args = parser.parse_args()
+
+    print("⏱️ App Startup Profile")
+    print("=" * 50)
+
+    module = Path(args.app).stem
+    modules, import_wall_ms, returncode = profile_imports(module)
+    if returncode != 0 or module not in modules:
+        print(f"❌ Could not import {module}")
+        sys.exit(1)
+
+    import_ms = modules[module][1]
+    print(f"📦 import {module}: {import_ms:.0f}ms (process wall time {import_wall_ms:.0f}ms)")
+
+    packages = sorted(top_level_packages(modules).items(), key=lambda item: -item[1])
+    print("\n🐢 Slowest top-level imports:")
+    for name, cumulative_ms in packages[:args.top]:
+        print(f"   {name:<30} {cumulative_ms:8.1f}ms")
+
+    report = {
+        'app': args.app,
+        'import_ms': import_ms,
+        'import_wall_ms': import_wall_ms,
+        'modules': {name: {'self_ms': s, 'cumulative_ms': c} for name, (s, c) in modules.items()},
+        'first_render_ms': None
+    }
+
+    measured_ms = import_ms
+    if not args.skip_render:
+        first_render_ms, exceptions = profile_first_render(args.app)
+        if first_render_ms is None:
+            print("❌ First render could not be measured")
+            sys.exit(1)
+        report['first_render_ms'] = first_render_ms
+        measured_ms = first_render_ms
+        print(f"\n🖥️ Time to first render: {first_render_ms:.0f}ms"
+              + (f" ({exceptions} exceptions)" if exceptions else ""))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Results saved to: {args.output}")
+
+    if args.budget_ms is not None:
+        if measured_ms > args.budget_ms:
+            print(f"\n❌ Startup {measured_ms:.0f}ms exceeds budget {args.budget_ms:.0f}ms")
+            sys.exit(1)
+        print(f"\n✅ Startup {measured_ms:.0f}ms within budget {args.budget_ms:.0f}ms")
+
+if __name__ == "__main__":
+    main()
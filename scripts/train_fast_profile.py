@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Fast Profile Training and Comparison
+Trains the CNN on the fast screening profile (2 kHz, band-passed, smaller FFTs),
+exports it to TFLite and compares it with the standard 8 kHz profile on the same
+validation recordings: decode/resample, featurization and inference time per
+recording, and validation AUC
+"""
+
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from pathlib import Path
+
+# Add parent directory for imports
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from config import *
+from audio_io import decode_audio
+from benchmarking import summarize_timings, time_callable
+from profiles import bind_profile, get_profile
+from utils import get_physionet_labels
+
+PROFILES = {'standard': get_profile('standard'), 'fast': get_profile('fast')}
+
+def split_recordings(physionet_dir, dataset_csv, val_fraction, limit):
+    """(train_rows, val_rows): the processed dataset's split when it exists, else a stratified split."""
+    labels_df = get_physionet_labels(physionet_dir)
+    if limit:
+        labels_df = labels_df.sample(min(limit, len(labels_df)), random_state=0)
+
+    if Path(dataset_csv).exists():
+        import pandas as pd
+        dataset = pd.read_csv(dataset_csv)
+        if 'split' in dataset.columns:
+            split = labels_df['file_id'].map(dict(zip(dataset['file_id'], dataset['split'])))
+            return labels_df[split == 'train'], labels_df[split == 'val']
+
+    from sklearn.model_selection import train_test_split
+    return train_test_split(labels_df, test_size=val_fraction, stratify=labels_df['binary_label'],
+                            random_state=42)
+
+def featurize(rows, profile):
+    """Model inputs for every row under one profile, with per-recording decode and featurize timings."""
+    workspace = profile.workspace()
+    spectrograms = np.empty((len(rows),) + workspace.shape + (1,), dtype=np.float32)
+    decode_ms, featurize_ms = [], []
+    for i, (_, row) in enumerate(rows.iterrows()):
+        data = Path(row['file_path']).read_bytes()
+        start = time.perf_counter()
+        audio, _ = decode_audio(data, profile.sample_rate)
+        decoded = time.perf_counter()
+        workspace.prepare(audio, spectrograms[i, ..., 0])
+        decode_ms.append((decoded - start) * 1000)
+        featurize_ms.append((time.perf_counter() - decoded) * 1000)
+    labels = (rows['binary_label'] == 'abnormal').astype(int).values
+    return spectrograms, labels, {'decode': summarize_timings(decode_ms),
+                                  'featurize': summarize_timings(featurize_ms)}
+
+def train_cnn(train_x, train_y, val_x, val_y, epochs, checkpoint_path):
+    """The fast_cnn_train.py architecture and recipe, trained on in-memory spectrograms."""
+    from tensorflow import keras
+    from tensorflow.keras import callbacks
+    from sklearn.utils.class_weight import compute_class_weight
+    from fast_cnn_train import create_efficient_cnn
+
+    model = create_efficient_cnn(train_x.shape[1:])
+    model.compile(optimizer=keras.optimizers.Adam(learning_rate=LEARNING_RATE),
+                  loss='binary_crossentropy', metrics=['accuracy', 'AUC'])
+    class_weights = compute_class_weight('balanced', classes=np.unique(train_y), y=train_y)
+    model.fit(
+        train_x, train_y, validation_data=(val_x, val_y), epochs=epochs, batch_size=BATCH_SIZE,
+        class_weight={i: w for i, w in enumerate(class_weights)},
+        callbacks=[
+            callbacks.EarlyStopping(monitor='val_auc', patience=5, restore_best_weights=True, mode='max'),
+            callbacks.ModelCheckpoint(filepath=str(checkpoint_path), monitor='val_auc',
+                                      save_best_only=True, mode='max'),
+            callbacks.ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=3, min_lr=1e-6)
+        ],
+        verbose=2
+    )
+    return model
+
+def export_tflite(model, path):
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    Path(path).write_bytes(converter.convert())
+
+def evaluate_tflite(model_path, val_x, val_y, repeats):
+    """Validation AUC/accuracy and batch-1 latency of a TFLite model."""
+    from sklearn.metrics import roc_auc_score
+    from inference import TFLiteModel
+
+    model = TFLiteModel(model_path)
+    confidences = model.predict_batch(val_x)
+    timing = time_callable(lambda: model.predict_batch(val_x[:1]), repeats=repeats)
+    return {
+        'model': model.name,
+        'auc': float(roc_auc_score(val_y, confidences)),
+        'accuracy': float(((confidences > CLASSIFICATION_THRESHOLD) == val_y).mean()),
+        'inference': timing
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the fast screening profile model and compare it")
+    parser.add_argument('--physionet-dir', type=str, default=str(PHYSIONET_DIR))
+    parser.add_argument('--dataset', type=str, default=str(DATA_DIR / "full_processed_dataset.csv"),
+                        help="Processed-dataset CSV whose train/val split is reused when present")
+    parser.add_argument('--val-fraction', type=float, default=VALIDATION_SPLIT)
+    parser.add_argument('--limit', type=int, default=None, help="Use a random subset of this size")
+    parser.add_argument('--epochs', type=int, default=20)
+    parser.add_argument('--baseline-model', type=str, default=str(MODELS_DIR / "heart_sound_mobile.tflite"),
+                        help="Standard-profile TFLite model to compare against")
+    parser.add_argument('--retrain-baseline', action='store_true',
+                        help="Train the standard profile with the same recipe instead of using --baseline-model")
+    parser.add_argument('--repeats', type=int, default=50, help="Timed batch-1 predictions per model")
+    parser.add_argument('--output-name', type=str, default="heart_sound_fast")
+    parser.add_argument('--output', type=str, default=None, help="Write comparison JSON here")
+    args = parser.parse_args()
+
+    print("⚡ Fast Profile Training and Comparison")
+    print("=" * 50)
+
+    if not Path(args.physionet_dir).exists():
+        print(f"❌ PhysioNet data not found at {args.physionet_dir} (raw recordings are needed to time decoding)")
+        sys.exit(1)
+    train_rows, val_rows = split_recordings(args.physionet_dir, args.dataset, args.val_fraction, args.limit)
+    print(f"📋 {len(train_rows)} train / {len(val_rows)} val recordings")
+
+    results = {}
+    data = {}
+    for name, profile in PROFILES.items():
+        print(f"\n🎛️ {name}: {profile}")
+        val_x, val_y, timings = featurize(val_rows, profile)
+        data[name] = {'val': (val_x, val_y)}
+        results[name] = {'profile': profile.to_dict(), 'input_shape': list(val_x.shape[1:]), **timings}
+        print(f"   decode {timings['decode']['mean_ms']:.2f}ms, featurize {timings['featurize']['mean_ms']:.2f}ms "
+              f"per recording, input {val_x.shape[1:3]}")
+
+    trained = ['fast', 'standard'] if args.retrain_baseline else ['fast']
+    for name in trained:
+        print(f"\n🚀 Training the {name} profile CNN...")
+        train_x, train_y, _ = featurize(train_rows, PROFILES[name])
+        val_x, val_y = data[name]['val']
+        stem = args.output_name if name == 'fast' else f"{args.output_name}_baseline"
+        try:
+            model = train_cnn(train_x, train_y, val_x, val_y, args.epochs, MODELS_DIR / f"{stem}.keras")
+            model.save(MODELS_DIR / f"{stem}.keras")
+            export_tflite(model, MODELS_DIR / f"{stem}.tflite")
+        except ImportError as e:
+            print(f"❌ TensorFlow is needed for training: {e}")
+            sys.exit(1)
+        data[name]['model_path'] = MODELS_DIR / f"{stem}.tflite"
+        print(f"💾 Saved {stem}.keras and {stem}.tflite")
+    if not args.retrain_baseline:
+        data['standard']['model_path'] = Path(args.baseline_model)
+
+    for name in PROFILES:
+        val_x, val_y = data[name]['val']
+        try:
+            results[name].update(evaluate_tflite(data[name]['model_path'], val_x, val_y, args.repeats))
+        except Exception as e:
+            print(f"⚠️ Could not evaluate the {name} model: {e}")
+            results[name].update(model=Path(data[name]['model_path']).name, auc=None, accuracy=None,
+                                 inference=summarize_timings([]))
+
+    print(f"\n📊 Per recording (mean over {len(val_rows)} validation recordings):")
+    print(f"{'profile':>10} {'decode':>9} {'featurize':>10} {'inference':>10} {'total':>9} {'AUC':>7}")
+    for name, result in results.items():
+        result['total_ms'] = sum(result[stage]['mean_ms'] for stage in ('decode', 'featurize', 'inference'))
+        auc = f"{result['auc']:.3f}" if result['auc'] is not None else "n/a"
+        print(f"{name:>10} {result['decode']['mean_ms']:>7.2f}ms {result['featurize']['mean_ms']:>8.2f}ms "
+              f"{result['inference']['mean_ms']:>8.2f}ms {result['total_ms']:>7.2f}ms {auc:>7}")
+    speedup = results['standard']['total_ms'] / max(results['fast']['total_ms'], 1e-9)
+    print(f"\n⚡ Fast profile: {speedup:.1f}x faster end to end")
+    if not args.retrain_baseline:
+        print("   (baseline is the deployed model; it may have seen some of these recordings in training - "
+              "use --retrain-baseline for a like-for-like AUC)")
+
+    metadata = {
+        'model_type': 'CNN',
+        'model_path': f"{args.output_name}.tflite",
+        'keras_model_path': f"{args.output_name}.keras",
+        'input_shape': results['fast']['input_shape'],
+        'training_samples': int(len(train_rows)),
+        'validation_samples': int(len(val_rows)),
+        'val_auc': results['fast']['auc'],
+        'baseline': {'model': results['standard']['model'], 'val_auc': results['standard']['auc']},
+        'speedup_vs_standard': speedup
+    }
+    # The apps featurize uploads for this model with the profile bound here
+    bind_profile(metadata, PROFILES['fast'])
+    metadata_path = MODELS_DIR / f"{args.output_name}_metadata.json"
+    with open(metadata_path, 'w') as f:
+        json.dump(metadata, f, indent=2)
+    print(f"💾 Metadata saved to: {metadata_path}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'train': int(len(train_rows)), 'val': int(len(val_rows)), 'speedup': speedup,
+                       'results': results}, f, indent=2)
+        print(f"💾 Results saved to: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Handcrafted Feature Model Training
+Trains the lightweight first-stage RandomForest on the compact handcrafted
+features (features.py) and compares it with the flattened-spectrogram features
+the mini model uses today: extraction throughput, feature size, AUC/accuracy
+and scoring throughput
+"""
+
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from pathlib import Path
+
+# Add parent directory for imports
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from config import *
+from benchmarking import time_callable
+from cascade import FIRST_STAGE_FEATURE_SETS, FirstStageModel
+from features import feature_names
+from profiles import STANDARD_PROFILE, bind_profile
+from utils import load_dataset_spectrograms, load_physionet_spectrograms
+
+FEATURE_SETS = ['flattened_spectrogram', 'handcrafted']
+
+def load_splits(args):
+    """(train_x, train_y, val_x, val_y, source) from the processed dataset or PhysioNet."""
+    from sklearn.model_selection import train_test_split
+
+    if Path(args.dataset).exists():
+        train_x, train_y = load_dataset_spectrograms(args.dataset, 'train', args.limit, SPECTROGRAMS_DIR)
+        val_x, val_y = load_dataset_spectrograms(args.dataset, 'val', args.limit, SPECTROGRAMS_DIR)
+        return train_x, train_y, val_x, val_y, args.dataset
+
+    if Path(args.physionet_dir).exists():
+        spectrograms, labels = load_physionet_spectrograms(args.physionet_dir, args.limit, SAMPLE_RATE,
+                                                           AUDIO_DURATION, N_MELS, N_FFT, HOP_LENGTH)
+        train_x, val_x, train_y, val_y = train_test_split(
+            spectrograms, labels, test_size=args.val_fraction, stratify=labels, random_state=42
+        )
+        return train_x, train_y, val_x, val_y, args.physionet_dir
+
+    print("❌ No labelled data: run scripts/fast_batch_process.py or download PhysioNet 2016")
+    sys.exit(1)
+
+def extraction_report(featurize, spectrograms):
+    """Extraction time, throughput and stored size of one feature set."""
+    start = time.perf_counter()
+    features = np.ascontiguousarray(featurize(spectrograms), dtype=np.float32)
+    elapsed = time.perf_counter() - start
+    return features, {
+        'n_features': int(features.shape[1]),
+        'bytes_per_recording': int(features[0].nbytes),
+        'extraction_ms_per_recording': elapsed * 1000 / len(spectrograms),
+        'extraction_recordings_per_s': len(spectrograms) / elapsed if elapsed > 0 else float('inf')
+    }
+
+def scoring_report(estimator, featurize, spectrograms, labels, repeats):
+    """AUC/accuracy plus batch-1 latency and full-batch throughput, featurization included."""
+    from sklearn.metrics import roc_auc_score
+
+    positive = list(estimator.classes_).index(1)
+    n_jobs = getattr(estimator, 'n_jobs', None)
+    if n_jobs is not None:
+        # Score the way FirstStageModel serves: one thread per request
+        estimator.n_jobs = 1
+
+    def score(x):
+        return estimator.predict_proba(featurize(x))[:, positive]
+
+    confidences = score(spectrograms)
+    single = time_callable(lambda: score(spectrograms[:1]), repeats=repeats)
+    start = time.perf_counter()
+    score(spectrograms)
+    batch_s = time.perf_counter() - start
+
+    if n_jobs is not None:
+        estimator.n_jobs = n_jobs
+    return {
+        'auc': float(roc_auc_score(labels, confidences)) if len(np.unique(labels)) > 1 else None,
+        'accuracy': float(((confidences > CLASSIFICATION_THRESHOLD) == labels).mean()),
+        'batch1_latency_ms': single['mean_ms'],
+        'batch_recordings_per_s': len(spectrograms) / batch_s if batch_s > 0 else float('inf')
+    }
+
+def train_forest(features, labels, n_estimators):
+    from sklearn.ensemble import RandomForestClassifier
+
+    model = RandomForestClassifier(n_estimators=n_estimators, class_weight='balanced',
+                                   random_state=42, n_jobs=-1)
+    start = time.perf_counter()
+    model.fit(features, labels)
+    return model, time.perf_counter() - start
+
+def save_model(model, report, train_count, output_dir):
+    """Save the handcrafted model and a metadata file FirstStageModel.from_metadata can load."""
+    import joblib
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    model_path = output_dir / "feature_rf_model.pkl"
+    joblib.dump(model, model_path)
+
+    metadata = {
+        'model_type': 'RandomForest',
+        'model_path': model_path.name,
+        'feature_set': 'handcrafted',
+        'feature_names': feature_names(),
+        'input_shape': [len(feature_names())],
+        'class_names': ['Normal', 'Abnormal'],
+        'training_samples': int(train_count),
+        'validation_accuracy': report['scoring']['accuracy'],
+        'validation_auc': report['scoring']['auc'],
+        'spectrogram_shape': f"({N_MELS}, {int(AUDIO_DURATION * SAMPLE_RATE) // HOP_LENGTH + 1})"
+    }
+    metadata_path = output_dir / "feature_model_metadata.json"
+    # Features come from the cached standard-profile spectrograms; create_cascade checks this against the CNN
+    bind_profile(metadata, STANDARD_PROFILE)
+    with open(metadata_path, 'w') as f:
+        json.dump(metadata, f, indent=2)
+    return model_path, metadata_path
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the first-stage model on handcrafted features")
+    parser.add_argument('--dataset', type=str, default=str(DATA_DIR / "full_processed_dataset.csv"),
+                        help="Processed-dataset CSV (spectrogram_path, label, split)")
+    parser.add_argument('--physionet-dir', type=str, default=str(PHYSIONET_DIR),
+                        help="Used when --dataset does not exist")
+    parser.add_argument('--limit', type=int, default=None, help="Use a random subset of this size per split")
+    parser.add_argument('--val-fraction', type=float, default=0.2, help="Validation share for PhysioNet")
+    parser.add_argument('--n-estimators', type=int, default=200)
+    parser.add_argument('--repeats', type=int, default=50, help="Timed batch-1 predictions per model")
+    parser.add_argument('--output-dir', type=str, default=str(MODELS_DIR))
+    parser.add_argument('--output', type=str, default=None, help="Write comparison JSON here")
+    args = parser.parse_args()
+
+    print("🧮 Handcrafted Feature Model Training")
+    print("=" * 50)
+
+    train_x, train_y, val_x, val_y, source = load_splits(args)
+    if len(np.unique(train_y)) < 2:
+        print("❌ Both classes are needed in the training split")
+        sys.exit(1)
+    print(f"📋 {len(train_y)} train / {len(val_y)} val recordings from {source} "
+          f"({train_y.sum()} / {val_y.sum()} abnormal)")
+
+    results = {}
+    models = {}
+    for feature_set in FEATURE_SETS:
+        featurize = FIRST_STAGE_FEATURE_SETS[feature_set](STANDARD_PROFILE)
+        print(f"\n🔧 {feature_set}")
+        train_features, extraction = extraction_report(featurize, train_x)
+        print(f"   {extraction['n_features']} features, {extraction['bytes_per_recording'] / 1024:.1f}KB per recording, "
+              f"{extraction['extraction_recordings_per_s']:.0f} recordings/s extraction")
+
+        model, train_s = train_forest(train_features, train_y, args.n_estimators)
+        scoring = scoring_report(model, featurize, val_x, val_y, args.repeats)
+        auc = f"{scoring['auc']:.3f}" if scoring['auc'] is not None else "n/a"
+        print(f"   trained in {train_s:.1f}s - val AUC {auc}, accuracy {scoring['accuracy']:.3f}")
+        print(f"   scoring: batch-1 {scoring['batch1_latency_ms']:.2f}ms, "
+              f"batch {scoring['batch_recordings_per_s']:.0f} recordings/s")
+
+        models[feature_set] = model
+        results[feature_set] = {'extraction': extraction, 'training_s': train_s, 'scoring': scoring}
+
+    # Today's deployed first stage, scored on the same validation recordings
+    try:
+        current = FirstStageModel.from_metadata(CASCADE_FIRST_STAGE_METADATA)
+        scoring = scoring_report(current.estimator, current.featurize, val_x, val_y, args.repeats)
+        results['current'] = {'model': current.name, 'feature_set': current.feature_set, 'scoring': scoring}
+        auc = f"{scoring['auc']:.3f}" if scoring['auc'] is not None else "n/a"
+        print(f"\n📦 Current {current.name}: val AUC {auc}, accuracy {scoring['accuracy']:.3f}, "
+              f"batch-1 {scoring['batch1_latency_ms']:.2f}ms")
+    except Exception as e:
+        print(f"\n⚠️ Could not score the current first stage: {e}")
+
+    flat, compact = results['flattened_spectrogram'], results['handcrafted']
+    print("\n📊 Handcrafted vs flattened:")
+    print(f"   feature size   {flat['extraction']['bytes_per_recording'] / compact['extraction']['bytes_per_recording']:.0f}x smaller")
+    print(f"   batch scoring  {compact['scoring']['batch_recordings_per_s']:.0f} vs "
+          f"{flat['scoring']['batch_recordings_per_s']:.0f} recordings/s")
+    print(f"   batch-1        {compact['scoring']['batch1_latency_ms']:.2f}ms vs "
+          f"{flat['scoring']['batch1_latency_ms']:.2f}ms")
+
+    model_path, metadata_path = save_model(models['handcrafted'], compact, len(train_y), args.output_dir)
+    print(f"\n💾 Model saved to: {model_path}")
+    print(f"💾 Metadata saved to: {metadata_path}")
+    print(f"   Serve it with: python inference_server.py --cascade --first-stage {metadata_path} "
+          f"(or set CASCADE_FIRST_STAGE_METADATA)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'source': source, 'train': int(len(train_y)), 'val': int(len(val_y)),
+                       'results': results}, f, indent=2)
+        print(f"💾 Results saved to: {args.output}")
+
+if __name__ == "__main__":
+    main()
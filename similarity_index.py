@@ -0,0 +1,323 @@
+"""
+Similar-case retrieval for the Heart Sound Analyzer.
+Embeds recordings with the CNN's penultimate layer (the GlobalAveragePooling2D
+output) and finds the nearest labelled PhysioNet recordings with a compact
+NumPy IVF-PQ index: a coarse k-means over the embeddings picks a few inverted
+lists per query, and product-quantized residuals are scored with lookup tables.
+"""
+
+import json
+import hashlib
+import threading
+import numpy as np
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from config import SIMILARITY_INDEX_SUFFIX, SIMILARITY_TOP_K, SIMILARITY_N_PROBE
+
+def similarity_index_path(model_path) -> Path:
+    """Index file that belongs to a model: <model stem>_similarity.npz next to it."""
+    model_path = Path(model_path)
+    return model_path.with_name(model_path.stem + SIMILARITY_INDEX_SUFFIX)
+
+def model_file_hash(model_path) -> str:
+    """
+    sha1 of a model file's bytes, recorded in the index it was built with.
+
+    Indexes ship next to their model, so they are matched by content rather than
+    by mtime, which every clone, checkout or copy changes.
+    """
+    digest = hashlib.sha1()
+    with open(model_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# ===== EMBEDDINGS =====
+
+class EmbeddingModel:
+    """
+    Penultimate-layer embeddings from a .keras or .tflite CNN.
+
+    Keras models are cut at their last GlobalAveragePooling2D layer. TFLite
+    models run with intermediate tensors preserved and the pooling output is
+    read after invoke (found by tensor name, 'global_average_pooling' unless
+    `layer_name` says otherwise).
+    """
+
+    def __init__(self, model_path, layer_name: Optional[str] = None, batch_size: int = 32):
+        self.model_path = Path(model_path)
+        self.batch_size = int(batch_size)
+        self._lock = threading.Lock()
+        if self.model_path.suffix == '.tflite':
+            self._load_tflite(layer_name or 'global_average_pooling')
+        else:
+            self._load_keras(layer_name)
+
+    @property
+    def name(self) -> str:
+        return self.model_path.name
+
+    def _load_keras(self, layer_name: Optional[str]):
+        import tensorflow as tf
+
+        model = tf.keras.models.load_model(str(self.model_path), compile=False)
+        if layer_name:
+            layers = [layer for layer in model.layers if layer.name == layer_name]
+        else:
+            layers = [layer for layer in model.layers
+                      if isinstance(layer, tf.keras.layers.GlobalAveragePooling2D)]
+        if not layers:
+            raise ValueError(f"{self.name} has no {layer_name or 'GlobalAveragePooling2D'} layer")
+
+        self.layer_name = layers[-1].name
+        self._keras = tf.keras.Model(model.inputs, layers[-1].output)
+        self.input_shape = tuple(model.input_shape)
+        self.dim = int(self._keras.output_shape[-1])
+        self._interpreter = None
+
+    def _load_tflite(self, layer_name: str):
+        from inference import create_interpreter
+
+        interpreter = create_interpreter(self.model_path, preserve_all_tensors=True)
+        input_detail = interpreter.get_input_details()[0]
+        shape = list(input_detail['shape'])
+        shape[0] = self.batch_size
+        interpreter.resize_tensor_input(input_detail['index'], shape)
+        interpreter.allocate_tensors()
+
+        candidates = [
+            detail for detail in interpreter.get_tensor_details()
+            if layer_name.lower() in detail['name'].lower()
+            and len(detail['shape']) >= 2 and int(detail['shape'][0]) == self.batch_size
+        ]
+        if not candidates:
+            raise ValueError(f"{self.name} has no tensor named like {layer_name!r}")
+
+        self.layer_name = candidates[-1]['name']
+        self._interpreter = interpreter
+        self._input_detail = interpreter.get_input_details()[0]
+        self._embedding_detail = candidates[-1]
+        self.input_shape = (None,) + tuple(int(d) for d in shape[1:])
+        self.dim = int(np.prod(candidates[-1]['shape'][1:]))
+        self._keras = None
+
+    def _invoke_tflite(self, chunk: np.ndarray) -> np.ndarray:
+        from inference import _dequantize_output, _quantize_input
+
+        n = len(chunk)
+        if n < self.batch_size:
+            padded = np.zeros((self.batch_size,) + chunk.shape[1:], dtype=np.float32)
+            padded[:n] = chunk
+            chunk = padded
+        self._interpreter.set_tensor(self._input_detail['index'], _quantize_input(chunk, self._input_detail))
+        self._interpreter.invoke()
+        embedding = self._interpreter.get_tensor(self._embedding_detail['index'])
+        embedding = _dequantize_output(embedding, self._embedding_detail)
+        return embedding.reshape(self.batch_size, -1)[:n]
+
+    def embed_batch(self, batch: np.ndarray) -> np.ndarray:
+        """
+        Embed a batch of spectrograms.
+
+        Args:
+            batch: Array of shape (N, n_mels, frames, 1) or (N, n_mels, frames)
+
+        Returns:
+            float32 array of shape (N, dim)
+        """
+        batch = np.asarray(batch, dtype=np.float32)
+        if batch.ndim == len(self.input_shape) - 1:
+            batch = batch[..., np.newaxis]
+
+        with self._lock:
+            if self._keras is not None:
+                return self._keras.predict(batch, batch_size=self.batch_size, verbose=0).astype(np.float32)
+            embeddings = np.empty((len(batch), self.dim), dtype=np.float32)
+            for start in range(0, len(batch), self.batch_size):
+                chunk = batch[start:start + self.batch_size]
+                embeddings[start:start + len(chunk)] = self._invoke_tflite(chunk)
+            return embeddings
+
+# ===== INDEX =====
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows, so squared distance ranks like cosine similarity."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+def _nearest(x: np.ndarray, centroids: np.ndarray, chunk_size: int = 4096) -> np.ndarray:
+    """Index of the nearest centroid for every row of x."""
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    assign = np.empty(len(x), dtype=np.int64)
+    for start in range(0, len(x), chunk_size):
+        chunk = x[start:start + chunk_size]
+        # ||x||^2 is the same for every centroid, so it drops out of the argmin
+        assign[start:start + chunk_size] = (centroid_norms - 2 * chunk @ centroids.T).argmin(axis=1)
+    return assign
+
+def _kmeans(x: np.ndarray, k: int, iterations: int = 20, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Lloyd's k-means from random rows; empty clusters are re-seeded. Returns (centroids, assignment)."""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(x))
+    centroids = x[rng.choice(len(x), k, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        assign = _nearest(x, centroids)
+        counts = np.bincount(assign, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, np.newaxis]
+        if not filled.all():
+            centroids[~filled] = x[rng.choice(len(x), int((~filled).sum()), replace=False)]
+    return centroids, _nearest(x, centroids)
+
+class SimilarityIndex:
+    """
+    IVF-PQ approximate nearest-neighbour index over L2-normalized embeddings.
+
+    Entries are stored grouped by inverted list (list_offsets delimits each
+    list), each as `n_subvectors` one-byte codes of its residual from the list
+    centroid, plus the label and source recording it came from.
+    """
+
+    def __init__(self, centroids: np.ndarray, codebooks: np.ndarray, codes: np.ndarray,
+                 list_offsets: np.ndarray, ids: np.ndarray, labels: np.ndarray,
+                 file_ids: np.ndarray, sources: np.ndarray, metadata: Optional[Dict[str, Any]] = None):
+        self.centroids = centroids
+        self.codebooks = codebooks
+        self.codes = codes
+        self.list_offsets = list_offsets
+        self.ids = ids
+        self.labels = labels
+        self.file_ids = file_ids
+        self.sources = sources
+        self.metadata = metadata or {}
+
+        self.n_lists, self.dim = centroids.shape
+        self.n_subvectors, self.n_codes, self.sub_dim = codebooks.shape
+
+        # ||r - y||^2 with r = q - c: ||q - c||^2 - 2 q.y + (||y||^2 + 2 c.y). The last term depends only
+        # on the list and the codeword, so it is computed once here and each query needs just q.y
+        list_centroids = centroids.reshape(self.n_lists, self.n_subvectors, self.sub_dim)
+        self._list_terms = (codebooks ** 2).sum(axis=2) + 2 * np.einsum('lms,mcs->lmc', list_centroids, codebooks)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the searchable arrays (centroids, codebooks, codes and list offsets)."""
+        return int(self.centroids.nbytes + self.codebooks.nbytes + self.codes.nbytes + self.list_offsets.nbytes)
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, labels: Sequence[int], file_ids: Sequence[str],
+              sources: Optional[Sequence[str]] = None, n_lists: Optional[int] = None,
+              n_subvectors: int = 32, n_codes: int = 256, iterations: int = 20,
+              seed: int = 0, metadata: Optional[Dict[str, Any]] = None) -> 'SimilarityIndex':
+        """
+        Train the coarse quantizer and product quantizer and encode every embedding.
+
+        Args:
+            embeddings: (N, dim) embeddings (normalized here)
+            labels: 1 = abnormal, 0 = normal, per embedding
+            file_ids: Recording ID per embedding
+            sources: Recording path relative to the PhysioNet directory, per embedding
+            n_lists: Inverted lists (default about sqrt(N))
+            n_subvectors: PQ sub-vectors per embedding; must divide dim
+            n_codes: Centroids per sub-quantizer (at most 256, one byte per code)
+            metadata: Extra JSON-serializable details saved with the index
+
+        Returns:
+            SimilarityIndex
+        """
+        x = _normalize(embeddings)
+        n, dim = x.shape
+        if dim % n_subvectors:
+            raise ValueError(f"n_subvectors ({n_subvectors}) must divide the embedding size ({dim})")
+        n_codes = min(n_codes, 256, n)
+        n_lists = n_lists or max(1, int(round(np.sqrt(n))))
+
+        centroids, assign = _kmeans(x, n_lists, iterations, seed)
+        residuals = (x - centroids[assign]).reshape(n, n_subvectors, dim // n_subvectors)
+
+        codebooks = np.empty((n_subvectors, n_codes, dim // n_subvectors), dtype=np.float32)
+        codes = np.empty((n, n_subvectors), dtype=np.uint8)
+        for m in range(n_subvectors):
+            codebooks[m], codes[:, m] = _kmeans(residuals[:, m], n_codes, iterations, seed + 1 + m)
+
+        # Group entries by inverted list so each list is one contiguous slice
+        order = np.argsort(assign, kind='stable')
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=len(centroids)))])
+        sources = sources if sources is not None else [''] * n
+
+        return cls(
+            centroids, codebooks, codes[order], list_offsets.astype(np.int64), order.astype(np.int64),
+            np.asarray(labels, dtype=np.int8)[order], np.asarray(file_ids, dtype=str)[order],
+            np.asarray(sources, dtype=str)[order], metadata
+        )
+
+    def search_ids(self, embedding: np.ndarray, k: int = SIMILARITY_TOP_K,
+                   n_probe: int = SIMILARITY_N_PROBE) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate top-k for one embedding.
+
+        Returns:
+            Tuple of (entry positions, approximate squared distances), nearest first
+        """
+        q = _normalize(np.asarray(embedding).reshape(-1))
+        n_probe = min(n_probe, self.n_lists)
+        coarse = ((self.centroids - q) ** 2).sum(axis=1)
+        probe = np.argpartition(coarse, n_probe - 1)[:n_probe] if n_probe < self.n_lists else np.arange(self.n_lists)
+
+        # Distance from each probed list's residual to every sub-codeword, less ||q - c||^2: (n_probe, m, n_codes)
+        query_terms = np.einsum('ms,mcs->mc', q.reshape(self.n_subvectors, self.sub_dim), self.codebooks)
+        tables = self._list_terms[probe] - 2 * query_terms
+
+        starts, ends = self.list_offsets[probe], self.list_offsets[probe + 1]
+        candidates = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])
+        if len(candidates) == 0:
+            return candidates, np.empty(0, dtype=np.float32)
+        table_of = np.repeat(np.arange(len(probe)), ends - starts)
+        distances = coarse[probe][table_of] + \
+            tables[table_of[:, np.newaxis], np.arange(self.n_subvectors), self.codes[candidates]].sum(axis=1)
+
+        k = min(k, len(candidates))
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+        return candidates[top], distances[top]
+
+    def search(self, embedding: np.ndarray, k: int = SIMILARITY_TOP_K,
+               n_probe: int = SIMILARITY_N_PROBE) -> List[Dict[str, Any]]:
+        """
+        Nearest labelled recordings for one embedding.
+
+        Returns:
+            List of dicts (file_id, label, source, similarity), most similar first;
+            similarity is the approximate cosine similarity
+        """
+        positions, distances = self.search_ids(embedding, k, n_probe)
+        return [
+            {
+                'file_id': str(self.file_ids[p]),
+                'label': 'abnormal' if self.labels[p] else 'normal',
+                'source': str(self.sources[p]),
+                'similarity': float(1.0 - d / 2.0)
+            }
+            for p, d in zip(positions, distances)
+        ]
+
+    def save(self, path):
+        """Save the index as a single .npz (no pickled objects)."""
+        np.savez(
+            path, centroids=self.centroids, codebooks=self.codebooks, codes=self.codes,
+            list_offsets=self.list_offsets, ids=self.ids, labels=self.labels,
+            file_ids=self.file_ids, sources=self.sources, metadata=np.array(json.dumps(self.metadata))
+        )
+
+    @classmethod
+    def load(cls, path) -> 'SimilarityIndex':
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+        metadata = json.loads(str(arrays.pop('metadata')))
+        return cls(metadata=metadata, **arrays)
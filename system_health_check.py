@@ -250,8 +250,11 @@ def generate_health_report():
         "overall_status": "HEALTHY" if all([deps_ok, audio_ok, original_ok, files_ok, streamlit_ok]) else "ISSUES_DETECTED"
     }
     
-    # Save report
-    report_path = Path("system_health_report.json")
+    # Save report, with the stage timings the running apps recorded (metrics.py)
+    from config import METRICS_REPORT_PATH
+    from metrics import collect_snapshots
+    report["runtime_metrics"] = collect_snapshots()
+    report_path = METRICS_REPORT_PATH
     with open(report_path, 'w') as f:
         json.dump(report, f, indent=2)
     
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""
+Offload pool checks.
+Worker results match in-process results, and the pool's bound and timeouts hold.
+
+Run with pytest, or directly.
+"""
+
+import time
+import threading
+import numpy as np
+
+from benchmarking import synthetic_heart_wav
+from offload import OffloadBusy, OffloadPool, OffloadTimeout, prepare_upload_simple
+from profiles import get_profile
+
+def test_worker_matches_inline():
+    wav = synthetic_heart_wav(6.0, 8000, "abnormal")
+    profile = get_profile('standard')
+    inline = OffloadPool(workers=0).run(prepare_upload_simple, wav, profile)
+    pool = OffloadPool(workers=1, max_pending=2)
+    try:
+        offloaded = pool.run(prepare_upload_simple, wav, profile)
+    finally:
+        pool.shutdown()
+    assert offloaded[2] == inline[2]
+    assert np.array_equal(offloaded[0], inline[0])
+    assert np.array_equal(offloaded[1], inline[1])
+    assert pool.stats()['completed'] == 1
+
+def test_backpressure():
+    pool = OffloadPool(workers=1, max_pending=1, admission_timeout=0.2)
+    try:
+        held = pool.submit(time.sleep, 1.0)
+        try:
+            pool.submit(time.sleep, 0)
+        except OffloadBusy:
+            pass
+        else:
+            raise AssertionError("a submission past max_pending should be rejected")
+        held.result(timeout=30)
+        # The slot is free again once the task finishes
+        pool.run(time.sleep, 0, timeout=30)
+        stats = pool.stats()
+        assert stats['rejected'] == 1 and stats['completed'] == 2, stats
+    finally:
+        pool.shutdown()
+
+def test_task_timeout_holds_slot():
+    pool = OffloadPool(workers=1, max_pending=1, admission_timeout=0.2)
+    try:
+        pool.run(time.sleep, 0, timeout=30)  # workers are up
+        try:
+            pool.run(time.sleep, 1.0, timeout=0.1)
+        except OffloadTimeout:
+            pass
+        else:
+            raise AssertionError("run() should time out")
+        # The timed-out task still runs, so it still counts against the bound
+        assert pool.stats()['in_flight'] == 1
+        deadline = time.time() + 30
+        while pool.stats()['in_flight'] and time.time() < deadline:
+            time.sleep(0.05)
+        assert pool.stats()['in_flight'] == 0
+        assert pool.stats()['timeouts'] == 1
+    finally:
+        pool.shutdown()
+
+def test_worker_threads_fit_cores():
+    import os
+    import autotune
+
+    tuned = autotune.get_tuned_options
+    # Whatever calibration picked, workers x threads stays within the cores
+    autotune.get_tuned_options = lambda model_path, pool_size: {'num_threads': 64, 'use_xnnpack': True}
+    try:
+        cores = os.cpu_count() or 1
+        for workers in [1, 2, cores, cores * 2]:
+            options = autotune.tuned_worker_options("model.tflite", workers)
+            assert 1 <= options['num_threads'] <= max(1, cores // workers), (workers, options)
+    finally:
+        autotune.get_tuned_options = tuned
+
+def test_inline_pool_is_bounded():
+    pool = OffloadPool(workers=0, max_pending=1, admission_timeout=0.1)
+    release = threading.Event()
+    caller = threading.Thread(target=pool.run, args=(release.wait, 5))
+    caller.start()
+    time.sleep(0.05)
+    try:
+        pool.run(time.sleep, 0)
+    except OffloadBusy:
+        pass
+    else:
+        raise AssertionError("inline pools share the same bound")
+    finally:
+        release.set()
+        caller.join()
+
+if __name__ == "__main__":
+    print("🧪 Offload pool checks")
+    failed = False
+    for check in [test_worker_matches_inline, test_backpressure, test_task_timeout_holds_slot,
+                  test_worker_threads_fit_cores, test_inline_pool_is_bounded]:
+        try:
+            check()
+            print(f"   ✅ {check.__name__}")
+        except AssertionError as e:
+            failed = True
+            print(f"   ❌ {check.__name__}: {e}")
+    exit(1 if failed else 0)
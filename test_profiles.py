@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""
+Preprocessing profile checks.
+Registry versioning, model-metadata binding and per-profile cache keys.
+
+Run with pytest, or directly.
+"""
+
+import json
+import tempfile
+import numpy as np
+from pathlib import Path
+from unittest import SkipTest
+
+from profiles import (PreprocessingProfile, bind_profile, find_profile, get_profile,
+                      model_metadata_path, profile_for_model, register_profile)
+from result_cache import preprocessing_version
+
+def test_registry_versions():
+    standard = get_profile('standard')
+    assert standard.key == 'standard@v1'
+    assert get_profile('fast').band is not None
+    assert find_profile(standard.to_dict()) is standard
+    assert find_profile(get_profile('fast').to_dict()) is get_profile('fast')
+
+    # A registered version's parameters cannot change under the models bound to it
+    try:
+        register_profile(PreprocessingProfile('standard', 1, 16000, 5.0, 128, 1024, 256))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("re-registering standard@v1 with other parameters should fail")
+
+    try:
+        get_profile('standard', 99)
+    except KeyError:
+        pass
+    else:
+        raise AssertionError("unknown versions should not resolve")
+
+def test_profile_from_model_metadata():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        fast_model = tmp / "fast_cnn.tflite"
+        with open(tmp / "fast_cnn_metadata.json", 'w') as f:
+            json.dump(bind_profile({'model_path': fast_model.name}, get_profile('fast')), f)
+
+        # Older metadata: no binding, an inline preprocessing dict and a Windows model path
+        legacy_model = tmp / "legacy_cnn.keras"
+        with open(tmp / "deployment_metadata.json", 'w') as f:
+            json.dump({'model_path': f"C:\\models\\{legacy_model.name}",
+                       'preprocessing': get_profile('standard').params()}, f)
+
+        assert model_metadata_path(fast_model) == tmp / "fast_cnn_metadata.json"
+        assert profile_for_model(fast_model) is get_profile('fast')
+        assert profile_for_model(legacy_model) is get_profile('standard')
+        assert profile_for_model(tmp / "unknown.tflite", default='fast') is get_profile('fast')
+
+def test_cache_keys_differ_per_profile():
+    standard, fast = get_profile('standard'), get_profile('fast')
+    assert preprocessing_version("librosa", standard) != preprocessing_version("librosa", fast)
+    assert preprocessing_version("librosa", standard) != preprocessing_version("numpy-simple", standard)
+
+def test_profile_model_inputs():
+    try:
+        import librosa  # noqa: F401
+    except ImportError:
+        raise SkipTest("librosa is not installed")
+    from audio_io import decode_audio
+    from benchmarking import synthetic_heart_wav
+
+    wav = synthetic_heart_wav(6.0, 8000, "normal")
+    for name in ['standard', 'fast']:
+        profile = get_profile(name)
+        audio, sr = decode_audio(wav, profile.sample_rate)
+        model_input, _ = profile.prepare_model_input(audio, sr)
+        assert model_input.shape == (1,) + profile.expected_shape + (1,), name
+        assert profile.workspace().prepare(audio).shape == profile.expected_shape, name
+        # Audio at another rate is resampled to the profile's rate first
+        resampled, _ = profile.prepare_model_input(*decode_audio(wav, 8000))
+        assert resampled.shape == model_input.shape, name
+        assert np.isfinite(resampled).all(), name
+
+if __name__ == "__main__":
+    print("🧪 Preprocessing profile checks")
+    failed = False
+    for check in [test_registry_versions, test_profile_from_model_metadata,
+                  test_cache_keys_differ_per_profile, test_profile_model_inputs]:
+        try:
+            check()
+            print(f"   ✅ {check.__name__}")
+        except SkipTest as e:
+            print(f"   ⏭️ {check.__name__}: {e}")
+        except AssertionError as e:
+            failed = True
+            print(f"   ❌ {check.__name__}: {e}")
+    exit(1 if failed else 0)
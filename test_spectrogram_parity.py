@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+"""
+Spectrogram parity and speed harness.
+Compares the spectrogram implementations against utils.audio_to_melspectrogram
+(which mobile_app_backup.py also calls inline) on synthetic demo signals and,
+when downloaded, PhysioNet recordings. Also checks the preallocated
+SpectrogramWorkspace against utils.prepare_model_input.
+
+Run with pytest, or directly to run the checks and print the full report.
+"""
+
+import time
+import warnings
+import numpy as np
+from pathlib import Path
+from unittest import SkipTest
+warnings.filterwarnings('ignore')
+
+from config import *
+from audio_io import decode_audio
+from benchmarking import synthetic_heart_wav
+from dsp import SpectrogramWorkspace, mel_spectrogram, preprocess_audio_simple, simple_spectrogram
+
+# Largest allowed difference from librosa for an implementation to count as a drop-in, in dB
+PARITY_MAX_ABS_DB = 0.01
+PARITY_MEAN_ABS_DB = 0.001
+
+def spectrogram_implementations():
+    """name -> spectrogram function with the utils.audio_to_melspectrogram signature."""
+    implementations = {'numpy-mel': mel_spectrogram, 'numpy-simple': simple_spectrogram}
+    try:
+        import librosa  # noqa: F401
+        from utils import audio_to_melspectrogram
+        implementations = {'librosa': audio_to_melspectrogram, **implementations}
+    except ImportError:
+        pass
+    return implementations
+
+def test_signals(physionet_per_label=2):
+    """(name, audio) pairs at SAMPLE_RATE, each AUDIO_DURATION seconds long."""
+    signals = []
+    for label in ["normal", "abnormal"]:
+        for seed in range(2):
+            audio, _ = decode_audio(synthetic_heart_wav(AUDIO_DURATION, SAMPLE_RATE, label, seed), SAMPLE_RATE)
+            signals.append((f"synthetic-{label}-{seed}", audio))
+
+    if PHYSIONET_DIR.exists():
+        from utils import get_physionet_labels
+        labels_df = get_physionet_labels(str(PHYSIONET_DIR))
+        for label in ["normal", "abnormal"]:
+            for _, row in labels_df[labels_df['binary_label'] == label].head(physionet_per_label).iterrows():
+                audio, _ = decode_audio(Path(row['file_path']).read_bytes(), SAMPLE_RATE)
+                signals.append((f"physionet-{row['file_id']}", audio))
+
+    return [(name, preprocess_audio_simple(audio, SAMPLE_RATE, AUDIO_DURATION)) for name, audio in signals]
+# Not a pytest test despite the name
+test_signals.__test__ = False
+
+def require_librosa():
+    """Skip the calling check (under pytest or __main__) when librosa is not installed."""
+    try:
+        import librosa  # noqa: F401
+    except ImportError:
+        raise SkipTest("librosa not installed")
+
+def load_parity_model():
+    """The app's TFLite model, or None if no runtime/model is available."""
+    try:
+        from inference import TFLiteModel
+        for model_name in ["heart_sound_mobile_quantized.tflite", "heart_sound_mobile.tflite"]:
+            if (MODELS_DIR / model_name).exists():
+                return TFLiteModel(MODELS_DIR / model_name, batch_buckets=(1,))
+    except Exception:
+        pass
+    return None
+
+def compare(reference, candidate):
+    """Shape plus max/mean absolute error (None when shapes differ)."""
+    if reference.shape != candidate.shape:
+        return {'shape': candidate.shape, 'max_abs': None, 'mean_abs': None}
+    diff = np.abs(reference.astype(np.float64) - candidate)
+    return {'shape': candidate.shape, 'max_abs': float(diff.max()), 'mean_abs': float(diff.mean())}
+
+def throughput(fn, audio, repeats=20):
+    """Spectrograms per second."""
+    fn(audio, SAMPLE_RATE, N_MELS, N_FFT, HOP_LENGTH)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(audio, SAMPLE_RATE, N_MELS, N_FFT, HOP_LENGTH)
+    return repeats / (time.perf_counter() - start)
+
+def parity_report():
+    """Per-implementation shape, error vs librosa, confidence delta and throughput."""
+    implementations = spectrogram_implementations()
+    signals = test_signals()
+    model = load_parity_model()
+    reference_name = 'librosa' if 'librosa' in implementations else None
+
+    report = {}
+    for name, fn in implementations.items():
+        rows = []
+        for signal_name, audio in signals:
+            spec = fn(audio, SAMPLE_RATE, N_MELS, N_FFT, HOP_LENGTH)
+            row = {'signal': signal_name, 'shape': spec.shape}
+            if reference_name:
+                reference = implementations[reference_name](audio, SAMPLE_RATE, N_MELS, N_FFT, HOP_LENGTH)
+                row.update(compare(reference, spec))
+                if model is not None and row['max_abs'] is not None:
+                    ref_conf = float(model.predict_batch(reference[np.newaxis])[0])
+                    row['confidence_delta'] = float(model.predict_batch(spec[np.newaxis])[0]) - ref_conf
+            rows.append(row)
+        report[name] = {'rows': rows, 'per_second': throughput(fn, signals[0][1])}
+    return report
+
+def test_numpy_mel_shape():
+    expected = (N_MELS, int(AUDIO_DURATION * SAMPLE_RATE) // HOP_LENGTH + 1)
+    for _, audio in test_signals(physionet_per_label=0):
+        assert mel_spectrogram(audio, SAMPLE_RATE, N_MELS, N_FFT, HOP_LENGTH).shape == expected
+
+def test_numpy_mel_matches_librosa():
+    require_librosa()
+    from utils import audio_to_melspectrogram
+
+    for signal_name, audio in test_signals():
+        reference = audio_to_melspectrogram(audio, SAMPLE_RATE, N_MELS, N_FFT, HOP_LENGTH)
+        result = compare(reference, mel_spectrogram(audio, SAMPLE_RATE, N_MELS, N_FFT, HOP_LENGTH))
+        assert result['max_abs'] is not None, f"{signal_name}: shape {result['shape']} != {reference.shape}"
+        assert result['max_abs'] < PARITY_MAX_ABS_DB, signal_name
+        assert result['mean_abs'] < PARITY_MEAN_ABS_DB, signal_name
+
+def test_numpy_mel_confidence_parity():
+    require_librosa()
+    model = load_parity_model()
+    if model is None:
+        raise SkipTest("No TFLite runtime or model available")
+    from utils import audio_to_melspectrogram
+
+    for signal_name, audio in test_signals():
+        reference = audio_to_melspectrogram(audio, SAMPLE_RATE, N_MELS, N_FFT, HOP_LENGTH)
+        candidate = mel_spectrogram(audio, SAMPLE_RATE, N_MELS, N_FFT, HOP_LENGTH)
+        delta = model.predict_batch(candidate[np.newaxis])[0] - model.predict_batch(reference[np.newaxis])[0]
+        assert abs(delta) < 1e-3, signal_name
+
+def test_workspace_matches_prepare_model_input():
+    require_librosa()
+    from utils import prepare_model_input
+
+    workspace = SpectrogramWorkspace(SAMPLE_RATE, AUDIO_DURATION, N_MELS, N_FFT, HOP_LENGTH)
+    rng = np.random.default_rng(0)
+    for duration in [2.0, AUDIO_DURATION, 12.0]:
+        audio, _ = decode_audio(synthetic_heart_wav(duration, SAMPLE_RATE, "abnormal"), SAMPLE_RATE)
+        # Leading silence and a quiet tail exercise the trim bounds
+        framed = np.concatenate([np.zeros(SAMPLE_RATE, dtype=np.float32), audio,
+                                 1e-3 * rng.standard_normal(SAMPLE_RATE).astype(np.float32)])
+        for signal_name, signal in [(f"{duration:g}s", audio), (f"{duration:g}s+silence", framed)]:
+            reference, processed = prepare_model_input(
+                signal, SAMPLE_RATE, AUDIO_DURATION, N_MELS, N_FFT, HOP_LENGTH
+            )
+            result = compare(reference[0, ..., 0], workspace.prepare(signal))
+            assert np.array_equal(processed, workspace.audio), signal_name
+            assert result['max_abs'] < PARITY_MAX_ABS_DB, signal_name
+            assert result['mean_abs'] < PARITY_MEAN_ABS_DB, signal_name
+
+def test_bandpass_attenuates_out_of_band():
+    from dsp import bandpass
+
+    t = np.arange(int(AUDIO_DURATION * FAST_SAMPLE_RATE)) / FAST_SAMPLE_RATE
+    core = slice(FAST_SAMPLE_RATE, -FAST_SAMPLE_RATE)  # away from the clip edges
+    for freq, expected in [(5, 0.0), (100, 1.0), (400, 1.0), (950, 0.0)]:
+        tone = np.sin(2 * np.pi * freq * t).astype(np.float32)
+        filtered = bandpass(tone, FAST_SAMPLE_RATE, BANDPASS_LOW_HZ, BANDPASS_HIGH_HZ)
+        gain = np.sqrt(np.mean(filtered[core] ** 2) / np.mean(tone[core] ** 2))
+        assert abs(gain - expected) < 0.01, f"{freq} Hz gain {gain:.3f}"
+
+def test_fast_profile_workspace_matches_prepare_model_input():
+    require_librosa()
+    from utils import prepare_model_input
+
+    band = (BANDPASS_LOW_HZ, BANDPASS_HIGH_HZ)
+    workspace = SpectrogramWorkspace(FAST_SAMPLE_RATE, AUDIO_DURATION, FAST_N_MELS, FAST_N_FFT,
+                                     FAST_HOP_LENGTH, band=band)
+    for duration in [2.0, 12.0]:
+        audio, _ = decode_audio(synthetic_heart_wav(duration, SAMPLE_RATE, "abnormal"), FAST_SAMPLE_RATE)
+        reference, _ = prepare_model_input(audio, FAST_SAMPLE_RATE, AUDIO_DURATION, FAST_N_MELS,
+                                           FAST_N_FFT, FAST_HOP_LENGTH, band=band)
+        result = compare(reference[0, ..., 0], workspace.prepare(audio))
+        assert result['max_abs'] < PARITY_MAX_ABS_DB, f"{duration:g}s"
+        assert result['mean_abs'] < PARITY_MEAN_ABS_DB, f"{duration:g}s"
+
+if __name__ == "__main__":
+    print("🧪 Spectrogram parity checks")
+    failed = False
+    for check in [test_numpy_mel_shape, test_numpy_mel_matches_librosa, test_numpy_mel_confidence_parity,
+                  test_workspace_matches_prepare_model_input, test_bandpass_attenuates_out_of_band,
+                  test_fast_profile_workspace_matches_prepare_model_input]:
+        try:
+            check()
+            print(f"   ✅ {check.__name__}")
+        except SkipTest as e:
+            print(f"   ⏭️ {check.__name__}: {e}")
+        except AssertionError as e:
+            failed = True
+            print(f"   ❌ {check.__name__}: {e}")
+
+    print("\n📊 Spectrogram parity and speed report")
+    print("=" * 60)
+    for name, result in parity_report().items():
+        print(f"\n🎵 {name}: {result['per_second']:.0f} spectrograms/s")
+        for row in result['rows']:
+            line = f"   {row['signal']:<26} shape {str(row['shape']):<12}"
+            if row.get('max_abs') is not None:
+                line += f" max {row['max_abs']:.2e} dB, mean {row['mean_abs']:.2e} dB"
+            elif 'max_abs' in row:
+                line += " (shape differs from librosa)"
+            if 'confidence_delta' in row:
+                line += f", confidence Δ {row['confidence_delta']:+.4f}"
+            print(line)
+
+    exit(1 if failed else 0)
@@ -1,17 +1,26 @@
 """
 Utility functions for heart sound analysis.
 Common functions used across notebooks and the Streamlit app.
+
+librosa and pandas are imported inside the functions that need them, so
+importing this module stays cheap for app cold starts.
 """
 
-import librosa
+from __future__ import annotations
+
 import numpy as np
-import pandas as pd
 import json
 from pathlib import Path
-from typing import Tuple, Dict, Any
+from typing import TYPE_CHECKING, Tuple, Dict, Any, Optional
 import warnings
 warnings.filterwarnings('ignore')
 
+from metrics import timed
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+@timed("load_audio")
 def load_audio(file_path: str, target_sr: int = 8000) -> Tuple[np.ndarray, int]:
     """
     Load audio file and convert to target sample rate.
@@ -24,12 +33,14 @@ def load_audio(file_path: str, target_sr: int = 8000) -> Tuple[np.ndarray, int]:
         Tuple of (audio_data, sample_rate)
     """
     try:
+        import librosa
         audio, sr = librosa.load(file_path, sr=target_sr, mono=True)
         return audio, sr
     except Exception as e:
         print(f"Error loading {file_path}: {e}")
         return np.array([]), 0
 
+@timed("preprocess_audio")
 def preprocess_audio(audio: np.ndarray, sr: int, 
                     duration: float = 5.0) -> np.ndarray:
     """
@@ -43,6 +54,8 @@ def preprocess_audio(audio: np.ndarray, sr: int,
     Returns:
         Preprocessed audio array
     """
+    import librosa
+
     # Trim leading/trailing silence
     audio = librosa.effects.trim(audio, top_db=20)[0]
     
@@ -64,6 +77,7 @@ def preprocess_audio(audio: np.ndarray, sr: int,
     
     return audio
 
+@timed("audio_to_melspectrogram")
 def audio_to_melspectrogram(audio: np.ndarray, sr: int,
                            n_mels: int = 128, n_fft: int = 1024,
                            hop_length: int = 256) -> np.ndarray:
@@ -80,6 +94,8 @@ def audio_to_melspectrogram(audio: np.ndarray, sr: int,
     Returns:
         Log mel-spectrogram array (n_mels, time_frames)
     """
+    import librosa
+
     # Compute mel-spectrogram
     mel_spec = librosa.feature.melspectrogram(
         y=audio, sr=sr, n_mels=n_mels, n_fft=n_fft, hop_length=hop_length
@@ -90,18 +106,51 @@ def audio_to_melspectrogram(audio: np.ndarray, sr: int,
     
     return log_mel_spec
 
+def prepare_model_input(audio: np.ndarray, sr: int, duration: float = 5.0,
+                        n_mels: int = 128, n_fft: int = 1024, hop_length: int = 256,
+                        band: Optional[Tuple[float, float]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Run the full preprocessing pipeline on loaded audio.
+
+    Args:
+        audio: Audio time series
+        sr: Sample rate
+        duration: Target duration in seconds
+        n_mels: Number of mel frequency bins
+        n_fft: FFT window size
+        hop_length: Hop length for STFT
+        band: (low_hz, high_hz) band-pass applied to the fixed-length clip (None skips it)
+
+    Returns:
+        Tuple of (model_input of shape (1, n_mels, frames, 1), processed_audio)
+    """
+    processed_audio = preprocess_audio(audio, sr, duration)
+    if band is not None:
+        from dsp import bandpass
+        processed_audio = bandpass(processed_audio, sr, *band)
+    mel_spec = audio_to_melspectrogram(processed_audio, sr, n_mels, n_fft, hop_length)
+    model_input = np.expand_dims(mel_spec, axis=[0, -1]).astype(np.float32)
+    return model_input, processed_audio
+
 def create_preprocessing_config(sr: int = 8000, duration: float = 5.0,
                                n_mels: int = 128, n_fft: int = 1024,
-                               hop_length: int = 256) -> Dict[str, Any]:
-    """Create preprocessing configuration dictionary."""
-    return {
-        'sample_rate': sr,
-        'duration': duration,
-        'n_mels': n_mels,
-        'n_fft': n_fft,
-        'hop_length': hop_length,
-        'expected_shape': (n_mels, int(duration * sr // hop_length) + 1)
-    }
+                               hop_length: int = 256,
+                               band: Optional[Tuple[float, float]] = None) -> Dict[str, Any]:
+    """
+    Create preprocessing configuration dictionary.
+
+    Settings that match a registered profile (profiles.py) get that profile's
+    config, including its name and version; others get an unnamed config in
+    the same format.
+    """
+    from profiles import PreprocessingProfile, find_profile
+
+    candidate = PreprocessingProfile(None, 0, sr, duration, n_mels, n_fft, hop_length, band=band)
+    profile = find_profile(candidate.to_dict()) or candidate
+    config = profile.to_dict()
+    if profile is candidate:
+        config.update(profile=None, version=None)
+    return config
 
 def save_preprocessing_config(config: Dict[str, Any], save_path: str):
     """Save preprocessing config to JSON file."""
@@ -123,6 +172,8 @@ def get_physionet_labels(physionet_dir: str) -> pd.DataFrame:
     Returns:
         DataFrame with columns: file_id, label, subset, file_path
     """
+    import pandas as pd
+
     physionet_path = Path(physionet_dir)
     all_records = []
     
@@ -168,4 +219,65 @@ def print_dataset_summary(labels_df: pd.DataFrame):
     print("\nLabel distribution:")
     print(labels_df['binary_label'].value_counts())
     print(f"\nClass balance: {labels_df['binary_label'].value_counts(normalize=True)}")
-    print("=" * 50)
\ No newline at end of file
+    print("=" * 50)
+
+
+def load_dataset_spectrograms(dataset_csv: str, split: str = None, limit: int = None,
+                              spectrograms_dir: str = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Load the cached spectrograms listed in a processed-dataset CSV (scripts/fast_batch_process.py).
+
+    Args:
+        dataset_csv: CSV with spectrogram_path, label and (optionally) split columns
+        split: Keep only rows of this split ('train', 'val', 'test'); None keeps all
+        limit: Keep a random subset of this size
+        spectrograms_dir: Spectrogram cache to look in when a recorded path does not exist
+            (paths written on another machine)
+
+    Returns:
+        Tuple of (spectrograms (N, n_mels, frames) float32, labels (N,) with 1 = abnormal)
+    """
+    import pandas as pd
+    from pathlib import PureWindowsPath
+
+    df = pd.read_csv(dataset_csv)
+    if split and 'split' in df.columns:
+        df = df[df['split'] == split]
+    if limit:
+        df = df.sample(min(limit, len(df)), random_state=0)
+
+    spectrograms, labels = [], []
+    for _, row in df.iterrows():
+        path = Path(row['spectrogram_path'])
+        if not path.exists() and spectrograms_dir is not None:
+            path = Path(spectrograms_dir) / row['label'] / PureWindowsPath(row['spectrogram_path']).name
+        spectrograms.append(np.load(path))
+        labels.append(int(row['label'] == 'abnormal'))
+    return np.stack(spectrograms).astype(np.float32), np.array(labels)
+
+def load_physionet_spectrograms(physionet_dir: str, limit: int = None, sr: int = 8000,
+                                duration: float = 5.0, n_mels: int = 128, n_fft: int = 1024,
+                                hop_length: int = 256) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute model-input spectrograms for PhysioNet 2016 recordings.
+
+    Args:
+        physionet_dir: Path to physionet2016 directory
+        limit: Keep a random subset of this size
+
+    Returns:
+        Tuple of (spectrograms (N, n_mels, frames) float32, labels (N,) with 1 = abnormal)
+    """
+    from audio_io import decode_audio
+    from dsp import SpectrogramWorkspace
+
+    labels_df = get_physionet_labels(physionet_dir)
+    if limit:
+        labels_df = labels_df.sample(min(limit, len(labels_df)), random_state=0)
+
+    workspace = SpectrogramWorkspace(sr, duration, n_mels, n_fft, hop_length)
+    spectrograms = np.empty((len(labels_df),) + workspace.shape, dtype=np.float32)
+    for i, (_, row) in enumerate(labels_df.iterrows()):
+        audio, _ = decode_audio(Path(row['file_path']).read_bytes(), sr)
+        workspace.prepare(audio, spectrograms[i])
+    return spectrograms, (labels_df['binary_label'] == 'abnormal').astype(int).values